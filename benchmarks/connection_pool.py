@@ -0,0 +1,96 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Measure frame latency and the number of connections opened when a frame's
+requests (like the per-namespace Heapster fan-out) go through an agent with
+and without a pool of persistent connections.
+
+The server is a local plain HTTP server, so the cost of setting up TLS,
+which a real API server adds to every new connection, is not included.
+
+Usage: python benchmarks/connection_pool.py [requests per frame] [frames]
+"""
+
+from __future__ import print_function, division
+
+from sys import argv
+
+from twisted.internet.task import react
+from twisted.internet.defer import inlineCallbacks, gatherResults
+from twisted.web.client import Agent, HTTPConnectionPool
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from treq.client import HTTPClient
+from treq import content
+
+from kubetop._http import connection_pool
+
+
+class Document(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"content-type", b"application/json")
+        return b'{"items": []}'
+
+
+
+class CountingSite(Site):
+    connections = 0
+
+    def buildProtocol(self, addr):
+        self.connections += 1
+        return Site.buildProtocol(self, addr)
+
+
+
+@inlineCallbacks
+def measure(reactor, name, pool, url, requests, frames):
+    site_connections = measure.site.connections
+    client = HTTPClient(Agent(reactor, pool=pool))
+    latencies = []
+    for i in range(frames):
+        before = reactor.seconds()
+        yield gatherResults(list(
+            client.get(url + "/{}".format(n)).addCallback(content)
+            for n
+            in range(requests)
+        ))
+        latencies.append(reactor.seconds() - before)
+    yield pool.closeCachedConnections()
+    print("{:>16}: {:>7.2f} ms/frame {:>6} connections".format(
+        name,
+        sum(latencies) / len(latencies) * 1000,
+        measure.site.connections - site_connections,
+    ))
+
+
+
+@inlineCallbacks
+def main(reactor, requests=20, frames=50):
+    requests, frames = int(requests), int(frames)
+    measure.site = CountingSite(Document())
+    port = reactor.listenTCP(0, measure.site, interface="127.0.0.1")
+    url = "http://127.0.0.1:{}".format(port.getHost().port)
+    print("{} requests per frame, {} frames".format(requests, frames))
+    try:
+        yield measure(
+            reactor, "new connections",
+            HTTPConnectionPool(reactor, persistent=False),
+            url, requests, frames,
+        )
+        for connections in (4, 16, requests):
+            yield measure(
+                reactor, "pool of {}".format(connections),
+                connection_pool(reactor, connections),
+                url, requests, frames,
+            )
+    finally:
+        yield port.stopListening()
+
+
+
+if __name__ == "__main__":
+    react(main, argv[1:])
@@ -0,0 +1,166 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Compare the reactors ``--reactor`` can choose by the latency of frames
+fetched from a local fake API server and rendered, and by how late the
+reactor runs timers meanwhile (its loop overhead).
+
+A reactor can only be installed once per process so each one is measured in
+a process of its own.  Reactors which can't be installed (uvloop, when it is
+not installed) are skipped.
+
+Usage: python benchmarks/event_loop.py [frames] [pod count]
+"""
+
+from __future__ import print_function, division
+
+from sys import argv, executable
+from subprocess import call
+
+# The number of different usage documents the fake API server cycles through.
+SAMPLES = 4
+
+
+def serve(reactor, pods, nodes):
+    from json import dumps
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+    from kubetop.test.protobuf import pod_list
+    from kubetop.test.test_frame import _node, _node_usage, _pod_usage
+
+    documents = {
+        "/api/v1/pods": pod_list(pods),
+        "/api/v1/nodes": {"items": list(
+            _node("node-{}".format(i), "10.0.0.{}".format(i))
+            for i in range(nodes)
+        )},
+    }
+    # A few different samples of usage so that every frame is rendered.
+    for n in range(SAMPLES):
+        documents["/apis/metrics.k8s.io/v1beta1/pods", n] = {"items": list(
+            _pod_usage(
+                "pod-{}".format(i), "ns-{}".format(i % 20),
+                ("{}m".format((n * 37 + i) % 1000), "64Mi"),
+            )
+            for i in range(pods)
+        )}
+        documents["/apis/metrics.k8s.io/v1beta1/nodes", n] = {"items": list(
+            _node_usage("node-{}".format(i), "{}m".format(n * 100), "1Gi")
+            for i in range(nodes)
+        )}
+    bodies = {
+        path: dumps(document).encode("utf-8")
+        for (path, document)
+        in documents.items()
+    }
+
+    class Cluster(Resource):
+        isLeaf = True
+        requests = 0
+
+        def render_GET(self, request):
+            self.requests += 1
+            request.setHeader(b"content-type", b"application/json")
+            path = request.path.decode("ascii")
+            return bodies.get(path) or bodies[path, self.requests % SAMPLES]
+
+    return reactor.listenTCP(0, Site(Cluster()), interface="127.0.0.1")
+
+
+
+def measure(name, frames, pods):
+    from kubetop._reactor import install_reactor
+    try:
+        install_reactor(name)
+    except ImportError as e:
+        print("{:>8}: not available ({})".format(name, e))
+        return
+
+    from twisted.internet.task import react
+    from twisted.internet.defer import inlineCallbacks
+    from twisted.python.url import URL
+    from twisted.web.client import Agent
+    from zope.interface import implementer
+    from txkube import IKubernetes
+    from kubetop._http import connection_pool
+    from kubetop._offload import LagMonitor
+    from kubetop._topdata import MetricsAPI, _Source
+    from kubetop._textrenderer import Screen, Sink, Size, kubetop
+
+    @implementer(IKubernetes)
+    class Kubernetes(object):
+        def __init__(self, base_url, agent):
+            self.base_url = base_url
+            self.agent = agent
+
+        def client(self):
+            return self
+
+    class Terminal(object):
+        def size(self):
+            return Size(rows=50, columns=120, xpixels=0, ypixels=0)
+
+    class Discard(object):
+        def write(self, text):
+            pass
+
+        def flush(self):
+            pass
+
+    @inlineCallbacks
+    def main(reactor):
+        port = serve(reactor, pods, max(1, pods // 30))
+        pool = connection_pool(reactor, 16)
+        source = _Source(
+            kubernetes=Kubernetes(
+                URL.fromText(
+                    "http://127.0.0.1:{}".format(port.getHost().port),
+                ),
+                Agent(reactor, pool=pool),
+            ),
+            metrics=MetricsAPI(),
+        )
+        screen = Screen(reactor, Sink(Terminal(), Discard()))
+        monitor = LagMonitor(reactor)
+        monitor.start()
+        latencies = []
+        try:
+            for i in range(frames):
+                before = reactor.seconds()
+                yield kubetop(reactor, source, screen)
+                latencies.append(reactor.seconds() - before)
+        finally:
+            monitor.stop()
+            yield pool.closeCachedConnections()
+            yield port.stopListening()
+        latencies.sort()
+        lags = sorted(monitor.lags)
+        print(
+            "{:>8}: frame p50 {:>7.2f} ms p95 {:>7.2f} ms, "
+            "timer lag p50 {:>6.2f} ms max {:>6.2f} ms".format(
+                name,
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.95)] * 1000,
+                lags[len(lags) // 2] * 1000,
+                lags[-1] * 1000,
+            )
+        )
+
+    react(main, [])
+
+
+
+def main(frames=200, pods=2000):
+    from kubetop._reactor import REACTORS
+    print("{} frames of {} pods".format(frames, pods))
+    for name in REACTORS:
+        call([executable, __file__, "--measure", name, str(frames), str(pods)])
+
+
+
+if __name__ == "__main__":
+    if argv[1:2] == ["--measure"]:
+        measure(argv[2], int(argv[3]), int(argv[4]))
+    else:
+        main(*argv[1:])
@@ -0,0 +1,51 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Compare the size and decoding time of a large pod list in the JSON and
+protobuf encodings.
+
+Usage: python benchmarks/protobuf_decode.py [pod count]
+"""
+
+from __future__ import print_function, division
+
+from sys import argv
+from json import dumps, loads
+from zlib import compress
+from timeit import default_timer
+
+from kubetop._protobuf import decode_pod_list
+from kubetop.test.protobuf import encode_list, encode_pod, pod_list
+
+
+def measure(decode, body, repeat=3):
+    best = None
+    for _ in range(repeat):
+        before = default_timer()
+        decode(body)
+        elapsed = default_timer() - before
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+
+def main(count=20000):
+    document = pod_list(count)
+    json_body = dumps(document).encode("utf-8")
+    protobuf_body = encode_list(encode_pod, document)
+
+    print("{} pods".format(count))
+    for name, decode, body in [
+            ("json", lambda body: loads(body.decode("utf-8")), json_body),
+            ("protobuf", decode_pod_list, protobuf_body),
+    ]:
+        print("{:>9}: {:>10} bytes {:>9} gzipped {:>8.3f} s".format(
+            name, len(body), len(compress(body)), measure(decode, body),
+        ))
+
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:]))
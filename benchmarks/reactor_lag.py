@@ -0,0 +1,67 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Measure how late the reactor runs timers while a large pod list is decoded
+into txkube models, on the reactor thread and in a worker thread.
+
+Usage: python benchmarks/reactor_lag.py [pod count]
+"""
+
+from __future__ import print_function, division
+
+from sys import argv
+from json import dumps
+
+from twisted.internet.task import react, deferLater
+from twisted.internet.defer import inlineCallbacks
+from twisted.python.threadpool import ThreadPool
+
+from txkube import v1_5_model
+
+from kubetop._http import _loads
+from kubetop._offload import LagMonitor, synchronous, thread_runner
+from kubetop.test.protobuf import pod_list
+
+
+def decode(body):
+    return v1_5_model.iobject_from_raw(_loads(body))
+
+
+
+@inlineCallbacks
+def measure(reactor, name, run, body):
+    monitor = LagMonitor(reactor)
+    monitor.start()
+    # Let the monitor settle before loading the reactor.
+    yield deferLater(reactor, 0.1, lambda: None)
+    before = reactor.seconds()
+    yield run(decode, body)
+    elapsed = reactor.seconds() - before
+    # Give a timer held up by the work a chance to fire.
+    yield deferLater(reactor, 0.1, lambda: None)
+    monitor.stop()
+    lags = sorted(monitor.lags)
+    print("{:>8}: {:>7.3f} s decoding, lag max {:>7.3f} s p50 {:>7.3f} s".format(
+        name, elapsed, lags[-1], lags[len(lags) // 2],
+    ))
+
+
+
+@inlineCallbacks
+def main(reactor, count=5000):
+    body = dumps(pod_list(int(count))).encode("utf-8")
+    print("{} pods".format(count))
+    yield measure(reactor, "reactor", synchronous, body)
+
+    pool = ThreadPool(minthreads=0, maxthreads=1)
+    pool.start()
+    try:
+        yield measure(reactor, "thread", thread_runner(reactor, pool), body)
+    finally:
+        pool.stop()
+
+
+
+if __name__ == "__main__":
+    react(main, argv[1:])
@@ -0,0 +1,60 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Measure how much memory a pod list takes once decoded, as txkube models and
+as kubetop's compact records.
+
+Usage: python benchmarks/record_memory.py [pod count]
+"""
+
+from __future__ import print_function, division
+
+from sys import argv
+from json import dumps
+from gc import collect
+from tracemalloc import start, stop, take_snapshot
+
+from txkube import v1_5_model
+
+from kubetop._http import _loads
+from kubetop._records import pods_from_raw
+from kubetop.test.protobuf import pod_list
+
+
+def footprint(decode, body):
+    """
+    Decode ``body`` and measure the memory still held by the result once the
+    parsed document has been freed.
+    """
+    collect()
+    start()
+    before = take_snapshot()
+    result = decode(_loads(body))
+    collect()
+    after = take_snapshot()
+    stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del result
+    return size
+
+
+
+def main(count=20000):
+    count = int(count)
+    body = dumps(pod_list(count)).encode("utf-8")
+    print("{} pods".format(count))
+    for (name, decode) in [
+            ("dict", lambda document: document),
+            ("txkube", v1_5_model.iobject_from_raw),
+            ("records", pods_from_raw),
+    ]:
+        size = footprint(decode, body)
+        print("{:>8}: {:>8.1f} MiB {:>8.0f} bytes/pod".format(
+            name, size / 2 ** 20, size / count,
+        ))
+
+
+
+if __name__ == "__main__":
+    main(*argv[1:])
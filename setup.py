@@ -20,6 +20,7 @@ setup(
     install_requires=[
         "bitmath",
         "attrs>=17.4.0",
+        "pem",
         "pyyaml",
         "twisted[tls]>=17.9.0",
         "treq",
@@ -29,6 +30,12 @@ setup(
         "dev": [
             "hypothesis",
         ],
+        "numpy": [
+            "numpy",
+        ],
+        "uvloop": [
+            "uvloop",
+        ],
     },
     entry_points={
         "console_scripts": [
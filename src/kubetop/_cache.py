@@ -0,0 +1,145 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Remember the results of fetching slow-changing resources.
+
+Theory of Operation
+===================
+
+#. Each resource is identified by a key and has its own lifetime.
+#. The first request for a resource waits for it to be fetched.  Later
+   requests are answered immediately with the remembered value.
+#. Once a value has lived through most of its lifetime a replacement is
+   fetched in the background.  The old value continues to be served until
+   the replacement arrives (or even past its lifetime, if fetching the
+   replacement is slow) so that no request waits on an expired entry.
+#. Count the requests answered from the cache and those which were not, and
+   log the counts of each resource every so many requests for it.
+"""
+
+from collections import Counter
+
+import attr
+
+from twisted.python.log import err
+from twisted.internet.defer import Deferred, succeed, maybeDeferred
+from twisted.logger import Logger
+
+# The fraction of its lifetime after which a value is refreshed.
+REFRESH_AHEAD = 0.8
+
+# The number of requests for a resource between reports of its counts.
+REPORT_EVERY = 100
+
+_log = Logger()
+
+
+@attr.s
+class _Entry(object):
+    value = attr.ib()
+    fetched = attr.ib()
+
+
+
+@attr.s
+class TTLCache(object):
+    """
+    :ivar clock: An ``IReactorTime`` provider used to age values.
+
+    :ivar dict lifetimes: A mapping from resource keys to the number of
+        seconds values for those resources may be remembered.  Resources
+        without a (positive) lifetime are not remembered at all.
+
+    :ivar Counter hits: Per-key counts of requests answered from the cache.
+
+    :ivar Counter misses: Per-key counts of requests which had to wait for a
+        fetch.
+
+    :ivar Counter refreshes: Per-key counts of background refreshes started.
+
+    :ivar int report_every: The number of requests for a resource between
+        reports of its counts.
+    """
+    clock = attr.ib()
+    lifetimes = attr.ib(default=attr.Factory(dict))
+    report_every = attr.ib(default=REPORT_EVERY)
+
+    hits = attr.ib(default=attr.Factory(Counter))
+    misses = attr.ib(default=attr.Factory(Counter))
+    refreshes = attr.ib(default=attr.Factory(Counter))
+
+    _entries = attr.ib(default=attr.Factory(dict))
+    _fetching = attr.ib(default=attr.Factory(dict))
+
+    def get(self, key, fetch):
+        """
+        Get the value of a resource.
+
+        :param key: The resource to get.
+
+        :param fetch: A zero-argument callable returning the current value of
+            the resource, or a ``Deferred`` that fires with it.
+
+        :return Deferred: A ``Deferred`` that fires with the value.
+        """
+        d = self._get(key, fetch)
+        if (self.hits[key] + self.misses[key]) % self.report_every == 0:
+            _log.info(
+                "Cache of {key!r}: {hits} hits, {misses} misses, "
+                "{refreshes} refreshes",
+                key=key, hits=self.hits[key], misses=self.misses[key],
+                refreshes=self.refreshes[key],
+            )
+        return d
+
+
+    def _get(self, key, fetch):
+        lifetime = self.lifetimes.get(key, 0)
+        if lifetime <= 0:
+            self.misses[key] += 1
+            return maybeDeferred(fetch)
+
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            self.misses[key] += 1
+            return self._wait(key, fetch)
+
+        self.hits[key] += 1
+        age = self.clock.seconds() - entry.fetched
+        if age >= lifetime * REFRESH_AHEAD and key not in self._fetching:
+            self.refreshes[key] += 1
+            self._fetch(key, fetch).addErrback(
+                err, "Refreshing cached {!r} failed".format(key),
+            )
+        return succeed(entry.value)
+
+
+    def _wait(self, key, fetch):
+        d = Deferred()
+        if key in self._fetching:
+            self._fetching[key].append(d)
+        else:
+            # Any failure is delivered to the waiters instead.
+            self._fetch(key, fetch, [d]).addErrback(lambda reason: None)
+        return d
+
+
+    def _fetch(self, key, fetch, waiting=()):
+        self._fetching[key] = waiting = list(waiting)
+        d = maybeDeferred(fetch)
+
+        def fetched(value):
+            self._entries[key] = _Entry(value, self.clock.seconds())
+            return value
+
+        def done(result):
+            del self._fetching[key]
+            for waiter in waiting:
+                waiter.callback(result)
+            return result
+
+        d.addCallback(fetched)
+        d.addBoth(done)
+        return d
@@ -0,0 +1,222 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Prometheus exposition of the usage data.
+
+Theory of Operation
+===================
+
+#. Each time new usage data is fetched, render it (along with how long the
+   fetch took) in the Prometheus text format once and keep the bytes.
+#. Serve those bytes, unchanged, to every scrape until the next fetch
+   replaces them.  Scrapes never cause requests to the Kubernetes API
+   server.
+#. A failed fetch is logged and counted but leaves the last good data in
+   place, so one bad response does not stop the exporter.
+"""
+
+from __future__ import unicode_literals, division
+
+from twisted.python.log import err
+from twisted.internet.defer import gatherResults
+from twisted.web.resource import Resource
+
+import attr
+
+from ._frame import NodeColumns, PodColumns
+from ._runmany import InOrder
+
+CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+
+
+def export(reactor, datasource, exposition):
+    """
+    Fetch one frame of usage data and update an exposition with it.
+
+    :param datasource: The source of usage data (see ``_topdata``).
+
+    :param Exposition exposition: The exposition to update.
+
+    :return Deferred: A ``Deferred`` that fires when the exposition has been
+        updated (or the fetch has failed).
+    """
+    before = reactor.seconds()
+
+    def fetched(data):
+        exposition.update(data, reactor.seconds() - before, reactor.seconds())
+
+    def failed(reason):
+        err(reason.value.subFailure, "Fetching usage data failed")
+        exposition.failed()
+
+    return exposition.fetches.deliver(
+        gatherResults(
+            [datasource.nodes(), datasource.pods()], consumeErrors=True,
+        ),
+        fetched, failed,
+    )
+
+
+
+def _escape(value):
+    return (
+        value
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+
+def _labels(**labels):
+    return "{" + ",".join(
+        '{}="{}"'.format(name, _escape(value))
+        for (name, value)
+        in sorted(labels.items())
+    ) + "}"
+
+
+
+def _family(name, kind, help, samples):
+    """
+    Render a metric family.
+
+    :param samples: An iterable of ``(labels, value)`` tuples.
+    """
+    lines = [
+        "# HELP {} {}".format(name, help),
+        "# TYPE {} {}".format(name, kind),
+    ]
+    lines.extend(
+        "{}{} {}".format(name, labels, repr(float(value)))
+        for (labels, value)
+        in samples
+    )
+    return "\n".join(lines) + "\n"
+
+
+
+def render_exposition(data, latency, timestamp, failures):
+    """
+    Render one frame of usage data in the Prometheus text format.
+
+    :param data: The node and pod data of the frame.
+
+    :param float latency: The number of seconds fetching the frame took.
+
+    :param float timestamp: The POSIX time at which the fetch finished.
+
+    :param int failures: The number of fetches which have failed so far.
+
+    :return bytes: The exposition.
+    """
+    (node_info, pod_info) = data
+    nodes = node_info["info"]
+    pods = pod_info["info"]
+    node_columns = NodeColumns.from_data(nodes, node_info["usage"].items, pods)
+    pod_columns = PodColumns.from_data(pods, pod_info["usage"].items, nodes)
+
+    node_labels = list(_labels(node=name) for name in node_columns.names)
+    pod_labels = list(
+        _labels(
+            namespace=pod_columns.namespaces[namespace_index] or "",
+            pod=name,
+        )
+        for (namespace_index, name)
+        in zip(pod_columns.namespace_index, pod_columns.names)
+    )
+    return "".join([
+        _family(
+            "kubetop_node_cpu_usage_cores", "gauge",
+            "CPU used by each node.",
+            zip(node_labels, (m / 1000 for m in node_columns.cpu_used)),
+        ),
+        _family(
+            "kubetop_node_memory_usage_bytes", "gauge",
+            "Memory used by each node.",
+            zip(node_labels, node_columns.memory_used),
+        ),
+        _family(
+            "kubetop_node_usage_stale", "gauge",
+            "1 if the usage of the node is out of date, otherwise 0.",
+            zip(node_labels, node_columns.stale),
+        ),
+        _family(
+            "kubetop_pod_cpu_usage_cores", "gauge",
+            "CPU used by each pod.",
+            zip(pod_labels, (m / 1000 for m in pod_columns.cpu)),
+        ),
+        _family(
+            "kubetop_pod_memory_usage_bytes", "gauge",
+            "Memory used by each pod.",
+            zip(pod_labels, pod_columns.memory),
+        ),
+        _family(
+            "kubetop_fetch_duration_seconds", "gauge",
+            "How long fetching the latest usage data took.",
+            [("", latency)],
+        ),
+        _family(
+            "kubetop_fetch_timestamp_seconds", "gauge",
+            "When the latest usage data was fetched.",
+            [("", timestamp)],
+        ),
+        _family(
+            "kubetop_fetch_failures_total", "counter",
+            "Fetches of usage data which failed.",
+            [("", failures)],
+        ),
+    ]).encode("utf-8")
+
+
+
+@attr.s
+class Exposition(object):
+    """
+    The exposition of the most recently fetched frame.
+
+    :ivar bytes body: The rendered exposition.
+
+    :ivar InOrder fetches: The fetches of frames, so that a frame is not
+        replaced by one fetched before it.
+    """
+    body = attr.ib(default=b"")
+    failures = attr.ib(default=0)
+    fetches = attr.ib(default=attr.Factory(InOrder))
+
+    _latest = attr.ib(default=None)
+
+    def update(self, data, latency, timestamp):
+        self._latest = (data, latency, timestamp)
+        self._render()
+
+
+    def failed(self):
+        self.failures += 1
+        self._render()
+
+
+    def _render(self):
+        if self._latest is not None:
+            data, latency, timestamp = self._latest
+            self.body = render_exposition(
+                data, latency, timestamp, self.failures,
+            )
+
+
+
+class MetricsResource(Resource):
+    """
+    Serve the current body of an ``Exposition``.
+    """
+    isLeaf = True
+
+    def __init__(self, exposition):
+        Resource.__init__(self)
+        self._exposition = exposition
+
+
+    def render_GET(self, request):
+        request.setHeader(b"content-type", CONTENT_TYPE)
+        return self._exposition.body
@@ -0,0 +1,743 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Columnar representation of the usage data for a single frame.
+
+Theory of Operation
+===================
+
+#. Flatten the node and pod records into parallel columns (millicores,
+   bytes, node index, namespace index) once per frame.
+#. Answer aggregate questions - totals, per-node and per-namespace sums,
+   rankings, a summary of all of the nodes - from those columns.
+#. Use NumPy for the column arithmetic when it is installed and plain Python
+   lists otherwise.  Both paths produce the same (Python) values.
+#. Alternatively, keep a ``FrameModel`` from frame to frame.  Compare each
+   frame's records with the previous frame's and apply only the records
+   which were added, changed or removed to its counters and to its ranking
+   (kept sorted with ``bisect``).  Records which are the very same objects
+   as last time (as they are when a response has not changed) are not even
+   compared.
+"""
+
+from __future__ import unicode_literals, division
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+
+import attr
+
+from ._records import NodeUsage
+
+# The number of buckets ``NodeSummary`` counts nodes into by CPU usage.
+DECILES = 10
+
+
+def _column(values):
+    """
+    Make a column of integers.
+    """
+    if numpy is None:
+        return list(values)
+    return numpy.fromiter(values, dtype=numpy.int64)
+
+
+def _tolist(column):
+    if numpy is None:
+        return list(column)
+    return column.tolist()
+
+
+def _float_column(values):
+    if numpy is None:
+        return list(values)
+    return numpy.fromiter(values, dtype=numpy.float64)
+
+
+def _sum(column):
+    if numpy is None:
+        return sum(column, 0)
+    return int(column.sum())
+
+
+def _percent(portion, whole):
+    """
+    Compute ``portion / whole * 100`` element-wise.  Where ``whole`` is 0 (a
+    node with nothing allocatable) the result is 0.
+    """
+    return _tolist(_percent_column(portion, whole))
+
+
+def _percent_column(portion, whole):
+    if numpy is None:
+        return list(
+            p / w * 100 if w != 0 else 0.0 for (p, w) in zip(portion, whole)
+        )
+    shares = numpy.divide(
+        portion, whole, out=numpy.zeros(len(whole)), where=whole != 0,
+    )
+    return shares * 100
+
+
+def _deciles(percent):
+    """
+    Count the values of a column of percentages falling in each tenth of 0 to
+    100.  Values of 100 or more are counted in the last tenth.
+    """
+    if numpy is None:
+        result = [0] * DECILES
+        for value in percent:
+            result[min(max(int(value // 10), 0), DECILES - 1)] += 1
+        return result
+    return numpy.bincount(
+        numpy.clip(percent // 10, 0, DECILES - 1).astype(numpy.int64),
+        minlength=DECILES,
+    ).tolist()
+
+
+def _largest(column, count):
+    """
+    Find the row indexes of the ``count`` largest values of a column, largest
+    first (and, among equal values, earliest first).
+    """
+    if numpy is None:
+        return sorted(
+            range(len(column)), key=lambda i: -column[i],
+        )[:count]
+    return numpy.lexsort(
+        (numpy.arange(len(column)), -column),
+    )[:count].tolist()
+
+
+def _group_sum(column, groups, size):
+    """
+    Sum the values of ``column`` into ``size`` buckets given by ``groups``.
+    Rows with a negative group are not counted anywhere.
+    """
+    if numpy is None:
+        result = [0] * size
+        for value, group in zip(column, groups):
+            if group >= 0:
+                result[group] += value
+        return result
+    known = groups >= 0
+    return list(
+        int(total)
+        for total
+        in numpy.bincount(
+            groups[known], weights=column[known], minlength=size,
+        )
+    )
+
+
+def _group_count(groups, size):
+    if numpy is None:
+        result = [0] * size
+        for group in groups:
+            if group >= 0:
+                result[group] += 1
+        return result
+    return numpy.bincount(groups[groups >= 0], minlength=size).tolist()
+
+
+def _negative(column):
+    if numpy is None:
+        return list(-value for value in column)
+    return -column
+
+
+def _order(keys):
+    """
+    Order row indexes by several keys, smallest first.
+
+    :param keys: A sequence of columns.  The first is the primary sort key,
+        the second breaks ties in the first, and so on.
+    """
+    if numpy is None:
+        return sorted(
+            range(len(keys[0])),
+            key=lambda i: tuple(key[i] for key in keys),
+        )
+    # lexsort sorts by its last key first.
+    return numpy.lexsort(tuple(reversed(keys))).tolist()
+
+
+def _positions(order):
+    """
+    Invert an ordering of row indexes to get the position of each row in it.
+    """
+    positions = [0] * len(order)
+    for position, i in enumerate(order):
+        positions[i] = position
+    return _column(positions)
+
+
+def _node_addresses(nodes):
+    """
+    Map every address of every node to the index of that node.
+    """
+    return {
+        address: i
+        for i, node
+        in enumerate(nodes)
+        for address
+        in node.addresses
+    }
+
+
+def _host_ip(pod):
+    if pod is None:
+        return None
+    return pod.host_ip
+
+
+def _pod_key(record):
+    """
+    Identify the pod a ``Pod`` or ``PodUsage`` record is about.  Pod names
+    are only unique within a namespace.
+    """
+    return (record.namespace, record.name)
+
+
+def _owner(pod):
+    if pod is None:
+        return None
+    return pod.owner
+
+
+def _restarts(pod):
+    if pod is None:
+        return 0
+    return pod.restarts
+
+
+def _created(pod):
+    """
+    Get the creation time of a pod in seconds since the epoch (or infinity if
+    it is not known, making it the youngest pod).
+    """
+    if pod is None or pod.created is None:
+        return float("inf")
+    return pod.created
+
+
+def _container_sum(containers, resource):
+    return sum(
+        (getattr(container, resource) for container in containers),
+        0,
+    )
+
+
+# The columns to order by (and then to break ties with) for the orderings
+# which put the largest values first.
+_DESCENDING = {
+    "cpu": ("cpu", "memory"),
+    "mem": ("memory", "cpu"),
+    "mem%": ("memory_percent", "memory"),
+    "restarts": ("restarts", "cpu"),
+}
+
+
+# Stands in for the usage of a node which the metrics backend did not report.
+_NO_USAGE = NodeUsage(name=None, cpu=0, memory=0, stale=True)
+
+
+@attr.s(frozen=True)
+class NodeColumns(object):
+    """
+    Per-node allocatable and used resources.
+
+    :ivar list stale: For each node, whether its usage is out of date (or
+        missing altogether, in which case it is counted as zero).
+    """
+    names = attr.ib()
+    cpu_allocatable = attr.ib()
+    memory_allocatable = attr.ib()
+    pods_allocatable = attr.ib()
+    cpu_used = attr.ib()
+    memory_used = attr.ib()
+    pod_count = attr.ib()
+    ready = attr.ib()
+    stale = attr.ib()
+
+    @classmethod
+    def from_data(cls, nodes, node_usage, pods, host_pods=None):
+        """
+        :param Counter host_pods: The number of pods on each host address, if
+            it is already known (see ``FrameModel``).
+        """
+        usage_by_name = {
+            usage.name: usage
+            for usage
+            in node_usage
+        }
+        usage = list(
+            usage_by_name.get(node.name, _NO_USAGE)
+            for node
+            in nodes
+        )
+
+        if host_pods is None:
+            addresses = _node_addresses(nodes)
+            node_index = _column(
+                addresses.get(_host_ip(pod), -1)
+                for pod
+                in pods
+            )
+            pod_count = _column(_group_count(node_index, len(nodes)))
+        else:
+            pod_count = _column(
+                sum(host_pods[address] for address in set(node.addresses))
+                for node
+                in nodes
+            )
+        return cls(
+            names=list(node.name for node in nodes),
+            cpu_allocatable=_column(node.cpu for node in nodes),
+            memory_allocatable=_column(node.memory for node in nodes),
+            pods_allocatable=_column(node.pods for node in nodes),
+            cpu_used=_column(u.cpu for u in usage),
+            memory_used=_column(u.memory for u in usage),
+            pod_count=pod_count,
+            ready=list(node.ready for node in nodes),
+            stale=list(u.stale for u in usage),
+        )
+
+
+    def cpu_percent(self):
+        return _percent(self.cpu_used, self.cpu_allocatable)
+
+
+    def memory_percent(self):
+        return _percent(self.memory_used, self.memory_allocatable)
+
+
+    def pod_percent(self):
+        return _percent(self.pod_count, self.pods_allocatable)
+
+
+
+@attr.s(frozen=True)
+class NodeSummary(object):
+    """
+    Cluster-wide figures standing in for a line per node.
+
+    :ivar list cpu_deciles: The number of nodes using each tenth (0-10%,
+        10-20%, ...) of their allocatable CPU.  The last also counts nodes
+        using more than all of it.
+
+    :ivar list hottest: The indexes of the nodes using the largest share of
+        their allocatable CPU, most first.
+    """
+    nodes = attr.ib()
+    not_ready = attr.ib()
+    stale = attr.ib()
+    cpu_used = attr.ib()
+    cpu_allocatable = attr.ib()
+    memory_used = attr.ib()
+    memory_allocatable = attr.ib()
+    pod_count = attr.ib()
+    pods_allocatable = attr.ib()
+    cpu_deciles = attr.ib()
+    hottest = attr.ib()
+
+    @classmethod
+    def from_columns(cls, columns, top):
+        """
+        :param NodeColumns columns: The nodes to summarize.
+
+        :param int top: The number of nodes to include in ``hottest``.
+        """
+        cpu_percent = _percent_column(
+            columns.cpu_used, columns.cpu_allocatable,
+        )
+        return cls(
+            nodes=len(columns.names),
+            not_ready=columns.ready.count(False),
+            stale=columns.stale.count(True),
+            cpu_used=_sum(columns.cpu_used),
+            cpu_allocatable=_sum(columns.cpu_allocatable),
+            memory_used=_sum(columns.memory_used),
+            memory_allocatable=_sum(columns.memory_allocatable),
+            pod_count=_sum(columns.pod_count),
+            pods_allocatable=_sum(columns.pods_allocatable),
+            cpu_deciles=_deciles(cpu_percent),
+            hottest=_largest(cpu_percent, top),
+        )
+
+
+
+@attr.s(frozen=True)
+class PodColumns(object):
+    """
+    Per-pod resource usage, one row per usage record.
+
+    :ivar node_index: The index (into the node list the columns were built
+        from) of the node each pod is running on, or -1 if it is not known.
+
+    :ivar namespace_index: The index into ``namespaces`` of the namespace of
+        each pod.
+
+    :ivar owners: The name of the owner of each pod, or ``None`` for pods
+        without one.
+
+    :ivar memory_percent: The memory used by each pod as a percentage of the
+        allocatable memory of its node (or -1 if the node is not known).
+
+    :ivar restarts: The total number of container restarts of each pod.
+
+    :ivar created: The creation time of each pod.
+
+    :ivar name_rank: The position of each pod when ordered by name and then
+        namespace.
+
+    :ivar namespace_rank: The position of each pod when ordered by namespace
+        and then name.
+    """
+    names = attr.ib()
+    namespaces = attr.ib()
+    namespace_index = attr.ib()
+    node_index = attr.ib()
+    owners = attr.ib()
+    cpu = attr.ib()
+    memory = attr.ib()
+    memory_percent = attr.ib()
+    restarts = attr.ib()
+    created = attr.ib()
+    name_rank = attr.ib()
+    namespace_rank = attr.ib()
+
+    @classmethod
+    def from_data(cls, pods, pod_usage, nodes):
+        addresses = _node_addresses(nodes)
+        node_memory = list(node.memory for node in nodes)
+        pod_by_name = {
+            _pod_key(pod): pod
+            for pod
+            in pods
+        }
+        # Pod information may be older than the usage information so there
+        # might not be any for some of the pods.
+        rows = list(
+            (usage, pod_by_name.get(_pod_key(usage)))
+            for usage
+            in pod_usage
+        )
+
+        names = list(usage.name for (usage, pod) in rows)
+        namespace_names = list(usage.namespace for (usage, pod) in rows)
+        namespaces = []
+        namespace_numbers = {}
+        for name in namespace_names:
+            if name not in namespace_numbers:
+                namespace_numbers[name] = len(namespaces)
+                namespaces.append(name)
+
+        node_index = list(
+            addresses.get(_host_ip(pod), -1) for (usage, pod) in rows
+        )
+        memory = list(
+            _container_sum(usage.containers, "memory")
+            for (usage, pod)
+            in rows
+        )
+        # Sort keys are plain scalars worked out once per row so that
+        # ordering never has to compare anything more complicated.
+        name_order = sorted(
+            range(len(rows)),
+            key=lambda i: (names[i], "{}".format(namespace_names[i])),
+        )
+        namespace_order = sorted(
+            range(len(rows)),
+            key=lambda i: ("{}".format(namespace_names[i]), names[i]),
+        )
+        return cls(
+            names=names,
+            namespaces=namespaces,
+            namespace_index=_column(
+                namespace_numbers[name] for name in namespace_names
+            ),
+            node_index=_column(node_index),
+            owners=list(_owner(pod) for (usage, pod) in rows),
+            cpu=_column(
+                _container_sum(usage.containers, "cpu")
+                for (usage, pod)
+                in rows
+            ),
+            memory=_column(memory),
+            # A pod on a node with no memory allocatable uses 0% of it, as
+            # in _percent_column.
+            memory_percent=_float_column(
+                -1 if node < 0
+                else 0.0 if node_memory[node] == 0
+                else used / node_memory[node] * 100
+                for (used, node)
+                in zip(memory, node_index)
+            ),
+            restarts=_column(_restarts(pod) for (usage, pod) in rows),
+            created=_float_column(_created(pod) for (usage, pod) in rows),
+            name_rank=_positions(name_order),
+            namespace_rank=_positions(namespace_order),
+        )
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def total_cpu(self):
+        return _sum(self.cpu)
+
+
+    def total_memory(self):
+        return _sum(self.memory)
+
+
+    def cpu_by_node(self, node_count):
+        return _group_sum(self.cpu, self.node_index, node_count)
+
+
+    def memory_by_node(self, node_count):
+        return _group_sum(self.memory, self.node_index, node_count)
+
+
+    def cpu_by_namespace(self):
+        return dict(zip(
+            self.namespaces,
+            _group_sum(self.cpu, self.namespace_index, len(self.namespaces)),
+        ))
+
+
+    def memory_by_namespace(self):
+        return dict(zip(
+            self.namespaces,
+            _group_sum(self.memory, self.namespace_index, len(self.namespaces)),
+        ))
+
+
+    def ranking(self, key="cpu"):
+        """
+        :param unicode key: The property to order by: ``"cpu"``, ``"mem"``,
+            ``"mem%"`` or ``"restarts"`` (largest first), ``"age"`` (oldest
+            first), ``"name"`` or ``"namespace"``.
+
+        :return list[int]: Row indexes in order.  Rows which tie are ordered
+            by name so that their order is the same from frame to frame.
+        """
+        if key == "name":
+            keys = [self.name_rank]
+        elif key == "namespace":
+            keys = [self.namespace_rank]
+        elif key == "age":
+            keys = [self.created, self.name_rank]
+        elif key in _DESCENDING:
+            keys = list(
+                _negative(getattr(self, attribute))
+                for attribute
+                in _DESCENDING[key]
+            ) + [self.name_rank]
+        else:
+            raise ValueError("Unknown sort key: {!r}".format(key))
+        return _order(keys)
+
+
+    def group(self, keys, sort="cpu"):
+        """
+        Roll rows up into groups in a single pass.
+
+        :param keys: A sequence giving the group key of each row.
+
+        :param unicode sort: The ranking (see ``ranking``) to use for the
+            members of each group.
+
+        :return list[Group]: The groups, ordered the same way as their
+            members.  The members of each group are row indexes in ranking
+            order.
+        """
+        cpu = _tolist(self.cpu)
+        memory = _tolist(self.memory)
+        accumulators = {}
+        for i in self.ranking(sort):
+            key = keys[i]
+            try:
+                accumulator = accumulators[key]
+            except KeyError:
+                accumulator = accumulators[key] = [0, 0, []]
+            accumulator[0] += cpu[i]
+            accumulator[1] += memory[i]
+            accumulator[2].append(i)
+        groups = list(
+            Group(key=key, cpu=cpu, memory=memory, members=members)
+            for (key, (cpu, memory, members))
+            in accumulators.items()
+        )
+        if sort in ("name", "namespace"):
+            return sorted(groups, key=lambda group: "{}".format(group.key))
+        if sort == "mem":
+            order = lambda group: (group.memory, group.cpu)
+        else:
+            order = lambda group: (group.cpu, group.memory)
+        return sorted(groups, key=order, reverse=True)
+
+
+
+@attr.s(frozen=True)
+class Group(object):
+    """
+    The combined usage of some pods.
+    """
+    key = attr.ib()
+    cpu = attr.ib()
+    memory = attr.ib()
+    members = attr.ib()
+
+
+
+def _ranking_key(usage):
+    """
+    The key by which a pod is ranked in a ``FrameModel``: the same as
+    ``PodColumns.ranking("cpu")``.
+    """
+    cpu = _container_sum(usage.containers, "cpu")
+    memory = _container_sum(usage.containers, "memory")
+    return (-cpu, -memory, usage.name, "{}".format(usage.namespace))
+
+
+def _changes(old, new, key):
+    """
+    Compare the records of two frames.
+
+    :param dict old: The records of the old frame by key.
+
+    :param new: The records of the new frame.
+
+    :param key: A one-argument callable giving the key of a record.
+
+    :return: A ``dict`` of the new records by key and a ``list`` of
+        ``(old, new)`` pairs for the records which were added (``old`` is
+        ``None``), changed or removed (``new`` is ``None``).
+    """
+    by_key = {}
+    changes = []
+    for record in new:
+        k = key(record)
+        by_key[k] = record
+        previous = old.get(k)
+        if previous is not record and previous != record:
+            changes.append((previous, record))
+    for k, record in old.items():
+        if k not in by_key:
+            changes.append((record, None))
+    return by_key, changes
+
+
+
+def _prune(counter):
+    """
+    Forget the keys of a ``Counter`` which are no longer counted.
+    """
+    for key in list(counter):
+        if counter[key] <= 0:
+            del counter[key]
+
+
+
+@attr.s(frozen=True)
+class Frame(object):
+    """
+    A consistent view of a ``FrameModel``.
+
+    :ivar dict phases: The number of pods in each phase.
+
+    :ivar Counter host_pods: The number of pods on each host address.
+
+    :ivar list ranked: ``(cpu, memory, usage, host_ip)`` for each pod usage
+        record, ordered like ``PodColumns.ranking("cpu")``.
+    """
+    phases = attr.ib()
+    host_pods = attr.ib()
+    ranked = attr.ib()
+
+
+
+@attr.s
+class FrameModel(object):
+    """
+    Pod data kept up to date from frame to frame.
+
+    Frames may be applied from several threads at once (see ``_offload``).
+
+    :ivar int changes: The number of records added, changed or removed so
+        far.
+    """
+    changes = attr.ib(default=0)
+
+    _pods = attr.ib(default=attr.Factory(dict))
+    _usage = attr.ib(default=attr.Factory(dict))
+    _phases = attr.ib(default=attr.Factory(Counter))
+    _host_pods = attr.ib(default=attr.Factory(Counter))
+    _ranking = attr.ib(default=attr.Factory(list))
+    _last = attr.ib(default=(None, None))
+    _lock = attr.ib(default=attr.Factory(Lock))
+
+    def update(self, pods, pod_usage):
+        """
+        Apply a frame.
+
+        :param pods: The ``Pod`` records of the frame.
+
+        :param pod_usage: The ``PodUsage`` records of the frame.
+
+        :return Frame: The model after applying the frame.
+        """
+        with self._lock:
+            (last_pods, last_usage) = self._last
+            if pods is not last_pods:
+                self._update_pods(pods)
+            if pod_usage is not last_usage:
+                self._update_usage(pod_usage)
+            self._last = (pods, pod_usage)
+            return Frame(
+                phases=dict(self._phases),
+                host_pods=Counter(self._host_pods),
+                ranked=list(
+                    (
+                        -key[0], -key[1], usage,
+                        _host_ip(self._pods.get(_pod_key(usage))),
+                    )
+                    for (key, usage)
+                    in self._ranking
+                ),
+            )
+
+
+    def _update_pods(self, pods):
+        self._pods, changes = _changes(self._pods, pods, _pod_key)
+        self.changes += len(changes)
+        for (old, new) in changes:
+            if old is not None:
+                self._phases[old.phase] -= 1
+                self._host_pods[old.host_ip] -= 1
+            if new is not None:
+                self._phases[new.phase] += 1
+                self._host_pods[new.host_ip] += 1
+        _prune(self._phases)
+        _prune(self._host_pods)
+
+
+    def _update_usage(self, pod_usage):
+        self._usage, changes = _changes(self._usage, pod_usage, _pod_key)
+        self.changes += len(changes)
+        for (old, new) in changes:
+            if old is not None:
+                entry = (_ranking_key(old), old)
+                del self._ranking[bisect_left(self._ranking, entry)]
+            if new is not None:
+                insort(self._ranking, (_ranking_key(new), new))
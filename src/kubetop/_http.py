@@ -0,0 +1,268 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Economical retrieval of JSON documents over HTTP.
+
+Theory of Operation
+===================
+
+#. Keep connections to the server open between requests so that each
+   request does not pay for setting up a new (TLS) connection.
+#. Offer to accept gzip-compressed responses and decompress them as they
+   arrive.
+#. Remember the entity tag of each response and make the next request for
+   the same location conditional on it, so the server can answer with a
+   bodiless *304 Not Modified* when nothing has changed.
+#. Remember the ``resourceVersion`` of each Kubernetes list response, so an
+   unchanged list (however it arrived) is not decoded into model objects
+   again.
+#. Remember a digest of each response body, so a body identical to the last
+   one (such as a metrics sample which has not been replaced yet) is not even
+   parsed.
+#. Optionally prefer the Kubernetes protobuf encoding over JSON, falling back
+   to JSON whenever the server responds with that instead.
+#. Parse and decode response bodies with a runner (see ``_offload``) so the
+   work can be kept off the reactor thread.
+#. Fail on any other response than *200 OK* (or *304 Not Modified*) and
+   remember nothing about it.  A Kubernetes ``Status`` document (such as
+   the one which comes with *403 Forbidden*) is not the document asked for.
+"""
+
+from json import loads
+from hashlib import sha1
+
+from twisted.web.client import (
+    Agent, ContentDecoderAgent, GzipDecoder, HTTPConnectionPool,
+)
+from twisted.web.http import NOT_MODIFIED, OK
+from twisted.internet.defer import succeed
+
+import attr
+
+from treq import content
+
+from ._protobuf import CONTENT_TYPE as PROTOBUF
+from ._offload import synchronous
+
+
+def connection_pool(reactor, connections):
+    """
+    Create a pool of persistent connections which is emptied when the reactor
+    shuts down.
+
+    :param int connections: The most idle connections to keep open to each
+        server.
+    """
+    pool = HTTPConnectionPool(reactor, persistent=True)
+    pool.maxPersistentPerHost = connections
+    reactor.addSystemEventTrigger(
+        "before", "shutdown", pool.closeCachedConnections,
+    )
+    return pool
+
+
+
+def use_pool(agent, pool):
+    """
+    Make the ``Agent`` beneath some wrapping agents keep its connections in a
+    pool.
+
+    txkube creates its agents without a pool, which means a new connection
+    for every request.
+
+    :param IAgent agent: The agent, possibly wrapped by agents which keep the
+        wrapped agent in an ``_agent`` attribute (as txkube's and Twisted's
+        do).
+
+    :param HTTPConnectionPool pool: The pool to use.
+
+    :return bool: Whether an ``Agent`` was found.
+    """
+    while not isinstance(agent, Agent):
+        agent = getattr(agent, "_agent", None)
+        if agent is None:
+            return False
+    agent._pool = pool
+    return True
+
+
+
+def compressing_agent(agent):
+    """
+    Wrap an ``IAgent`` so that it negotiates gzip content-encoding.
+
+    :param IAgent agent: The agent which will issue the requests.
+
+    :return IAgent: An agent which asks for compressed responses and delivers
+        decompressed response bodies.
+    """
+    return ContentDecoderAgent(agent, [(b"gzip", GzipDecoder)])
+
+
+
+@attr.s
+class _Remembered(object):
+    etag = attr.ib()
+    resource_version = attr.ib()
+    digest = attr.ib()
+    value = attr.ib()
+
+
+
+def _loads(body):
+    return loads(body.decode("utf-8"))
+
+
+
+def _resource_version(document):
+    try:
+        return document["metadata"]["resourceVersion"]
+    except (KeyError, TypeError):
+        return None
+
+
+
+class UnexpectedResponse(Exception):
+    """
+    The server answered with a status other than *200 OK*.
+
+    :ivar int code: The status code.
+
+    :ivar unicode url: The location requested.
+
+    :ivar unicode message: The message of the Kubernetes ``Status`` document
+        in the response, or the beginning of the response body.
+    """
+    def __init__(self, code, url, message):
+        Exception.__init__(self, code, url, message)
+        self.code = code
+        self.url = url
+        self.message = message
+
+
+
+def _status_message(body):
+    """
+    Get the message of a Kubernetes ``Status`` document, or the beginning of
+    any other response body.
+    """
+    try:
+        return _loads(body)["message"]
+    except (ValueError, KeyError, TypeError):
+        return body[:200].decode("utf-8", "replace")
+
+
+
+def _unexpected(body, code, url):
+    raise UnexpectedResponse(code, url, _status_message(body))
+
+
+
+@attr.s
+class ConditionalGetter(object):
+    """
+    Issue GETs for JSON documents, avoiding work for documents which have not
+    changed since they were last retrieved.
+
+    :ivar int not_modified: The number of requests answered with *304 Not
+        Modified*.
+
+    :ivar int unchanged: The number of responses whose ``resourceVersion``
+        showed that they had not changed.
+
+    :ivar int identical: The number of responses with the same body as the
+        previous response for the same location.
+
+    :ivar run: The runner with which to parse and decode responses.
+    """
+    not_modified = attr.ib(default=0)
+    unchanged = attr.ib(default=0)
+    identical = attr.ib(default=0)
+    run = attr.ib(default=synchronous)
+
+    _remembered = attr.ib(default=attr.Factory(dict))
+
+    def get(self, client, url, decode=None, protobuf=None):
+        """
+        Retrieve and decode a JSON document.
+
+        :param treq.client.HTTPClient client: The client with which to issue
+            the request.
+
+        :param unicode url: The location of the document.
+
+        :param decode: A one-argument callable to transform the parsed JSON
+            into the desired result, or ``None`` to use the parsed JSON as is.
+
+        :param protobuf: ``None`` to ask for JSON or a one-argument callable
+            to ask for protobuf and turn a protobuf response body into the
+            same document the JSON would have parsed to.
+
+        :return Deferred: A ``Deferred`` that fires with the result.
+        """
+        remembered = self._remembered.get(url)
+        headers = {}
+        if remembered is not None and remembered.etag is not None:
+            headers[b"If-None-Match"] = [remembered.etag]
+        if protobuf is not None:
+            headers[b"Accept"] = [PROTOBUF + b", application/json"]
+
+        d = client.get(url, headers=headers)
+        d.addCallback(self._got_response, url, remembered, decode, protobuf)
+        return d
+
+
+    def _got_response(self, response, url, remembered, decode, protobuf):
+        if response.code == NOT_MODIFIED and remembered is not None:
+            self.not_modified += 1
+            return remembered.value
+        if response.code != OK:
+            return content(response).addCallback(
+                _unexpected, response.code, url,
+            )
+
+        etag = response.headers.getRawHeaders(b"etag", [None])[0]
+        content_type = response.headers.getRawHeaders(b"content-type", [b""])[0]
+        if protobuf is not None and content_type.startswith(PROTOBUF):
+            parse = protobuf
+        else:
+            parse = _loads
+        d = content(response)
+        d.addCallback(self._got_body, url, etag, remembered, decode, parse)
+        return d
+
+
+    def _got_body(self, body, url, etag, remembered, decode, parse):
+        digest = sha1(body).digest()
+        if remembered is not None and remembered.digest == digest:
+            self.identical += 1
+            self._remembered[url] = attr.evolve(remembered, etag=etag)
+            return remembered.value
+
+        d = self.run(parse, body)
+        d.addCallback(
+            self._got_document, url, etag, digest, remembered, decode,
+        )
+        return d
+
+
+    def _got_document(self, document, url, etag, digest, remembered, decode):
+        version = _resource_version(document)
+        if (
+            remembered is not None and
+            version is not None and
+            version == remembered.resource_version
+        ):
+            self.unchanged += 1
+            d = succeed(remembered.value)
+        elif decode is None:
+            d = succeed(document)
+        else:
+            d = self.run(decode, document)
+
+        def decoded(value):
+            self._remembered[url] = _Remembered(etag, version, digest, value)
+            return value
+        d.addCallback(decoded)
+        return d
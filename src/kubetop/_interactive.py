@@ -0,0 +1,191 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Keyboard control of a running kubetop.
+
+Theory of Operation
+===================
+
+#. Put the terminal into cbreak mode so keypresses arrive one at a time (but
+   output processing, and so newline handling, is left alone).
+#. Have the reactor read keypresses from standard input as they arrive.
+#. Translate keypresses into changes to the ``Screen`` and its ``View`` and
+   re-render the most recently fetched frame.
+"""
+
+from __future__ import unicode_literals
+
+from os import read
+from errno import EAGAIN
+from termios import tcgetattr, tcsetattr, TCSAFLUSH
+from tty import setcbreak
+
+from zope.interface import implementer
+
+import attr
+
+from twisted.internet.interfaces import IReadDescriptor
+from twisted.internet.main import CONNECTION_DONE
+
+from ._view import GROUP_BY
+
+_ESCAPE = "\x1b"
+
+_PAGE_UP = "\x1b[5~"
+_PAGE_DOWN = "\x1b[6~"
+_UP = "\x1b[A"
+_DOWN = "\x1b[B"
+
+_BACKSPACE = ("\x7f", "\x08")
+_ENTER = ("\r", "\n")
+
+_SORT_KEYS = {
+    "c": "cpu",
+    "m": "mem",
+    "%": "mem%",
+    "n": "name",
+    "s": "namespace",
+    "r": "restarts",
+    "a": "age",
+}
+
+
+@attr.s
+class KeyboardControl(object):
+    """
+    Interpret keypresses as commands to change what is shown.
+
+    :ivar screen: The ``Screen`` to control.
+
+    :ivar quit: A zero-argument callable to call when the user asks to quit.
+    """
+    screen = attr.ib()
+    quit = attr.ib()
+
+    _filtering = attr.ib(default=False)
+    _pending = attr.ib(default="")
+
+    def keys_received(self, data):
+        keys = self._pending + data
+        self._pending = ""
+        while keys:
+            key, keys = self._next_key(keys)
+            if key is None:
+                # Part of an escape sequence; wait for the rest.
+                self._pending = keys
+                break
+            self._key(key)
+        self.screen.refresh()
+
+
+    def _next_key(self, keys):
+        if keys.startswith(_ESCAPE + "["):
+            for end in range(2, len(keys)):
+                if keys[end].isalpha() or keys[end] == "~":
+                    return keys[:end + 1], keys[end + 1:]
+            return None, keys
+        return keys[0], keys[1:]
+
+
+    def _key(self, key):
+        view = self.screen.view
+        if self._filtering:
+            if key in _ENTER:
+                self._filtering = False
+            elif key == _ESCAPE:
+                self._filtering = False
+                view.filter = ""
+            elif key in _BACKSPACE:
+                view.filter = view.filter[:-1]
+            elif len(key) == 1 and key >= " ":
+                view.filter += key
+            view.offset = 0
+            return
+
+        page = max(1, self.screen.page_size() // 2)
+        if key == "q":
+            self.quit()
+        elif key == "p":
+            self.screen.paused = not self.screen.paused
+        elif key in _SORT_KEYS:
+            view.sort = _SORT_KEYS[key]
+            view.offset = 0
+        elif key == "g":
+            choices = (None,) + GROUP_BY
+            view.group_by = choices[
+                (choices.index(view.group_by) + 1) % len(choices)
+            ]
+            view.offset = 0
+        elif key == "e":
+            view.expand = not view.expand
+        elif key == "/":
+            self._filtering = True
+            view.filter = ""
+            view.offset = 0
+        elif key in ("j", _DOWN):
+            view.offset += 1
+        elif key in ("k", _UP):
+            view.offset = max(0, view.offset - 1)
+        elif key in (" ", _PAGE_DOWN):
+            view.offset += page
+        elif key == _PAGE_UP:
+            view.offset = max(0, view.offset - page)
+
+
+
+@implementer(IReadDescriptor)
+@attr.s
+class _KeyReader(object):
+    """
+    Deliver bytes read from a terminal to a ``KeyboardControl``.
+    """
+    fd = attr.ib()
+    control = attr.ib()
+
+    def fileno(self):
+        return self.fd
+
+
+    def doRead(self):
+        try:
+            data = read(self.fd, 1024)
+        except (IOError, OSError) as e:
+            if e.errno == EAGAIN:
+                return
+            raise
+        if not data:
+            return CONNECTION_DONE
+        self.control.keys_received(data.decode("utf-8", "replace"))
+
+
+    def connectionLost(self, reason):
+        pass
+
+
+    def logPrefix(self):
+        return "kubetop-keyboard"
+
+
+
+def listen_keyboard(reactor, fd, control):
+    """
+    Start delivering keypresses on a terminal to a ``KeyboardControl``.
+
+    The terminal is put into cbreak mode until the reactor shuts down.
+
+    :param reactor: An ``IReactorFDSet`` & ``IReactorCore`` provider.
+
+    :param int fd: The terminal file descriptor to read.
+
+    :param KeyboardControl control: The recipient of the keypresses.
+    """
+    original = tcgetattr(fd)
+    setcbreak(fd)
+    reader = _KeyReader(fd, control)
+    reactor.addReader(reader)
+
+    def restore():
+        reactor.removeReader(reader)
+        tcsetattr(fd, TCSAFLUSH, original)
+    reactor.addSystemEventTrigger("before", "shutdown", restore)
@@ -0,0 +1,141 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Loading kubectl configuration.
+
+Theory of Operation
+===================
+
+#. Parse the configuration file once, with the C implementation of the YAML
+   loader if PyYAML has one, and hand the parsed document to everything
+   which needs it (option handling, then the data source).
+#. Optionally remember the parsed document on disk as JSON, which is much
+   quicker to load than YAML.  The cached copy is used only while the
+   configuration file has the same modification time and size as when it
+   was parsed.  It holds credentials so only its owner may read it.
+#. Look up just the one context in use rather than processing every
+   context, cluster and user in the file.
+"""
+
+from __future__ import unicode_literals
+
+from os import O_WRONLY, O_CREAT, O_TRUNC, open as os_open, fdopen, rename
+from os.path import dirname, join
+from json import dumps, loads
+from hashlib import sha1
+from base64 import b64decode
+
+
+def _parse(text):
+    from yaml import load
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader
+    return load(text, Loader=Loader)
+
+
+
+def _stamp(path):
+    path.restat()
+    return [path.getModificationTime(), path.getsize()]
+
+
+
+def _cached(path, cache):
+    """
+    Get the cache entry for a configuration file.
+    """
+    return cache.child(
+        sha1(path.path.encode("utf-8")).hexdigest() + ".json",
+    )
+
+
+
+def _remember(entry, stamp, document):
+    try:
+        serialized = dumps({"stamp": stamp, "document": document})
+    except (TypeError, ValueError):
+        # Something in the document JSON can't represent.  Don't cache it.
+        return
+    if not entry.parent().isdir():
+        entry.parent().makedirs()
+        entry.parent().chmod(0o700)
+    temporary = entry.siblingExtension(".new")
+    fd = os_open(temporary.path, O_WRONLY | O_CREAT | O_TRUNC, 0o600)
+    with fdopen(fd, "w") as f:
+        f.write(serialized)
+    rename(temporary.path, entry.path)
+
+
+
+def load(path, cache=None):
+    """
+    Load a kubectl configuration file.
+
+    :param FilePath path: The location of the file.
+
+    :param FilePath cache: A directory in which to remember parsed
+        configuration, or ``None`` to parse it every time.
+
+    :return dict: The configuration.
+    """
+    if cache is None:
+        return _parse(path.getContent())
+
+    stamp = _stamp(path)
+    entry = _cached(path, cache)
+    try:
+        remembered = loads(entry.getContent().decode("utf-8"))
+    except (IOError, OSError, ValueError):
+        pass
+    else:
+        if remembered["stamp"] == stamp:
+            return remembered["document"]
+
+    document = _parse(path.getContent())
+    _remember(entry, stamp, document)
+    return document
+
+
+
+def current_context(config):
+    return config["current-context"]
+
+
+
+def _named(entries, name):
+    for entry in entries or ():
+        if entry["name"] == name:
+            return entry
+    raise KeyError(name)
+
+
+
+def credential(section, key, config_path):
+    """
+    Get the bytes of a certificate or key, which the configuration holds
+    either itself (base64-encoded, as ``<key>-data``) or in a file.
+
+    :param FilePath config_path: The configuration file.  Relative file names
+        are relative to its directory.
+    """
+    if key + "-data" in section:
+        return b64decode(section[key + "-data"])
+    with open(join(dirname(config_path.path), section[key]), "rb") as f:
+        return f.read()
+
+
+
+def context_details(config, context):
+    """
+    Find the cluster and user of a context.
+
+    :return: A tuple of the ``cluster`` and ``user`` sections.
+    """
+    details = _named(config["contexts"], context)["context"]
+    return (
+        _named(config["clusters"], details["cluster"])["cluster"],
+        _named(config.get("users"), details["user"])["user"],
+    )
@@ -0,0 +1,83 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Moving CPU-heavy work off the reactor thread.
+
+Theory of Operation
+===================
+
+#. Code which decodes responses or builds frames does so through a *runner*:
+   a callable like ``maybeDeferred`` which calls a function and returns a
+   ``Deferred`` that fires with its result.
+#. The default runner calls the function right away, on the reactor thread.
+   The thread runner calls it in a thread pool, so the reactor keeps
+   servicing timers and keyboard input while the work is done.  The work
+   still needs the GIL, so it slows the reactor down instead of stopping it.
+#. ``LagMonitor`` measures how late the reactor runs a timer, which is how
+   long anything else waiting on the reactor would have been held up.
+"""
+
+from __future__ import division
+
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThreadPool
+
+import attr
+
+synchronous = maybeDeferred
+
+
+def thread_runner(reactor, pool):
+    """
+    Create a runner which runs functions in a thread pool.
+
+    :param reactor: The reactor to deliver results to.
+
+    :param twisted.python.threadpool.ThreadPool pool: The pool to run
+        functions in.  It must be started before the runner is used.
+    """
+    def run(f, *args, **kwargs):
+        return deferToThreadPool(reactor, pool, f, *args, **kwargs)
+    return run
+
+
+
+@attr.s
+class LagMonitor(object):
+    """
+    Repeatedly schedule a timer and remember how late it fired.
+
+    :ivar clock: The ``IReactorTime`` provider to measure.
+
+    :ivar float interval: Seconds between timers.
+
+    :ivar list lags: How late, in seconds, each timer fired.
+    """
+    clock = attr.ib()
+    interval = attr.ib(default=0.01)
+    lags = attr.ib(default=attr.Factory(list))
+
+    _call = attr.ib(default=None)
+    _expected = attr.ib(default=None)
+
+    def start(self):
+        self._call = LoopingCall(self._tick)
+        self._call.clock = self.clock
+        self._expected = self.clock.seconds()
+        self._call.start(self.interval)
+
+
+    def stop(self):
+        self._call.stop()
+
+
+    def _tick(self):
+        now = self.clock.seconds()
+        self.lags.append(max(0, now - self._expected))
+        self._expected = now + self.interval
+
+
+    def max_lag(self):
+        return max(self.lags or [0])
@@ -0,0 +1,103 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Profiling kubetop while it runs.
+
+Theory of Operation
+===================
+
+#. ``--profile FILE`` profiles the whole run (so, with ``--iterations``, that
+   many frames) and writes the statistics to ``FILE`` in the ``pstats``
+   format as the reactor shuts down.
+#. ``SIGUSR1`` starts profiling a process which is already running and a
+   second ``SIGUSR1`` stops it and writes the statistics to a new file in the
+   directory of the log.
+#. cProfile records each Deferred callback under the file and line which
+   define it, so the callbacks ``_Source`` chains together are told apart
+   even though most of them are lambdas.  Next to each statistics file,
+   write a report of only the ``_topdata`` functions, by cumulative time,
+   which shows how the time of a fetch divides between its callbacks.
+#. Only the reactor thread is profiled.  Work given to the ``--threads``
+   pool shows up as the time taken to hand it over and no more.
+"""
+
+from __future__ import unicode_literals
+
+from os import getpid
+from signal import SIGUSR1, signal
+from cProfile import Profile
+from pstats import Stats
+
+import attr
+
+from twisted.logger import Logger
+
+# The functions included in the report written with the statistics.
+REPORT = "_topdata"
+
+_log = Logger()
+
+
+def write_stats(profile, path):
+    """
+    Write the statistics of a profile to ``path`` and a report of the
+    ``_Source`` callbacks to ``path`` plus ``.txt``.
+    """
+    profile.dump_stats(path)
+    with open(path + ".txt", "w") as report:
+        stats = Stats(profile, stream=report)
+        stats.sort_stats("cumulative").print_stats(REPORT)
+
+
+
+@attr.s
+class Profiler(object):
+    """
+    Turn a ``cProfile.Profile`` on and off.
+    """
+    _profile = attr.ib(default=None)
+
+    @property
+    def running(self):
+        return self._profile is not None
+
+
+    def start(self):
+        self._profile = Profile()
+        self._profile.enable()
+
+
+    def stop(self, path):
+        """
+        Stop profiling, if it is running, and write the statistics.
+        """
+        profile, self._profile = self._profile, None
+        if profile is not None:
+            profile.disable()
+            write_stats(profile, path)
+
+
+
+def profile_on_signal(reactor, profiler, directory, signum=SIGUSR1):
+    """
+    Start and stop ``profiler`` each time the process receives a signal.
+
+    :param FilePath directory: Where to write the statistics.
+
+    :return: The previous handler of the signal.
+    """
+    def toggle():
+        if profiler.running:
+            path = directory.child("kubetop-{}-{}.pstats".format(
+                getpid(), int(reactor.seconds()),
+            )).path
+            profiler.stop(path)
+            _log.info("Wrote profile to {path}", path=path)
+        else:
+            profiler.start()
+            _log.info("Profiling until the next signal {signum}", signum=signum)
+
+    return signal(
+        signum, lambda signum, frame: reactor.callFromThread(toggle),
+    )
@@ -0,0 +1,320 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Decoding of the Kubernetes protobuf wire format.
+
+Theory of Operation
+===================
+
+#. The API server wraps protobuf responses in an envelope: a four byte magic
+   number followed by a ``runtime.Unknown`` message whose ``raw`` field holds
+   the encoded object.
+#. Walk the protobuf wire format of the object directly, descending only into
+   the fields kubetop uses and skipping over everything else without
+   decoding it.
+#. Produce the same (JSON-shaped) documents the JSON path produces, limited
+   to those fields, so nothing downstream needs to know which format was
+   used.
+
+Field numbers come from the ``generated.proto`` files of the ``k8s.io/api``
+and ``k8s.io/apimachinery`` packages.
+"""
+
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+CONTENT_TYPE = b"application/vnd.kubernetes.protobuf"
+
+_MAGIC = b"k8s\x00"
+
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH_DELIMITED = 2
+_FIXED32 = 5
+
+
+class DecodeError(Exception):
+    """
+    The data could not be decoded.
+    """
+
+
+
+def _varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+
+def _fields(data, start=0, end=None):
+    """
+    Iterate over the fields of a message.
+
+    :param bytearray data: A buffer containing the message.
+
+    :return: An iterator of ``(field number, value)`` tuples.  Varint fields
+        have integer values.  Length-delimited fields have ``(start, end)``
+        tuples giving their location in ``data``.  Fixed-width fields are
+        skipped.
+    """
+    if end is None:
+        end = len(data)
+    offset = start
+    try:
+        while offset < end:
+            # Field keys and most lengths fit in a single byte.
+            key = data[offset]
+            if key & 0x80:
+                key, offset = _varint(data, offset)
+            else:
+                offset += 1
+            field = key >> 3
+            wire_type = key & 0x7
+            if wire_type == _VARINT:
+                value, offset = _varint(data, offset)
+                yield field, value
+            elif wire_type == _LENGTH_DELIMITED:
+                length = data[offset]
+                if length & 0x80:
+                    length, offset = _varint(data, offset)
+                else:
+                    offset += 1
+                yield field, (offset, offset + length)
+                offset += length
+            elif wire_type == _FIXED64:
+                offset += 8
+            elif wire_type == _FIXED32:
+                offset += 4
+            else:
+                raise DecodeError("Unsupported wire type {}".format(wire_type))
+    except IndexError:
+        raise DecodeError("Truncated message")
+    if offset != end:
+        raise DecodeError("Truncated message")
+
+
+
+def _string(data, location):
+    start, end = location
+    return bytes(data[start:end]).decode("utf-8")
+
+
+
+def _time(data, location):
+    seconds = 0
+    for field, value in _fields(data, *location):
+        if field == 1:
+            seconds = value
+    return datetime.utcfromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+
+def _owner_reference(data, location):
+    reference = {"controller": False}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            reference["kind"] = _string(data, value)
+        elif field == 3:
+            reference["name"] = _string(data, value)
+        elif field == 4:
+            reference["uid"] = _string(data, value)
+        elif field == 5:
+            reference["apiVersion"] = _string(data, value)
+        elif field == 6:
+            reference["controller"] = bool(value)
+    return reference
+
+
+
+def _object_meta(data, location):
+    metadata = {}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            metadata["name"] = _string(data, value)
+        elif field == 3:
+            metadata["namespace"] = _string(data, value)
+        elif field == 6:
+            metadata["resourceVersion"] = _string(data, value)
+        elif field == 8:
+            metadata["creationTimestamp"] = _time(data, value)
+        elif field == 13:
+            metadata.setdefault("ownerReferences", []).append(
+                _owner_reference(data, value),
+            )
+    return metadata
+
+
+
+def _list_meta(data, location):
+    metadata = {}
+    for field, value in _fields(data, *location):
+        if field == 2:
+            metadata["resourceVersion"] = _string(data, value)
+    return metadata
+
+
+
+def _container_status(data, location):
+    status = {
+        "ready": False,
+        "restartCount": 0,
+        "image": "",
+        "imageID": "",
+    }
+    for field, value in _fields(data, *location):
+        if field == 1:
+            status["name"] = _string(data, value)
+        elif field == 4:
+            status["ready"] = bool(value)
+        elif field == 5:
+            status["restartCount"] = value
+        elif field == 6:
+            status["image"] = _string(data, value)
+        elif field == 7:
+            status["imageID"] = _string(data, value)
+    return status
+
+
+
+def _pod_status(data, location):
+    status = {}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            status["phase"] = _string(data, value)
+        elif field == 5:
+            status["hostIP"] = _string(data, value)
+        elif field == 8:
+            status.setdefault("containerStatuses", []).append(
+                _container_status(data, value),
+            )
+    return status
+
+
+
+def _pod(data, location):
+    pod = {}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            pod["metadata"] = _object_meta(data, value)
+        elif field == 3:
+            pod["status"] = _pod_status(data, value)
+    return pod
+
+
+
+def _quantities(data, location, into):
+    key = quantity = None
+    for field, value in _fields(data, *location):
+        if field == 1:
+            key = _string(data, value)
+        elif field == 2:
+            for quantity_field, string in _fields(data, *value):
+                if quantity_field == 1:
+                    quantity = _string(data, string)
+    into[key] = quantity
+
+
+
+def _pairs(data, location, first_name, second_name):
+    pair = {}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            pair[first_name] = _string(data, value)
+        elif field == 2:
+            pair[second_name] = _string(data, value)
+    return pair
+
+
+
+def _node_status(data, location):
+    status = {"allocatable": {}, "conditions": [], "addresses": []}
+    for field, value in _fields(data, *location):
+        if field == 2:
+            _quantities(data, value, status["allocatable"])
+        elif field == 4:
+            status["conditions"].append(
+                _pairs(data, value, "type", "status"),
+            )
+        elif field == 5:
+            status["addresses"].append(
+                _pairs(data, value, "type", "address"),
+            )
+    return status
+
+
+
+def _node(data, location):
+    node = {}
+    for field, value in _fields(data, *location):
+        if field == 1:
+            node["metadata"] = _object_meta(data, value)
+        elif field == 3:
+            node["status"] = _node_status(data, value)
+    return node
+
+
+
+def _list(kind, item, body):
+    data = _unwrap(body)
+    result = {
+        "kind": kind,
+        "apiVersion": "v1",
+        "metadata": {},
+        "items": [],
+    }
+    for field, value in _fields(data):
+        if field == 1:
+            result["metadata"] = _list_meta(data, value)
+        elif field == 2:
+            result["items"].append(item(data, value))
+    return result
+
+
+
+def _unwrap(body):
+    """
+    Get the encoded object out of the envelope.
+    """
+    if not body.startswith(_MAGIC):
+        raise DecodeError("Missing protobuf envelope")
+    data = bytearray(body)
+    for field, value in _fields(data, len(_MAGIC)):
+        if field == 2:
+            start, end = value
+            return data[start:end]
+    raise DecodeError("Envelope contains no object")
+
+
+
+def decode_pod_list(body):
+    """
+    Decode a protobuf-encoded ``v1.PodList``.
+
+    :param bytes body: The response body (including the envelope).
+
+    :return dict: A document like the JSON ``PodList`` with only the fields
+        kubetop uses.
+    """
+    return _list("PodList", _pod, body)
+
+
+
+def decode_node_list(body):
+    """
+    Decode a protobuf-encoded ``v1.NodeList``.
+
+    :param bytes body: The response body (including the envelope).
+
+    :return dict: A document like the JSON ``NodeList`` with only the fields
+        kubetop uses.
+    """
+    return _list("NodeList", _node, body)
@@ -0,0 +1,63 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Parsing of Kubernetes resource quantities.
+
+Theory of Operation
+===================
+
+#. Split a quantity string into its number (which may have a fractional
+   part, as in ``"0.5"``) and its suffix.
+#. Scale the number by the factor the suffix names (or a default) and round
+   it to a whole number of the unit.  metrics-server reports CPU usage in
+   nanocores (``"1603568n"``), which is a fraction of a millicore.
+"""
+
+from __future__ import unicode_literals
+
+from fractions import Fraction
+
+
+def partition(seq, pred):
+    return (
+        u"".join(x for x in seq if pred(x)),
+        u"".join(x for x in seq if not pred(x)),
+    )
+
+
+def parse_millicores(s):
+    return parse_k8s_resource(s, default_scale=1000)
+
+
+def parse_bytes(s):
+    return parse_k8s_resource(s, default_scale=1)
+
+
+def parse_k8s_resource(s, default_scale):
+    amount, suffix = partition(s, lambda c: c.isdigit() or c == ".")
+    try:
+        scale = suffix_scale(suffix)
+    except KeyError:
+        scale = default_scale
+    return int(round(Fraction(amount) * scale))
+
+
+def suffix_scale(suffix):
+    return {
+        "n": Fraction(1, 10 ** 6),
+        "u": Fraction(1, 10 ** 3),
+        "m": 1,
+        "K": 2 ** 10,
+        "Ki": 2 ** 10,
+        "M": 2 ** 20,
+        "Mi": 2 ** 20,
+        "G": 2 ** 30,
+        "Gi": 2 ** 30,
+        "T": 2 ** 40,
+        "Ti": 2 ** 40,
+        "P": 2 ** 50,
+        "Pi": 2 ** 50,
+        "E": 2 ** 60,
+        "Ei": 2 ** 60,
+    }[suffix]
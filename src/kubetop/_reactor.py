@@ -0,0 +1,46 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Choosing the reactor kubetop runs on.
+
+Theory of Operation
+===================
+
+#. A reactor has to be installed before anything imports
+   ``twisted.internet.reactor``, which installs the default one.  twist
+   installs the default reactor just after the kubetop options are parsed
+   so ``KubetopOptions`` installs the chosen one as it finishes parsing.
+#. ``asyncio`` runs Twisted on an ``asyncio`` event loop.  ``uvloop`` does the
+   same with an event loop from uvloop (an optional dependency), which is
+   implemented on libuv.
+#. Everything else (fetching, rendering, the keyboard) works the same on any
+   of them.
+"""
+
+from __future__ import unicode_literals
+
+# The reactors which can be chosen on the command line.
+REACTORS = ("default", "asyncio", "uvloop")
+
+
+def install_reactor(name):
+    """
+    Install one of ``REACTORS`` as the global reactor.
+
+    :raise ImportError: If the event loop the reactor needs is not
+        installed.
+    """
+    if name == "default":
+        return
+
+    if name == "uvloop":
+        from uvloop import new_event_loop
+    else:
+        from asyncio import new_event_loop
+    from asyncio import set_event_loop
+    from twisted.internet.asyncioreactor import install
+
+    loop = new_event_loop()
+    set_event_loop(loop)
+    install(loop)
@@ -0,0 +1,300 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Compact records of the Kubernetes objects kubetop displays.
+
+Theory of Operation
+===================
+
+#. Build small slotted records straight from decoded API documents (JSON or
+   protobuf, both as plain Python structures), keeping only the fields
+   kubetop shows and parsing quantities into integers once.
+#. Keep no reference to the documents so that they can be freed as soon as
+   the records are built.  A pod then costs one small object (and its
+   strings) instead of a tree of model objects.
+#. Records are immutable and compare by value so that an unchanged frame is
+   recognized even after a round trip through a snapshot.
+#. Convert records to and from lists of plain values to share them.
+"""
+
+from __future__ import unicode_literals
+
+import attr
+
+from ._quantity import parse_millicores, parse_bytes
+from ._samples import next_sample, parse_timestamp
+
+
+@attr.s(slots=True, frozen=True)
+class Pod(object):
+    """
+    :ivar owner: The name of the object which owns the pod (preferring its
+        controller) or ``None``.
+
+    :ivar int restarts: The total number of container restarts.
+
+    :ivar created: The POSIX creation time or ``None`` if it is not known.
+    """
+    name = attr.ib()
+    namespace = attr.ib()
+    phase = attr.ib()
+    host_ip = attr.ib()
+    owner = attr.ib()
+    restarts = attr.ib()
+    created = attr.ib()
+
+
+
+@attr.s(slots=True, frozen=True)
+class Node(object):
+    """
+    :ivar tuple addresses: Every address of the node.
+
+    :ivar int cpu: Allocatable millicores.
+
+    :ivar int memory: Allocatable bytes.
+
+    :ivar int pods: Allocatable pods.
+    """
+    name = attr.ib()
+    addresses = attr.ib()
+    cpu = attr.ib()
+    memory = attr.ib()
+    pods = attr.ib()
+    ready = attr.ib()
+
+
+
+@attr.s(slots=True, frozen=True)
+class ContainerUsage(object):
+    """
+    :ivar int cpu: Millicores used.
+
+    :ivar int memory: Bytes used.
+    """
+    name = attr.ib()
+    cpu = attr.ib()
+    memory = attr.ib()
+
+
+
+@attr.s(slots=True, frozen=True)
+class PodUsage(object):
+    """
+    :ivar tuple containers: The ``ContainerUsage`` of each container.
+    """
+    name = attr.ib()
+    namespace = attr.ib()
+    containers = attr.ib()
+
+
+
+@attr.s(slots=True, frozen=True)
+class NodeUsage(object):
+    """
+    :ivar bool stale: Whether the usage is older than the rest of the frame.
+    """
+    name = attr.ib()
+    cpu = attr.ib()
+    memory = attr.ib()
+    stale = attr.ib(default=False)
+
+
+
+@attr.s(slots=True, frozen=True)
+class Usage(object):
+    """
+    The usage items of one kind from one fetch.
+
+    :ivar tuple items: ``PodUsage`` or ``NodeUsage`` records.
+
+    :ivar next_sample: When the samples are expected to be replaced (see
+        ``_samples.next_sample``).
+    """
+    items = attr.ib()
+    next_sample = attr.ib(default=None)
+
+
+
+def _owner(references):
+    for reference in references:
+        if reference.get("controller"):
+            return reference["name"]
+    for reference in references:
+        return reference["name"]
+    return None
+
+
+
+def _pod(document):
+    metadata = document.get("metadata") or {}
+    status = document.get("status") or {}
+    created = metadata.get("creationTimestamp")
+    return Pod(
+        name=metadata.get("name"),
+        namespace=metadata.get("namespace"),
+        phase=status.get("phase"),
+        host_ip=status.get("hostIP"),
+        owner=_owner(metadata.get("ownerReferences") or ()),
+        restarts=sum(
+            (
+                container.get("restartCount", 0)
+                for container
+                in status.get("containerStatuses") or ()
+            ),
+            0,
+        ),
+        created=float(parse_timestamp(created)) if created else None,
+    )
+
+
+
+def _node(document):
+    status = document["status"]
+    # From v1.NodeStatus model documentation:
+    #
+    #     Allocatable represents the resources of a node that are
+    #     available for scheduling. Defaults to Capacity.
+    allocatable = status["allocatable"]
+    return Node(
+        name=document["metadata"]["name"],
+        addresses=tuple(
+            address["address"] for address in status.get("addresses") or ()
+        ),
+        cpu=parse_millicores(allocatable["cpu"]),
+        memory=parse_bytes(allocatable["memory"]),
+        pods=int(allocatable["pods"]),
+        ready=any(
+            condition["type"] == "Ready" and condition["status"] == "True"
+            for condition
+            in status.get("conditions") or ()
+        ),
+    )
+
+
+
+def _pod_usage(document):
+    metadata = document["metadata"]
+    return PodUsage(
+        name=metadata["name"],
+        namespace=metadata.get("namespace"),
+        containers=tuple(
+            ContainerUsage(
+                name=container["name"],
+                cpu=parse_millicores(container["usage"]["cpu"]),
+                memory=parse_bytes(container["usage"]["memory"]),
+            )
+            for container
+            in document.get("containers") or ()
+        ),
+    )
+
+
+
+def _node_usage(document):
+    return NodeUsage(
+        name=document["metadata"]["name"],
+        cpu=parse_millicores(document["usage"]["cpu"]),
+        memory=parse_bytes(document["usage"]["memory"]),
+        stale=document.get("stale", False),
+    )
+
+
+
+def pods_from_raw(document):
+    """
+    :param dict document: A ``PodList``.
+
+    :return tuple: A ``Pod`` for each item.
+    """
+    return tuple(_pod(item) for item in document.get("items") or ())
+
+
+
+def nodes_from_raw(document):
+    """
+    :param dict document: A ``NodeList``.
+
+    :return tuple: A ``Node`` for each item.
+    """
+    return tuple(_node(item) for item in document.get("items") or ())
+
+
+
+def pod_usage_from_raw(document):
+    """
+    :param dict document: A ``PodMetricsList``.
+
+    :return Usage: The usage of each pod.
+    """
+    return Usage(
+        items=tuple(
+            _pod_usage(item) for item in document.get("items") or ()
+        ),
+        next_sample=next_sample(document),
+    )
+
+
+
+def node_usage_from_raw(document):
+    """
+    :param dict document: A ``NodeMetricsList``.
+
+    :return Usage: The usage of each node.
+    """
+    return Usage(
+        items=tuple(
+            _node_usage(item) for item in document.get("items") or ()
+        ),
+        next_sample=next_sample(document),
+    )
+
+
+
+def dump_info(info):
+    """
+    Convert the records of a frame's ``info`` or ``usage`` to plain values.
+    """
+    if isinstance(info, Usage):
+        return {
+            "items": list(attr.astuple(item) for item in info.items),
+            "next_sample": info.next_sample,
+        }
+    return list(attr.astuple(item) for item in info)
+
+
+
+def load_pods(values):
+    return tuple(Pod(*item) for item in values)
+
+
+
+def load_nodes(values):
+    return tuple(
+        Node(item[0], tuple(item[1]), *item[2:]) for item in values
+    )
+
+
+
+def load_pod_usage(values):
+    return Usage(
+        items=tuple(
+            PodUsage(
+                name, namespace, tuple(
+                    ContainerUsage(*container) for container in containers
+                ),
+            )
+            for (name, namespace, containers)
+            in values["items"]
+        ),
+        next_sample=values["next_sample"],
+    )
+
+
+
+def load_node_usage(values):
+    return Usage(
+        items=tuple(NodeUsage(*item) for item in values["items"]),
+        next_sample=values["next_sample"],
+    )
@@ -11,14 +11,216 @@ Theory of Operation
 #. Glue kubetop rendering object together with a time-based trigger (for periodic re-rendering).
 #. Wrap the trigger up in an ``IService`` which can be started and stopped.
 #. Deliver rendering success/failure to the main object for reporting and exit.
+#. Schedule each call so that it finishes when its frame is due rather than
+   starting when it is due: keep a moving average of how long calls take
+   and start each one that long before its deadline.
+#. Let a call which is slow to finish overlap with the next one, but never
+   with more than one.  A deadline which arrives while two calls are in
+   flight is skipped.  If the schedule has fallen behind, start again from
+   the present instead of making up for the missed deadlines all at once.
+#. Work out the next deadline once the call just started has finished, so
+   that intervals which depend on what the call fetched (see ``_samples``)
+   see its result.  If the call is slow, work it out when the next call
+   would start if the interval were the same as the last one, so that the
+   calls can still overlap.
+#. Overlapping calls can finish out of order.  Number them as they start
+   and drop a result which arrives after the result of a later call
+   (``InOrder``), so that old data never replaces newer data.
 """
 
-from twisted.internet.defer import inlineCallbacks
-from twisted.internet.task import deferLater
+from __future__ import division
+
+from twisted.internet.defer import Deferred, maybeDeferred
+
+import attr
 
 from ._runonce import run_once_service
 
-@inlineCallbacks
+# The weight of the newest latency in the moving average.
+SMOOTHING = 0.3
+
+# The most calls in flight at once.
+IN_FLIGHT = 2
+
+
+@attr.s
+class _JustInTime(object):
+    """
+    Call a function for a series of deadlines, starting each call early by
+    the expected time it will take.
+
+    :ivar latency: The moving average of the number of seconds calls take, or
+        ``None`` before any call has finished.
+
+    :ivar int missed: The number of deadlines skipped because too many calls
+        were in flight or because they had already passed.
+    """
+    reactor = attr.ib()
+    intervals = attr.ib()
+    f = attr.ib()
+
+    latency = attr.ib(default=None)
+    missed = attr.ib(default=0)
+
+    _in_flight = attr.ib(default=0)
+    _exhausted = attr.ib(default=False)
+    _done = attr.ib(default=None)
+    _delayed = attr.ib(default=None)
+    _deadline = attr.ib(default=None)
+    _interval = attr.ib(default=None)
+    _launches = attr.ib(default=0)
+    _planned = attr.ib(default=True)
+
+    def start(self):
+        """
+        :return Deferred: A ``Deferred`` which fires when a call fails or
+            when the intervals are exhausted and every call has finished.
+        """
+        done = self._done = Deferred()
+        self._launch(self.reactor.seconds())
+        return done
+
+
+    def _launch(self, deadline):
+        self._delayed = None
+        self._deadline = deadline
+        if self._in_flight < IN_FLIGHT:
+            self._in_flight += 1
+            self._launches += 1
+            self._planned = False
+            started = self.reactor.seconds()
+            d = maybeDeferred(self.f)
+            d.addCallbacks(
+                self._finished, self._failed, (started, self._launches),
+            )
+            if self._done is None:
+                # It has failed already.
+                return
+            if not self._planned:
+                self._plan_later()
+        else:
+            self.missed += 1
+            self._plan()
+
+
+    def _plan_later(self):
+        """
+        Plan the next call when the call just started finishes or, if it is
+        slow, when the next call would start if the interval were the same as
+        the last one.
+        """
+        if self._interval is None:
+            # There is nothing to guess from.
+            self._plan()
+            return
+        now = self.reactor.seconds()
+        start = max(
+            self._deadline + self._interval - (self.latency or 0), now,
+        )
+        self._delayed = self.reactor.callLater(start - now, self._plan)
+
+
+    def _plan(self):
+        """
+        Work out the next deadline and schedule the call for it.
+        """
+        self._planned = True
+        if self._delayed is not None and self._delayed.active():
+            self._delayed.cancel()
+        self._delayed = None
+
+        try:
+            interval = next(self.intervals)
+        except StopIteration:
+            self._exhausted = True
+            self._maybe_done()
+            return
+        self._interval = interval
+
+        now = self.reactor.seconds()
+        deadline = self._deadline + interval
+        if deadline < now:
+            # Skip the deadline rather than bunch calls together to catch up.
+            self.missed += 1
+            deadline = now + interval
+        start = max(deadline - (self.latency or 0), now)
+        self._delayed = self.reactor.callLater(
+            start - now, self._launch, deadline,
+        )
+
+
+    def _finished(self, result, started, launch):
+        elapsed = self.reactor.seconds() - started
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += SMOOTHING * (elapsed - self.latency)
+        self._in_flight -= 1
+        if launch == self._launches and not self._planned:
+            self._plan()
+        self._maybe_done()
+
+
+    def _failed(self, reason):
+        self._in_flight -= 1
+        if self._delayed is not None:
+            self._delayed.cancel()
+            self._delayed = None
+        if self._done is not None:
+            done, self._done = self._done, None
+            done.errback(reason)
+
+
+    def _maybe_done(self):
+        if self._exhausted and self._in_flight == 0 and self._done is not None:
+            done, self._done = self._done, None
+            done.callback(None)
+
+
+
+@attr.s
+class InOrder(object):
+    """
+    Pass on the results of calls which may overlap in the order the calls
+    started, dropping a result which arrives after that of a later call.
+    """
+    _started = attr.ib(default=0)
+    _delivered = attr.ib(default=0)
+
+    def deliver(self, d, callback, errback=None):
+        """
+        Number a call which has just started.
+
+        :param Deferred d: The ``Deferred`` of the call's result.
+
+        :param callback: A one-argument callable to call with the result,
+            unless it is out of date.
+
+        :param errback: A one-argument callable to call with the failure of
+            the call, unless it is out of date.  If it is ``None``, a failure
+            is passed on in any case.
+
+        :return Deferred: ``d`` with the callbacks added.  Its result is
+            ``None`` if the call's result was dropped.
+        """
+        self._started += 1
+        number = self._started
+
+        def arrived(result, consume):
+            if number < self._delivered:
+                return None
+            self._delivered = number
+            return consume(result)
+
+        if errback is None:
+            return d.addCallback(arrived, callback)
+        return d.addCallbacks(
+            arrived, arrived,
+            callbackArgs=(callback,), errbackArgs=(errback,),
+        )
+
+
+
 def _iterate(reactor, intervals, f):
     """
     Run a function repeatedly.
@@ -28,16 +230,7 @@ def _iterate(reactor, intervals, f):
     :return Deferred: A deferred which fires when ``f`` fails or when
         ``intervals`` is exhausted.
     """
-    while True:
-        before = reactor.seconds()
-        yield f()
-        after = reactor.seconds()
-        try:
-            interval = next(intervals)
-        except StopIteration:
-            break
-        delay = max(0, interval - (after - before))
-        yield deferLater(reactor, delay, lambda: None)
+    return _JustInTime(reactor, iter(intervals), f).start()
 
 
 
@@ -50,8 +243,8 @@ def run_many_service(main, reactor, f, intervals):
     :param reactor: The IReactorTime & IReactorCore provider to use for
         delaying subsequent iterations.
 
-    :param intervals: An iterable of numbers giving the delay between
-        subsequent invocations of the function.
+    :param intervals: An iterable of numbers giving the time between
+        subsequent deadlines by which the function should have finished.
 
     :param f: A zero-argument callable to repeatedly call.
 
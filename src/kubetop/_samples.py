@@ -0,0 +1,165 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Timing of resource usage samples.
+
+Theory of Operation
+===================
+
+#. Each usage item from the metrics API (or Heapster) carries the
+   ``timestamp`` of its sample and the ``window`` it covers.  Samples are
+   replaced about one window after they were taken.
+#. Estimate when the samples in each usage document will be replaced when
+   the document is decoded.  Wrap a data source so that the usage passing
+   through it updates the estimate of when the next sample is due.
+#. Delay each iteration until the next sample is due (but never less than the
+   configured interval) so that fetches which could only return the same
+   sample again are skipped.  If the estimate has already passed, fall back
+   to the configured interval.
+"""
+
+from __future__ import unicode_literals, division
+
+from re import compile as regex
+from calendar import timegm
+from datetime import datetime
+
+import attr
+
+# A little extra time to allow for the sample to reach the API server.
+SLACK = 2.0
+
+_DURATION_UNITS = {
+    "h": 3600.0,
+    "m": 60.0,
+    "s": 1.0,
+    "ms": 1e-3,
+    "us": 1e-6,
+    "\u00b5s": 1e-6,
+    "ns": 1e-9,
+}
+
+# Longer units first so that "ms" is not taken for "m".
+_DURATION_PART = regex("([0-9.]+)({})".format(
+    "|".join(sorted(_DURATION_UNITS, key=len, reverse=True)),
+))
+
+
+def parse_duration(s):
+    """
+    Parse a Go duration string such as ``"1m0s"``.
+
+    :return float: The duration in seconds.
+    """
+    return sum(
+        float(amount) * _DURATION_UNITS[unit]
+        for (amount, unit)
+        in _DURATION_PART.findall(s)
+    )
+
+
+
+def parse_timestamp(s):
+    """
+    Parse a Kubernetes timestamp such as ``"2017-04-07T15:21:00Z"``.
+
+    :return float: The POSIX time.
+    """
+    return timegm(
+        datetime.strptime(s[:19], "%Y-%m-%dT%H:%M:%S").utctimetuple()
+    )
+
+
+
+def next_sample(usage):
+    """
+    Estimate when the samples in a usage document will be replaced.
+
+    :param dict usage: A ``PodMetricsList`` or ``NodeMetricsList``.
+
+    :return: The POSIX time at which the newest sample is expected to be
+        replaced or ``None`` if the document has no timing information.
+    """
+    times = list(
+        parse_timestamp(item["timestamp"]) + parse_duration(item["window"])
+        for item
+        in usage.get("items") or []
+        if item.get("timestamp") and item.get("window")
+    )
+    if times:
+        return max(times)
+    return None
+
+
+
+@attr.s
+class AlignedIntervals(object):
+    """
+    An iterator of delays between iterations which waits for new samples.
+
+    :ivar clock: The ``IReactorTime`` used to tell the time.
+
+    :ivar float interval: The smallest delay.
+
+    :ivar iterations: The number of delays to produce, or ``None`` for no
+        limit.
+    """
+    clock = attr.ib()
+    interval = attr.ib()
+    iterations = attr.ib(default=None)
+
+    _next_samples = attr.ib(default=attr.Factory(dict))
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        if self.iterations is not None:
+            if self.iterations <= 0:
+                raise StopIteration()
+            self.iterations -= 1
+        expected = list(t for t in self._next_samples.values() if t is not None)
+        if not expected:
+            return self.interval
+        return max(
+            self.interval, min(expected) + SLACK - self.clock.seconds(),
+        )
+
+    next = __next__
+
+
+    def observe(self, kind, usage):
+        """
+        Take note of when some samples will be replaced.
+
+        :param kind: Which kind of usage the samples are.  The earliest
+            replacement of any kind is waited for.
+
+        :param _records.Usage usage: The samples.
+        """
+        self._next_samples[kind] = usage.next_sample
+
+
+
+@attr.s(frozen=True)
+class AligningSource(object):
+    """
+    A data source which reports the samples passing through it to an
+    ``AlignedIntervals``.
+    """
+    source = attr.ib()
+    intervals = attr.ib()
+
+    def nodes(self):
+        return self.source.nodes().addCallback(self._observe, "nodes")
+
+
+    def pods(self):
+        return self.source.pods().addCallback(self._observe, "pods")
+
+
+    def _observe(self, info, kind):
+        self.intervals.observe(kind, info["usage"])
+        return info
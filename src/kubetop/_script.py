@@ -10,43 +10,128 @@ Theory of Operation
 #. Convert command line arguments to structured configuration, supplying defaults where necessary.
 #. Construct the top-level kubetop service from the configuration.
 #. Run the Twisted reactor.
+
+Everything needed to get as far as parsing the command line is imported at
+module level.  The rest (the renderer, txkube, treq, ...) is imported by
+``makeService`` so that ``--help`` and ``--version`` are quick and so that
+argument errors are reported without delay.
 """
 
-from sys import __stdout__ as outfile
+from __future__ import print_function
 
-from yaml import safe_load
+from sys import __stdout__ as outfile, __stdin__ as infile
 
 from itertools import repeat
 from os.path import expanduser
 import os
 
-from twisted.python.usage import Options
+from twisted.python.usage import Options, UsageError
 from twisted.python.filepath import FilePath
 
+from ._metadata import version_string
 from ._twistmain import TwistMain
-from ._runmany import run_many_service
-from ._textrenderer import Sink, kubetop
+from ._view import GROUP_BY, SORT, NODES, View
+from ._reactor import REACTORS, install_reactor
+
+# The metrics backends which can be chosen on the command line.  See
+# ``kubetop._topdata.make_metrics``.
+METRICS = ("auto", "heapster", "metrics.k8s.io", "kubelet")
 
 DEFAULT_CONFIG = os.getenv('KUBECONFIG', "~/.kube/config")
 DEFAULT_CONFIG_FILE_PATH = FilePath(expanduser(DEFAULT_CONFIG))
 
-def current_context(config_path):
-    with config_path.open() as cfg:
-        return safe_load(cfg)[u"current-context"]
+CONFIG_CACHE = FilePath(expanduser("~/.cache/kubetop"))
 
 
 class KubetopOptions(Options):
+    optFlags = [
+        ("expand", None, "With --group-by, also list the pods in each group."),
+        ("protobuf", None, "Ask the API server for pod and node lists in the protobuf encoding."),
+        ("daemon", None, "Instead of showing usage, share it with other kubetop processes through the socket."),
+        ("align", None, "Wait for new usage samples instead of fetching every interval."),
+        ("cache-config", None, "Remember the parsed kubectl config (in ~/.cache/kubetop) until the file changes."),
+    ]
+
     optParameters = [
         ("config", None, DEFAULT_CONFIG, "The path to the kubectl config to use."),
         ("context", None, None, "The kubectl context to use. If not set, this will default to the 'current-context' of the 'config'."),
         ("interval", None, 3.0, "The number of seconds between iterations.", float),
         ("iterations", None, None, "The number of iterations to perform.", int),
+        ("group-by", None, None, "Roll pod usage up by one of: {}.".format(", ".join(GROUP_BY))),
+        ("sort", None, "cpu", "Order pods by one of: {}.".format(", ".join(SORT))),
+        ("nodes", None, "auto", "Show a line for every node (all), a summary of the cluster (summary) or a summary only for large clusters (auto)."),
+        ("namespace-lifetime", None, None, "Seconds to remember the list of namespaces for (0 to fetch it every iteration).", float),
+        ("node-lifetime", None, None, "Seconds to remember node information for (0 to fetch it every iteration).", float),
+        ("pod-lifetime", None, None, "Seconds to remember pod information for (0 to fetch it every iteration).", float),
+        ("metrics", None, "auto", "Where to get resource usage from, one of: {}.".format(", ".join(METRICS))),
+        ("serve-metrics", None, None, "Instead of showing usage, serve it in the Prometheus format on this TCP port.", int),
+        ("serve-metrics-interface", None, "127.0.0.1", "The address to serve the metrics of --serve-metrics on (0.0.0.0 for every interface)."),
+        ("socket", None, None, "The path of the Unix socket of the kubetop daemon for the context."),
+        ("threads", None, None, "Decode responses and build frames in a pool of this many threads instead of the main thread.", int),
+        ("connections", None, 16, "The most idle connections to keep open to the API server (0 to use a new connection for every request).", int),
+        ("profile", None, None, "Profile the run (see --iterations) and write the statistics in the pstats format to this file."),
+        ("reactor", None, "default", "The reactor to run on, one of: {}.".format(", ".join(REACTORS))),
     ]
 
+    def opt_version(self):
+        """
+        Display the kubetop version and exit.
+        """
+        print("kubetop {}".format(version_string))
+        raise SystemExit(0)
+
+
     def postOptions(self):
+        if self['group-by'] not in (None,) + GROUP_BY:
+            raise UsageError(
+                "--group-by must be one of: {}".format(", ".join(GROUP_BY))
+            )
+        if self['sort'] not in SORT:
+            raise UsageError(
+                "--sort must be one of: {}".format(", ".join(SORT))
+            )
+        if self['nodes'] not in NODES:
+            raise UsageError(
+                "--nodes must be one of: {}".format(", ".join(NODES))
+            )
+        if self['metrics'] not in METRICS:
+            raise UsageError(
+                "--metrics must be one of: {}".format(", ".join(METRICS))
+            )
+        if self['reactor'] not in REACTORS:
+            raise UsageError(
+                "--reactor must be one of: {}".format(", ".join(REACTORS))
+            )
+        # twist installs the default reactor as soon as this returns, if
+        # there isn't one installed already.
+        try:
+            install_reactor(self['reactor'])
+        except ImportError as e:
+            raise UsageError(
+                "--reactor {} is not available: {}".format(self['reactor'], e)
+            )
+        from ._kubeconfig import load, current_context
+        # The config is parsed just once, here, and used again by
+        # makeService.
+        self['kubeconfig'] = load(
+            FilePath(expanduser(self['config'])),
+            CONFIG_CACHE if self['cache-config'] else None,
+        )
         # Calculate the context as a post action instead of setting a default value in optParameters since
         # kubetop should use/show the context of any overridden 'config'
-        self['context'] = current_context(FilePath(expanduser(self['config'])))
+        self['context'] = current_context(self['kubeconfig'])
+        if self['socket'] is None:
+            self['socket'] = default_socket(self['context'])
+
+
+
+def default_socket(context):
+    """
+    Choose a location for the socket of the daemon for a context.
+    """
+    return expanduser("~/.kubetop-{}.sock".format(
+        "".join(c if c.isalnum() or c in "-_." else "_" for c in context),
+    ))
 
 
 
@@ -57,21 +142,175 @@ def fixed_intervals(interval, iterations):
 
 
 
+def lifetimes(options, defaults):
+    """
+    Combine the cache lifetimes given on the command line with the defaults.
+    """
+    result = dict(defaults)
+    for resource, option in [
+            ("namespaces", "namespace-lifetime"),
+            ("nodes", "node-lifetime"),
+            ("pods", "pod-lifetime"),
+    ]:
+        if options[option] is not None:
+            result[resource] = options[option]
+    return result
+
+
+
 def makeService(main, options):
     from twisted.internet import reactor
 
     # _topdata imports txkube and treq, both of which import
     # twisted.web.client, which imports the reactor, which installs a default.
     # That breaks TwistMain unless we delay it until makeService is called.
-    from ._topdata import make_source
+    from ._topdata import DEFAULT_LIFETIMES, make_source
+    from ._runmany import run_many_service
+    # The renderer brings in bitmath (and NumPy, if it is installed).  See the
+    # module docstring.
+    from ._textrenderer import ReactorSink, Screen, kubetop
+    from ._interactive import KeyboardControl, listen_keyboard
+
+    from ._snapshot import SnapshotSource
 
-    f = lambda: kubetop(reactor, s, Sink.from_file(outfile))
+    _profiling(main, reactor, options["profile"])
 
-    s = make_source(reactor, FilePath(expanduser(options["config"])), options["context"])
-    return run_many_service(
-        main, reactor, f,
-        fixed_intervals(options["interval"], options["iterations"]),
+    run = _runner(reactor, options["threads"])
+    direct = lambda: make_source(
+        reactor, FilePath(expanduser(options["config"])), options["context"],
+        lifetimes(options, DEFAULT_LIFETIMES),
+        options["protobuf"],
+        None if options["metrics"] == "auto" else options["metrics"],
+        run,
+        options["connections"],
+        options["kubeconfig"],
     )
+    if options["align"]:
+        from ._samples import AlignedIntervals, AligningSource
+        intervals = AlignedIntervals(
+            reactor, options["interval"], options["iterations"],
+        )
+        align = lambda source: AligningSource(source, intervals)
+    else:
+        intervals = fixed_intervals(options["interval"], options["iterations"])
+        align = lambda source: source
+
+    if options["daemon"]:
+        return _daemon_service(
+            main, reactor, align(direct()), options, intervals,
+        )
+
+    # Use the daemon for this context if one is running.
+    s = align(SnapshotSource(reactor, options["socket"], direct))
+
+    if options["serve-metrics"] is not None:
+        return _exporter_service(main, reactor, s, options, intervals)
+
+    screen = Screen(
+        reactor, ReactorSink.from_file(reactor, outfile),
+        View(
+            group_by=options["group-by"],
+            expand=options["expand"],
+            sort=options["sort"],
+            nodes=options["nodes"],
+        ),
+        run=run,
+    )
+    f = lambda: kubetop(reactor, s, screen)
+
+    if infile.isatty():
+        reactor.callWhenRunning(
+            listen_keyboard,
+            reactor, infile.fileno(), KeyboardControl(screen, main.exit),
+        )
+
+    return run_many_service(main, reactor, f, intervals)
+
+
+
+def _profiling(main, reactor, path):
+    """
+    Profile the whole run if ``--profile`` was given and whenever ``SIGUSR1``
+    asks for it (see ``_profile``).
+    """
+    from ._profile import Profiler, profile_on_signal
+    profiler = Profiler()
+    profile_on_signal(
+        reactor, profiler, FilePath(expanduser(main.log_file)).parent(),
+    )
+    if path is not None:
+        profiler.start()
+        reactor.addSystemEventTrigger(
+            "before", "shutdown", profiler.stop, path,
+        )
+
+
+
+def _runner(reactor, threads):
+    """
+    Choose how to run CPU-heavy work (see ``_offload``).
+
+    :param threads: ``None`` to run it on the reactor thread or the number of
+        worker threads to run it on.
+    """
+    from ._offload import synchronous, thread_runner
+    if threads is None:
+        return synchronous
+
+    from twisted.python.threadpool import ThreadPool
+    pool = ThreadPool(minthreads=0, maxthreads=threads, name="kubetop")
+    reactor.callWhenRunning(pool.start)
+    reactor.addSystemEventTrigger("during", "shutdown", pool.stop)
+    return thread_runner(reactor, pool)
+
+
+
+def _exporter_service(main, reactor, source, options, intervals):
+    """
+    Create a service which polls ``source`` and serves the results to
+    Prometheus.
+    """
+    from twisted.application.service import MultiService
+    from twisted.application.internet import TCPServer
+    from twisted.web.server import Site
+    from ._runmany import run_many_service
+    from ._exporter import Exposition, MetricsResource, export
+
+    exposition = Exposition()
+    service = MultiService()
+    run_many_service(
+        main, reactor, lambda: export(reactor, source, exposition), intervals,
+    ).setServiceParent(service)
+    TCPServer(
+        options["serve-metrics"], Site(MetricsResource(exposition)),
+        interface=options["serve-metrics-interface"],
+    ).setServiceParent(service)
+    return service
+
+
+
+def _daemon_service(main, reactor, source, options, intervals):
+    """
+    Create a service which polls ``source`` and shares the results with other
+    kubetop processes.
+    """
+    from twisted.application.service import MultiService
+    from twisted.application.internet import UNIXServer
+    from ._runmany import run_many_service
+    from ._snapshot import Snapshots, publish, snapshot_factory
+
+    snapshots = Snapshots(reactor)
+    service = MultiService()
+    run_many_service(
+        main, reactor, lambda: publish(source, snapshots), intervals,
+    ).setServiceParent(service)
+    # The snapshots were fetched with the owner's credentials, so only the
+    # owner may connect.
+    UNIXServer(
+        options["socket"], snapshot_factory(snapshots),
+        mode=0o600, wantPID=True,
+    ).setServiceParent(service)
+    return service
 
 
 main = TwistMain(KubetopOptions, makeService)
@@ -0,0 +1,339 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Sharing one set of Kubernetes API fetches between many kubetop processes.
+
+Theory of Operation
+===================
+
+#. A daemon polls a data source and, after each poll, serializes the node
+   and pod data once into compact JSON snapshots, along with the time of the
+   poll.  A poll which fails replaces the snapshots with ones which carry
+   the error instead.
+#. The daemon listens on a Unix socket.  Each request (``nodes`` or ``pods``)
+   is a length-prefixed string and is answered, in order, with the latest
+   snapshot of that kind.  Requests which arrive before the first poll has
+   finished wait for it.
+#. A client is a data source like the one from ``_topdata.make_source``.  It
+   connects to the daemon when it first needs data and asks it for
+   snapshots.  If there is no daemon (or it goes away) the client fetches
+   directly from the Kubernetes API server, and tries the daemon again on
+   the next request.
+#. The client also fetches directly when the daemon has only an error or a
+   snapshot which is too old to show, or when it does not answer in time (as
+   when its first poll has not finished).
+"""
+
+from __future__ import unicode_literals
+
+from json import dumps, loads
+
+from twisted.python.log import err
+from twisted.internet.defer import (
+    Deferred, TimeoutError, gatherResults, succeed,
+)
+from twisted.internet.error import ConnectError, ConnectionClosed
+from twisted.internet.protocol import Factory
+from twisted.internet.endpoints import UNIXClientEndpoint, connectProtocol
+from twisted.protocols.basic import Int32StringReceiver
+
+import attr
+
+from ._records import (
+    dump_info, load_pods, load_nodes, load_pod_usage, load_node_usage,
+)
+from ._runmany import InOrder
+
+_NODES = b"nodes"
+_PODS = b"pods"
+
+# The seconds to wait for the daemon to answer before fetching directly.
+TIMEOUT = 10.0
+
+# The age in seconds past which a snapshot is not shown.  This leaves room for
+# a daemon run with --align, which polls about once a minute.
+MAX_AGE = 90.0
+
+
+class SnapshotUnavailable(Exception):
+    """
+    The daemon has no snapshot which is fit to show.
+    """
+
+
+
+def _dumps(info, fetched):
+    return dumps(
+        {
+            "info": dump_info(info["info"]),
+            "usage": dump_info(info["usage"]),
+            "fetched": fetched,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+
+def _dumps_error(message, fetched):
+    return dumps(
+        {"error": message, "fetched": fetched}, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+
+def _loader(load_info, load_usage):
+    def load(info):
+        return {
+            "info": load_info(info["info"]),
+            "usage": load_usage(info["usage"]),
+        }
+    return load
+
+
+
+def publish(datasource, snapshots):
+    """
+    Fetch one frame of usage data and make it the latest snapshot.
+
+    :param datasource: The source of usage data (see ``_topdata``).
+
+    :param Snapshots snapshots: Where to publish the data.
+
+    :return Deferred: A ``Deferred`` that fires when the snapshot has been
+        published (or the fetch has failed).
+    """
+    def failed(reason):
+        err(reason.value.subFailure, "Fetching usage data failed")
+        snapshots.failed(reason.value.subFailure.getErrorMessage())
+
+    return snapshots.fetches.deliver(
+        gatherResults(
+            [datasource.nodes(), datasource.pods()], consumeErrors=True,
+        ),
+        snapshots.update, failed,
+    )
+
+
+
+@attr.s
+class Snapshots(object):
+    """
+    The latest serialized node and pod data.
+
+    :ivar clock: The ``IReactorTime`` used to tell the time of each poll.
+
+    :ivar InOrder fetches: The polls, so that a snapshot is not replaced by
+        one fetched before it.
+    """
+    clock = attr.ib()
+    fetches = attr.ib(default=attr.Factory(InOrder))
+
+    _latest = attr.ib(default=None)
+    _waiting = attr.ib(default=attr.Factory(list))
+
+    def update(self, data):
+        (node_info, pod_info) = data
+        fetched = self.clock.seconds()
+        self._publish({
+            _NODES: _dumps(node_info, fetched),
+            _PODS: _dumps(pod_info, fetched),
+        })
+
+
+    def failed(self, message):
+        """
+        Replace the snapshots with an error.
+        """
+        error = _dumps_error(message, self.clock.seconds())
+        self._publish({_NODES: error, _PODS: error})
+
+
+    def _publish(self, latest):
+        self._latest = latest
+        waiting, self._waiting = self._waiting, []
+        for d in waiting:
+            d.callback(self._latest)
+
+
+    def get(self, kind):
+        """
+        Get the latest snapshot.
+
+        :param bytes kind: ``b"nodes"`` or ``b"pods"``.
+
+        :return Deferred: A ``Deferred`` that fires with the serialized
+            snapshot once there is one.
+        """
+        if self._latest is not None:
+            d = succeed(self._latest)
+        else:
+            d = Deferred()
+            self._waiting.append(d)
+        return d.addCallback(lambda latest: latest[kind])
+
+
+
+class _SnapshotServerProtocol(Int32StringReceiver):
+    """
+    Answer snapshot requests, in the order they arrived.
+    """
+    def __init__(self, snapshots):
+        self._snapshots = snapshots
+        self._answered = succeed(None)
+
+
+    def stringReceived(self, kind):
+        if kind not in (_NODES, _PODS):
+            self.transport.loseConnection()
+            return
+        d = self._snapshots.get(kind)
+        self._answered.addCallback(lambda ignored: d)
+        self._answered.addCallback(self.sendString)
+
+
+
+def snapshot_factory(snapshots):
+    """
+    Create a factory for connections from clients.
+
+    :param Snapshots snapshots: The snapshots to serve.
+    """
+    return Factory.forProtocol(lambda: _SnapshotServerProtocol(snapshots))
+
+
+
+class _SnapshotClientProtocol(Int32StringReceiver):
+    """
+    Ask for snapshots and match up the answers with the questions.
+    """
+    MAX_LENGTH = 2 ** 31 - 1
+
+    def __init__(self):
+        self._pending = []
+
+
+    def request(self, kind):
+        d = Deferred()
+        self._pending.append(d)
+        self.sendString(kind)
+        return d
+
+
+    def stringReceived(self, snapshot):
+        self._pending.pop(0).callback(snapshot)
+
+
+    def connectionLost(self, reason):
+        self.connected = False
+        pending, self._pending = self._pending, []
+        for d in pending:
+            d.errback(reason)
+
+
+
+@attr.s
+class SnapshotSource(object):
+    """
+    A data source which gets its data from a snapshot daemon if there is one.
+
+    :ivar reactor: An ``IReactorUNIX`` provider to connect with.
+
+    :ivar path: The path of the daemon's socket.
+
+    :ivar direct: A zero-argument callable returning a data source to use
+        when there is no daemon.
+
+    :ivar timeout: The seconds to wait for the daemon to answer.
+
+    :ivar max_age: The age in seconds past which a snapshot is not used.
+    """
+    reactor = attr.ib()
+    path = attr.ib()
+    direct = attr.ib()
+    timeout = attr.ib(default=TIMEOUT)
+    max_age = attr.ib(default=MAX_AGE)
+
+    _connection = attr.ib(default=None)
+    _direct_source = attr.ib(default=None)
+
+    def nodes(self):
+        return self._request(
+            _NODES,
+            _loader(load_nodes, load_node_usage),
+            lambda source: source.nodes(),
+        )
+
+
+    def pods(self):
+        return self._request(
+            _PODS,
+            _loader(load_pods, load_pod_usage),
+            lambda source: source.pods(),
+        )
+
+
+    def _request(self, kind, decode, fetch):
+        def no_daemon(reason):
+            reason.trap(ConnectError, ConnectionClosed)
+            self._connection = None
+            return fetch(self._direct())
+
+        def no_snapshot(reason):
+            reason.trap(SnapshotUnavailable, TimeoutError)
+            return fetch(self._direct())
+
+        d = self._connect()
+        d.addCallback(lambda protocol: protocol.request(kind))
+        d.addTimeout(self.timeout, self.reactor)
+        d.addCallback(self._check)
+        d.addCallback(decode)
+        d.addErrback(no_daemon)
+        d.addErrback(no_snapshot)
+        return d
+
+
+    def _check(self, snapshot):
+        """
+        Parse a snapshot from the daemon.
+
+        :raise SnapshotUnavailable: If it is an error or too old to show.
+        """
+        info = loads(snapshot.decode("utf-8"))
+        if "error" in info:
+            raise SnapshotUnavailable(info["error"])
+        age = self.reactor.seconds() - info["fetched"]
+        if age > self.max_age:
+            raise SnapshotUnavailable(
+                "The snapshot is {:.0f} seconds old".format(age),
+            )
+        return info
+
+
+    def _direct(self):
+        if self._direct_source is None:
+            self._direct_source = self.direct()
+        return self._direct_source
+
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = connectProtocol(
+                UNIXClientEndpoint(self.reactor, self.path),
+                _SnapshotClientProtocol(),
+            )
+            # Every user of the connection gets its result through ``result``
+            # below.
+            self._connection.addErrback(lambda reason: None)
+
+        result = Deferred()
+
+        def connected(protocol):
+            if protocol is None or not protocol.connected:
+                result.errback(ConnectError("Not connected to the daemon"))
+            else:
+                result.callback(protocol)
+            return protocol
+
+        self._connection.addCallback(connected)
+        return result
@@ -9,16 +9,29 @@ Theory of Operation
 
 #. Combine a data source with a text-emitting renderer function and a text
    output-capable target (e.g. a file descriptor).
+#. Remember rendered rows from frame to frame so that a frame in which
+   little has changed is mostly put together from rows rendered before.
+   Log how many rows were found every so many frames.
 """
 
 from __future__ import unicode_literals, division
 
+from os import write
+from errno import EAGAIN
+from collections import OrderedDict
+from threading import Lock
 from struct import pack, unpack
 from termios import TIOCGWINSZ
-from fcntl import ioctl
+from fcntl import ioctl, fcntl, F_GETFL, F_SETFL
 
-from twisted.internet.defer import gatherResults
-from twisted.python.compat import unicode
+from zope.interface import implementer
+
+from twisted.internet.defer import gatherResults, succeed
+from twisted.internet.abstract import FileDescriptor
+from twisted.internet.fdesc import setNonBlocking
+from twisted.internet.interfaces import IPushProducer
+from twisted.internet.main import CONNECTION_LOST
+from twisted.logger import Logger
 
 from datetime import datetime
 
@@ -27,6 +40,11 @@ from bitmath import Byte
 import attr
 from attr import validators
 
+from ._frame import NodeColumns, NodeSummary, PodColumns, FrameModel
+from ._view import View
+from ._offload import synchronous
+from ._runmany import InOrder
+
 COLUMNS = [
     (20, "POD"),
     (26, "(CONTAINER)"),
@@ -35,11 +53,196 @@ COLUMNS = [
     (7, "%MEM")
 ]
 
+# With ``--nodes auto``, clusters with more nodes than this are summarized.
+SUMMARY_NODES = 10
+
+# The number of the busiest nodes shown in a summary.
+HOTTEST_NODES = 5
+
+# The number of frames rendered between reports of the ``RowCache`` hit rate.
+REPORT_EVERY = 100
+
+_log = Logger()
+
+
+def kubetop(reactor, datasource, screen):
+    if screen.paused:
+        # Nothing new would be shown so don't bother the server.
+        return succeed(None)
+    return screen.fetches.deliver(
+        gatherResults([datasource.nodes(), datasource.pods()]), screen.show,
+    )
+
 
-def kubetop(reactor, datasource, datasink):
-    return gatherResults([
-        datasource.nodes(), datasource.pods(),
-    ]).addCallback(_render_kubetop, datasink, reactor)
+
+@attr.s
+class Screen(object):
+    """
+    The most recently fetched frame and the state of its presentation.
+
+    Keeping the data around allows the frame to be re-rendered when the
+    ``View`` changes without fetching anything again.
+
+    :ivar paused: While ``True``, newly fetched frames are not shown.
+
+    :ivar run: The runner with which to render frames (see ``_offload``).
+
+    :ivar int unchanged: The number of frames shown which had the same data
+        as the frame before them and so only had their clock line updated.
+
+    :ivar RowCache rows: Rows rendered for earlier frames.
+
+    :ivar FrameModel model: The pod data of earlier frames, updated with
+        each frame rendered.
+
+    :ivar InOrder fetches: The fetches of frames, which may overlap, so that
+        a frame is not replaced by one fetched before it.
+    """
+    reactor = attr.ib()
+    sink = attr.ib()
+    view = attr.ib(default=attr.Factory(View))
+    paused = attr.ib(default=False)
+    run = attr.ib(default=synchronous)
+    unchanged = attr.ib(default=0)
+    rows = attr.ib(default=attr.Factory(lambda: RowCache()))
+    model = attr.ib(default=attr.Factory(FrameModel))
+    fetches = attr.ib(default=attr.Factory(InOrder))
+
+    _data = attr.ib(default=None)
+    _renders = attr.ib(default=0)
+
+    def show(self, data):
+        if self.paused:
+            return succeed(None)
+        if self._data is not None and _same_frame(self._data, data):
+            self.unchanged += 1
+            self.sink.write_partial(
+                _home() +
+                _render_clockline(self.reactor, self.view).rstrip("\n") +
+                _clear_line()
+            )
+            return succeed(None)
+        self._data = data
+        return self.refresh()
+
+
+    def refresh(self):
+        """
+        Render the most recently shown data.
+
+        :return Deferred: A ``Deferred`` that fires when the frame has been
+            written (or replaced by a later one).
+        """
+        if self._data is None:
+            return succeed(None)
+
+        self._renders += 1
+        render = self._renders
+
+        def rendered(text):
+            # Only the newest frame is worth writing.
+            if render == self._renders:
+                self.sink.write(text)
+            if render % REPORT_EVERY == 0:
+                _log.info(
+                    "Row cache: {hits} hits, {misses} misses ({rate:.0%})",
+                    hits=self.rows.hits, misses=self.rows.misses,
+                    rate=self.rows.hit_rate(),
+                )
+
+        # The view is copied since it may change while a worker renders.
+        d = self.run(
+            _render_pod_top,
+            self.reactor, self._data, attr.evolve(self.view), self.paused,
+            self.rows, self.model,
+        )
+        d.addCallback(rendered)
+        return d
+
+
+    def page_size(self):
+        return self.sink.terminal.size().rows
+
+
+
+@attr.s
+class RowCache(object):
+    """
+    Rendered table rows, remembered from one frame to the next.
+
+    A row is keyed on everything that goes into it so a row whose values
+    have changed is simply not found.  Rows which a frame did not use (those
+    of pods which have gone, or whose usage has changed) are forgotten at
+    the end of the frame.
+
+    :ivar int size: The most rows to remember.  The least recently used rows
+        are forgotten first.
+
+    :ivar int hits: The number of rows found.
+
+    :ivar int misses: The number of rows which had to be rendered.
+    """
+    size = attr.ib(default=100000)
+    hits = attr.ib(default=0)
+    misses = attr.ib(default=0)
+
+    _rows = attr.ib(default=attr.Factory(OrderedDict))
+    _used = attr.ib(default=attr.Factory(set))
+    _lock = attr.ib(default=attr.Factory(Lock))
+
+    def get(self, key, render, *args):
+        """
+        Get a row, rendering it with ``render(*args)`` if it is not known.
+        """
+        # Frames may be rendered in several threads at once (see
+        # ``_offload``).  The lock is not held while rendering so that they
+        # only wait for each other to look rows up.
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            row = render(*args)
+        with self._lock:
+            self._rows[key] = row
+            if len(self._rows) > self.size:
+                self._rows.popitem(last=False)
+            self._used.add(key)
+        return row
+
+
+    def end_frame(self):
+        """
+        Forget the rows which were not used since the last frame ended.
+        """
+        with self._lock:
+            used, self._used = self._used, set()
+            for key in list(self._rows):
+                if key not in used:
+                    del self._rows[key]
+
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+
+@attr.s
+class _NoRowCache(object):
+    """
+    Render every row.
+    """
+    def get(self, key, render, *args):
+        return render(*args)
+
+
+    def end_frame(self):
+        pass
 
 
 
@@ -80,16 +283,127 @@ class Sink(object):
 
 
     def write(self, text):
-        size = self.terminal.size()
-        num_lines = size.rows
-        truncated = "\n".join(text.splitlines()[:num_lines])
-        self.outfile.write(truncated)
+        self.outfile.write(_fit(text, self.terminal.size()))
+        self.outfile.flush()
+
+
+    def write_partial(self, text):
+        self.outfile.write(text)
         self.outfile.flush()
 
 
 
-def _render_kubetop(data, sink, reactor):
-    sink.write(_render_pod_top(reactor, data))
+def _fit(text, size):
+    return "\n".join(text.splitlines()[:size.rows])
+
+
+
+class _TerminalWriter(FileDescriptor):
+    """
+    Write to a non-blocking file descriptor as fast as it will take it.
+    """
+    # Any data which cannot be written right away pauses the producer.
+    bufferSize = 0
+
+    def __init__(self, reactor, fd):
+        FileDescriptor.__init__(self, reactor)
+        self.fd = fd
+        self.connected = True
+
+
+    def fileno(self):
+        return self.fd
+
+
+    def writeSomeData(self, data):
+        try:
+            return write(self.fd, data)
+        except (IOError, OSError) as e:
+            if e.errno == EAGAIN:
+                return 0
+            return CONNECTION_LOST
+
+
+    def logPrefix(self):
+        return "kubetop-terminal"
+
+
+
+@implementer(IPushProducer)
+@attr.s
+class ReactorSink(object):
+    """
+    Write frames to a terminal without blocking the reactor.
+
+    A frame which arrives while an earlier one is still being written waits
+    until the writer has drained.  If a newer frame arrives in the meantime,
+    the waiting frame is dropped without being written.
+
+    :ivar int dropped: The number of frames dropped so far.
+    """
+    terminal = attr.ib()
+    writer = attr.ib()
+    encoding = attr.ib(default="utf-8")
+    dropped = attr.ib(default=0)
+
+    _paused = attr.ib(default=False)
+    _pending = attr.ib(default=None)
+
+    def __attrs_post_init__(self):
+        self.writer.registerProducer(self, True)
+
+
+    @classmethod
+    def from_file(cls, reactor, outfile):
+        """
+        Make writes to a file non-blocking until the reactor shuts down.
+        """
+        fd = outfile.fileno()
+        flags = fcntl(fd, F_GETFL)
+        setNonBlocking(fd)
+        reactor.addSystemEventTrigger(
+            "after", "shutdown", fcntl, fd, F_SETFL, flags,
+        )
+        return cls(
+            Terminal(fd),
+            _TerminalWriter(reactor, fd),
+            getattr(outfile, "encoding", None) or "utf-8",
+        )
+
+
+    def write(self, text):
+        data = _fit(text, self.terminal.size()).encode(self.encoding, "replace")
+        if self._paused:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = data
+        else:
+            self.writer.write(data)
+
+
+    def write_partial(self, text):
+        """
+        Write an update to part of the current frame, unless the writer is
+        busy (in which case the update is not worth waiting for).
+        """
+        if not self._paused:
+            self.writer.write(text.encode(self.encoding, "replace"))
+
+
+    def pauseProducing(self):
+        self._paused = True
+
+
+    def resumeProducing(self):
+        self._paused = False
+        if self._pending is not None:
+            data, self._pending = self._pending, None
+            self.writer.write(data)
+
+
+    def stopProducing(self):
+        self._pending = None
+
 
 
 def _render_row(*values):
@@ -106,34 +420,102 @@ def _clear():
     return "\x1b[2J\x1b[1;1H"
 
 
-def _render_clockline(reactor):
-    return "kubetop - {}\n".format(
-        datetime.fromtimestamp(reactor.seconds()).strftime("%H:%M:%S")
+def _home():
+    return "\x1b[1;1H"
+
+
+def _clear_line():
+    return "\x1b[K"
+
+
+def _same(a, b):
+    return a is b or a == b
+
+
+def _same_frame(old, new):
+    """
+    Determine whether two frames of data would be rendered the same (apart
+    from the clock).
+    """
+    return all(
+        _same(old_info[key], new_info[key])
+        for (old_info, new_info) in zip(old, new)
+        for key in ("usage", "info")
+    )
+
+
+def _render_clockline(reactor, view=None, paused=False):
+    status = []
+    if paused:
+        status.append("paused")
+    if view is not None and view.filter:
+        status.append("filter: {}".format(view.filter))
+    return "kubetop - {}{}\n".format(
+        datetime.fromtimestamp(reactor.seconds()).strftime("%H:%M:%S"),
+        "".join(" [{}]".format(s) for s in status),
     )
 
 
-def _render_pod_top(reactor, data):
+def _scroll(text, offset):
+    """
+    Drop the first ``offset`` lines of ``text`` (but never all of them).
+    """
+    if offset <= 0:
+        return text
+    lines = text.splitlines(True)
+    return "".join(lines[min(offset, max(0, len(lines) - 1)):])
+
+
+def _render_pod_top(
+        reactor, data, view, paused=False, rows=_NoRowCache(), model=None,
+):
     (node_info, pod_info) = data
-    nodes = node_info["info"]["items"]
-    node_usage = node_info["usage"]["items"]
+    nodes = node_info["info"]
+    node_usage = node_info["usage"].items
+
+    pods = pod_info["info"]
+    pod_usage = pod_info["usage"].items
+    frame = None
+    if model is not None:
+        frame = model.update(pods, pod_usage)
+    if view.filter:
+        pod_usage = list(
+            usage
+            for usage
+            in pod_usage
+            if view.filter in usage.name
+        )
 
-    pods = pod_info["info"].items
-    pod_usage = pod_info["usage"]["items"]
+    if view.group_by is None and view.sort == "cpu" and frame is not None:
+        # The model keeps this ranking up to date as frames come in.
+        table = _render_ranked_pods(frame.ranked, nodes, view.filter, rows)
+    elif view.group_by is None:
+        table = _render_pods(pods, pod_usage, nodes, view.sort, rows)
+    else:
+        table = _render_groups(
+            pods, pod_usage, nodes, view.group_by, view.expand, view.sort,
+            rows,
+        )
+    rows.end_frame()
 
     return "".join((
         _clear(),
-        _render_clockline(reactor),
-        _render_nodes(nodes, node_usage, pods),
-        _render_pod_phase_counts(pods),
-        _render_header(nodes, pods),
-        _render_pods(pods, pod_usage, nodes),
+        _render_clockline(reactor, view, paused),
+        _render_nodes(
+            nodes, node_usage, pods, frame.host_pods if frame else None,
+            view.nodes,
+        ),
+        _render_pod_phase_counts(pods, frame.phases if frame else None),
+        _render_header(nodes, pods, view.group_by),
+        _scroll(table, view.offset),
     ))
 
 
-def _render_pod_phase_counts(pods):
-    phases = {}
-    for pod in pods:
-        phases[pod.status.phase] = phases.get(pod.status.phase, 0) + 1
+def _render_pod_phase_counts(pods, phases=None):
+    if phases is None:
+        phases = {}
+        for pod in pods:
+            phases[pod.phase] = phases.get(pod.phase, 0) + 1
 
     return (
         "Pods: "
@@ -149,89 +531,121 @@ def _render_pod_phase_counts(pods):
     )
 
 
-def _render_header(nodes, pods):
-    return _render_row(*(
-        label
-        for (width, label)
-        in COLUMNS
-    ))
+def _render_header(nodes, pods, group_by=None):
+    labels = list(label for (width, label) in COLUMNS)
+    if group_by is not None:
+        labels[:2] = [group_by.upper(), ""]
+    return _render_row(*labels)
 
 
-def _render_nodes(nodes, node_usage, pods):
-    usage_by_name = {
-        usage["metadata"]["name"]: usage
-        for usage
-        in node_usage
-    }
-    def pods_for_node(node):
-        return list(
-            pod
-            for pod
-            in pods
-            if _pod_on_node(pod, node)
+def _render_nodes(nodes, node_usage, pods, host_pods=None, mode="all"):
+    """
+    :param mode: One of ``_view.NODES``.
+    """
+    columns = NodeColumns.from_data(nodes, node_usage, pods, host_pods)
+    if mode == "summary" or (mode == "auto" and len(nodes) > SUMMARY_NODES):
+        return _render_node_summary(
+            columns, NodeSummary.from_columns(columns, HOTTEST_NODES),
         )
+    return _render_node_lines(columns, range(len(nodes)))
+
 
+def _render_node_lines(columns, indexes):
+    cpu_percent = columns.cpu_percent()
+    memory_percent = columns.memory_percent()
+    pod_percent = columns.pod_percent()
     return "".join(
         "Node {} {}\n".format(
             i,
             _render_node(
-                node,
-                usage_by_name[node["metadata"]["name"]],
-                pods_for_node(node),
+                cpu_percent[i],
+                memory_percent[i],
+                _Memory(Byte(int(columns.memory_used[i]))),
+                _Memory(Byte(int(columns.memory_allocatable[i]))),
+                pod_percent[i],
+                columns.pod_count[i],
+                columns.pods_allocatable[i],
+                columns.ready[i],
+                columns.stale[i],
             ),
         )
-        for i, node
-        in enumerate(nodes)
+        for i
+        in indexes
     )
 
 
-def _render_node(node, usage, pods):
-    # From v1.NodeStatus model documentation:
-    #
-    #     Allocatable represents the resources of a node that are available
-    #     for scheduling. Defaults to Capacity.
-    allocatable = node["status"]["allocatable"]
-
-    cpu_max = parse_cpu(allocatable["cpu"])
-    cpu_used = parse_cpu(usage["usage"]["cpu"])
+def _render_node_summary(columns, summary):
+    """
+    Render the whole cluster in a few lines followed by the lines of its
+    busiest nodes.
+    """
+    return "".join((
+        (
+            "Nodes: "
+            "{total:>7} total "
+            "{not_ready:>8} not ready "
+            "{stale:>8} stale\n"
+        ).format(
+            total=summary.nodes,
+            not_ready=summary.not_ready,
+            stale=summary.stale,
+        ),
+        "Nodes  {}\n".format(_render_node(
+            _share(summary.cpu_used, summary.cpu_allocatable),
+            _share(summary.memory_used, summary.memory_allocatable),
+            _Memory(Byte(summary.memory_used)),
+            _Memory(Byte(summary.memory_allocatable)),
+            _share(summary.pod_count, summary.pods_allocatable),
+            summary.pod_count,
+            summary.pods_allocatable,
+            None,
+        )),
+        "Nodes by CPU%:{}\n".format("".join(
+            " {}+:{}".format(i * 10, count)
+            for (i, count)
+            in enumerate(summary.cpu_deciles)
+        )),
+        _render_node_lines(columns, summary.hottest),
+    ))
 
-    mem_max = parse_memory(allocatable["memory"])
-    mem_used = parse_memory(usage["usage"]["memory"])
 
-    pod_count = len(pods)
-    pod_max = int(allocatable["pods"])
+def _share(portion, whole):
+    if whole == 0:
+        return 0.0
+    return portion / whole * 100
 
-    if any(
-            condition["type"] == "Ready" and condition["status"] == "True"
-            for condition
-            in node["status"]["conditions"]
-    ):
-        condition = "Ready"
-    else:
-        condition = "NotReady"
 
-    return (
+def _render_node(
+        cpu_percent, memory_percent, mem_used, mem_max,
+        pod_percent, pod_count, pod_max, ready, stale=False,
+):
+    """
+    :param ready: Whether the node is ready, or ``None`` to leave out the
+        condition (for the totals of several nodes).
+    """
+    usage = (
         "CPU% {cpu:>6.2f} "
-        "MEM% {mem} ({mem_used}/{mem_max})  "
-        "POD% {pod:>5.2f} ({pod_count:3}/{pod_max:3}) "
-        "{condition}"
+        "MEM% {mem:>5.2f} ({mem_used}/{mem_max})  "
+        "POD% {pod:>5.2f} ({pod_count:3}/{pod_max:3})"
     ).format(
-        cpu=cpu_used / cpu_max * 100,
-        mem=mem_max.render_percentage(mem_used),
+        cpu=cpu_percent,
+        mem=memory_percent,
         mem_used=mem_used.render("4.0"),
         mem_max=mem_max.render("4.0"),
-        pod=pod_count / pod_max * 100,
+        pod=pod_percent,
         pod_count=pod_count,
         pod_max=pod_max,
-        condition=condition,
     )
+    if ready is None:
+        return usage
 
-
-
-def _pod_on_node(pod, node):
-    return pod.status is not None and pod.status.hostIP in (
-        addr["address"] for addr in node["status"]["addresses"]
-    )
+    if ready:
+        condition = "Ready"
+    else:
+        condition = "NotReady"
+    if stale:
+        condition += " (stale)"
+    return usage + " " + condition
 
 
 
@@ -268,60 +682,130 @@ class _CPU(object):
         return "{:>5.1f}".format(portion.amount / self.amount * 100)
 
 
-def _node_allocable_memory(pod, nodes):
-    for node in nodes:
-        if _pod_on_node(pod, node):
-            return parse_memory(node["status"]["allocatable"]["memory"])
+def _node_memory(nodes):
+    return list(_Memory(Byte(node.memory)) for node in nodes)
+
+
+def _pod_node_memory(columns, node_memory, i):
+    if columns.node_index[i] >= 0:
+        return node_memory[columns.node_index[i]]
     return _UnknownMemory()
 
 
-def _render_pods(pods, pod_usage, nodes):
-    pod_by_name = {
-        pod.metadata.name: pod
-        for pod
-        in pods
+def _render_cached_pod(rows, pod_usage, nodes, columns, node_memory, i):
+    node = columns.node_index[i]
+    key = (
+        pod_usage[i].name,
+        int(columns.cpu[i]),
+        int(columns.memory[i]),
+        nodes[node].memory if node >= 0 else None,
+    )
+    return rows.get(
+        key,
+        _render_pod, pod_usage[i], _pod_node_memory(columns, node_memory, i),
+    )
+
+
+def _render_ranked_pods(ranked, nodes, filter=None, rows=_NoRowCache()):
+    """
+    Render pods already in order (see ``FrameModel``).
+    """
+    node_memory = _node_memory(nodes)
+    node_index = {
+        address: i
+        for (i, node) in enumerate(nodes)
+        for address in node.addresses
     }
-    pod_data = (
-        (
-            _render_pod(
-                usage,
-                _node_allocable_memory(
-                    pod_by_name[usage["metadata"]["name"]],
-                    nodes,
-                ),
-            ),
-            _render_containers(usage["containers"]),
-        )
-        for usage
-        in sorted(pod_usage, key=_pod_stats, reverse=True)
+    unknown = _UnknownMemory()
+
+    def render(cpu, memory, usage, host_ip):
+        i = node_index.get(host_ip, -1)
+        key = (usage.name, cpu, memory, nodes[i].memory if i >= 0 else None)
+        return rows.get(
+            key, _render_pod, usage, node_memory[i] if i >= 0 else unknown,
+        ) + _render_containers(usage.containers, rows)
+
+    return "".join(
+        render(cpu, memory, usage, host_ip)
+        for (cpu, memory, usage, host_ip)
+        in ranked
+        if not filter or filter in usage.name
     )
+
+
+def _render_pods(pods, pod_usage, nodes, sort="cpu", rows=_NoRowCache()):
+    columns = PodColumns.from_data(pods, pod_usage, nodes)
+    node_memory = _node_memory(nodes)
     return "".join(
-        rendered_pod + rendered_containers
-        for (rendered_pod, rendered_containers)
-        in pod_data
+        _render_cached_pod(rows, pod_usage, nodes, columns, node_memory, i) +
+        _render_containers(pod_usage[i].containers, rows)
+        for i
+        in columns.ranking(sort)
     )
 
 
-def _pod_stats(pod):
-    cpu = sum(
-        map(
-            parse_cpu, (
-                container["usage"]["cpu"]
-                for container
-                in pod["containers"]
-            ),
-        ), 0,
+def _group_keys(group_by, columns, nodes):
+    """
+    Get the key of the group each pod row belongs to.
+    """
+    if group_by == "namespace":
+        return list(columns.namespaces[i] for i in columns.namespace_index)
+    if group_by == "node":
+        names = list(node.name for node in nodes)
+        return list(
+            names[i] if i >= 0 else "(unknown)"
+            for i
+            in columns.node_index
+        )
+    if group_by == "owner":
+        return list(
+            owner if owner is not None else name
+            for (owner, name)
+            in zip(columns.owners, columns.names)
+        )
+    raise ValueError("Unknown grouping: {!r}".format(group_by))
+
+
+def _render_groups(
+        pods, pod_usage, nodes, group_by, expand, sort="cpu",
+        rows=_NoRowCache(),
+):
+    columns = PodColumns.from_data(pods, pod_usage, nodes)
+    node_memory = _node_memory(nodes)
+    groups = columns.group(_group_keys(group_by, columns, nodes), sort)
+    return "".join(
+        _render_group(group) + (
+            "".join(
+                _render_cached_pod(
+                    rows, pod_usage, nodes, columns, node_memory, i,
+                )
+                for i
+                in group.members
+            )
+            if expand
+            else ""
+        )
+        for group
+        in groups
     )
-    mem = sum(
-        map(
-            lambda s: parse_memory(s).amount, (
-                container["usage"]["memory"]
-                for container
-                in pod["containers"]
-            ),
-        ), Byte(0),
+
+
+def _render_group(group):
+    return _render_row(
+        _render_limited_width(
+            "{} ({})".format(group.key, len(group.members)), 46,
+        ),
+        "",
+        _CPU(1000).render_percentage(_CPU(group.cpu)),
+        _Memory(Byte(group.memory)).render("8.2"),
+        "",
     )
-    return (_CPU(cpu), _Memory(mem))
+
+
+def _pod_stats(pod):
+    cpu = sum((container.cpu for container in pod.containers), 0)
+    mem = sum((container.memory for container in pod.containers), 0)
+    return (_CPU(cpu), _Memory(Byte(mem)))
 
 
 def _render_limited_width(s, w):
@@ -342,7 +826,7 @@ def _render_pod(pod, node_allocable_memory):
     return _render_row(
         # Limit rendered name to combined width of the pod and container
         # columns.
-        _render_limited_width(pod["metadata"]["name"], 46),
+        _render_limited_width(pod.name, 46),
         "",
         _CPU(1000).render_percentage(cpu),
         mem.render("8.2"),
@@ -350,61 +834,20 @@ def _render_pod(pod, node_allocable_memory):
     )
 
 
-def _render_containers(containers):
+def _render_containers(containers, rows=_NoRowCache()):
     return "".join((
-        _render_container(container)
+        # A container record holds everything that goes into its row.
+        rows.get(container, _render_container, container)
         for container
-        in sorted(containers, key=lambda c: -parse_cpu(c["usage"]["cpu"]))
+        in sorted(containers, key=lambda c: -c.cpu)
     ))
 
 
 def _render_container(container):
     return _render_row(
         "",
-        _render_limited_width("(" + container["name"] + ")", 46),
-        _CPU(1000).render_percentage(_CPU(parse_cpu(container["usage"]["cpu"]))),
-        parse_memory(container["usage"]["memory"]).render("8.2"),
+        _render_limited_width("(" + container.name + ")", 46),
+        _CPU(1000).render_percentage(_CPU(container.cpu)),
+        _Memory(Byte(container.memory)).render("8.2"),
         "",
     )
-
-
-def partition(seq, pred):
-    return (
-        u"".join(x for x in seq if pred(x)),
-        u"".join(x for x in seq if not pred(x)),
-    )
-
-
-def parse_cpu(s):
-    return parse_k8s_resource(s, default_scale=1000)
-
-
-def parse_memory(s):
-    return _Memory(Byte(parse_k8s_resource(s, default_scale=1)))
-
-
-def parse_k8s_resource(s, default_scale):
-    amount, suffix = partition(s, unicode.isdigit)
-    try:
-        scale = suffix_scale(suffix)
-    except KeyError:
-        scale = default_scale
-    return int(amount) * scale
-
-
-def suffix_scale(suffix):
-    return {
-        "m": 1,
-        "K": 2 ** 10,
-        "Ki": 2 ** 10,
-        "M": 2 ** 20,
-        "Mi": 2 ** 20,
-        "G": 2 ** 30,
-        "Gi": 2 ** 30,
-        "T": 2 ** 40,
-        "Ti": 2 ** 40,
-        "P": 2 ** 50,
-        "Pi": 2 ** 50,
-        "E": 2 ** 60,
-        "Ei": 2 ** 60,
-    }[suffix]
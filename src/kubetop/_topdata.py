@@ -8,36 +8,433 @@ Theory of Operation
 ===================
 
 #. Combine Kubernetes API server location with a resource collection object.
-#. Collect resource usage information via the Heapster service on the
-   Kubernetes API server.
+#. Collect resource usage information from a metrics backend: either the
+   ``metrics.k8s.io`` aggregated API or, on clusters without it, the Heapster
+   service on the Kubernetes API server.  Unless told which, find out which
+   one the cluster offers using API discovery.
+#. Alternatively, scrape the summary statistics of every kubelet, a bounded
+   number of nodes at a time.  Give up on nodes which are slow to answer and
+   show what was last heard from them, marked stale.
+#. Remember slow-changing resources (namespaces, nodes, pods) for a while so
+   that most iterations only fetch the usage information.
+#. Ask for compressed, conditional responses so that whatever is fetched
+   costs as little as possible to transfer.
+#. Decode responses directly into the compact records of ``_records`` so
+   that no more than kubetop displays is kept in memory.
 """
 
 from __future__ import unicode_literals
 
-from twisted.internet.defer import gatherResults
+from zope.interface import Attribute, Interface, implementer
+
+from twisted.internet.defer import (
+    Deferred, DeferredSemaphore, gatherResults, succeed,
+)
 
 import attr
 import attr.validators
 
-from treq import json_content
 from treq.client import HTTPClient
 
-from txkube import IKubernetes, network_kubernetes_from_context
+from pem import parse
+
+from twisted.python.url import URL
+
+from txkube import (
+    IKubernetes, authenticate_with_certificate_chain, network_kubernetes,
+    network_kubernetes_from_context,
+)
+
+from ._cache import TTLCache
+from ._kubeconfig import context_details, credential
+from ._http import (
+    ConditionalGetter, compressing_agent, connection_pool, use_pool,
+)
+from ._offload import synchronous
+from ._protobuf import decode_pod_list, decode_node_list
+from ._records import (
+    pods_from_raw, nodes_from_raw, pod_usage_from_raw, node_usage_from_raw,
+)
+
+# The default number of seconds for which each kind of slow-changing resource
+# is remembered.
+DEFAULT_LIFETIMES = {
+    "metrics": 3600.0,
+    "namespaces": 300.0,
+    "nodes": 60.0,
+    "pods": 15.0,
+}
+
+
+
+class IMetricsBackend(Interface):
+    """
+    A source of pod and node resource usage.
+
+    Both methods produce documents shaped like a ``PodMetricsList`` or
+    ``NodeMetricsList``: an ``items`` list of objects with ``metadata`` and
+    either ``containers`` (each with a ``usage``) or ``usage``.
+    """
+    name = Attribute("The name by which this backend is selected.")
+
+    def pod_usage(get, base_url, namespaces, nodes):
+        """
+        Retrieve the resource usage of all pods.
+
+        :param get: A one-argument callable which retrieves the JSON document
+            at a location and returns a ``Deferred`` that fires with it.
+
+        :param unicode base_url: The location of the Kubernetes API server.
+
+        :param namespaces: A zero-argument callable returning a ``Deferred``
+            that fires with a list of the names of all namespaces.
+
+        :param nodes: A zero-argument callable returning a ``Deferred`` that
+            fires with a list of the names of all nodes.
+
+        :return Deferred: A ``Deferred`` that fires with the usage document.
+        """
+
+    def node_usage(get, base_url, nodes):
+        """
+        Retrieve the resource usage of all nodes.
+
+        :see: ``pod_usage``
+        """
+
+
+
+@implementer(IMetricsBackend)
+@attr.s(frozen=True)
+class HeapsterMetrics(object):
+    """
+    Get usage from the Heapster service, proxied by the API server.
+
+    Heapster only lists pods one namespace at a time.
+    """
+    name = "heapster"
+
+    def pod_usage(self, get, base_url, namespaces, nodes):
+        d = namespaces()
+
+        def got_namespaces(namespaces):
+            d = gatherResults(
+                get(base_url + self.pod_location(ns))
+                for ns
+                in namespaces
+            )
+
+            def combine(pod_usages):
+                result = []
+                for usage in pod_usages:
+                    if usage["items"] is None:
+                        continue
+                    for item in usage["items"]:
+                        result.append(item)
+                return {"items": result}
+            d.addCallback(combine)
+            return d
+        d.addCallback(got_namespaces)
+        return d
+
+    def pod_location(self, namespace):
+        # kubectl --v=11 top pods
+        return (
+            "/api/v1/namespaces/kube-system/services/http:heapster:"
+            "/proxy/apis/metrics/v1alpha1/namespaces/{namespace}/pods?"
+            "labelSelector="
+        ).format(namespace=namespace)
+
+    def node_usage(self, get, base_url, nodes):
+        return get(base_url + self.node_location())
+
+    def node_location(self):
+        # url-hacked from pod_location... I found no docs that clearly explain
+        # what is going on here.
+        # https://github.com/kubernetes/heapster/blob/master/docs/model.md
+        # provides some hints but it's documenting the actual Heapster API
+        # which requires port-forwarding into the Heapster pod to access.
+        return (
+            "/api/v1/namespaces/kube-system/services/http:heapster:"
+            "/proxy/apis/metrics/v1alpha1/nodes"
+        )
+
+
+
+@implementer(IMetricsBackend)
+@attr.s(frozen=True)
+class MetricsAPI(object):
+    """
+    Get usage from the ``metrics.k8s.io`` aggregated API (served by
+    metrics-server), which lists the pods of all namespaces at once.
+    """
+    name = "metrics.k8s.io"
+    group_version = "metrics.k8s.io/v1beta1"
+
+    def pod_usage(self, get, base_url, namespaces, nodes):
+        return get(base_url + "/apis/" + self.group_version + "/pods")
+
+    def node_usage(self, get, base_url, nodes):
+        return get(base_url + "/apis/" + self.group_version + "/nodes")
+
+
+
+def _usage(stats):
+    """
+    Convert kubelet CPU and memory statistics to a metrics API usage object.
+    """
+    return {
+        "cpu": "{}m".format(
+            (stats.get("cpu") or {}).get("usageNanoCores", 0) // 10 ** 6,
+        ),
+        "memory": "{}".format(
+            (stats.get("memory") or {}).get("workingSetBytes", 0),
+        ),
+    }
+
+
+
+def _pod_usage(summary):
+    return list(
+        {
+            "metadata": {
+                "name": pod["podRef"]["name"],
+                "namespace": pod["podRef"]["namespace"],
+            },
+            "containers": list(
+                {"name": container["name"], "usage": _usage(container)}
+                for container
+                in pod.get("containers") or []
+            ),
+        }
+        for pod
+        in summary.get("pods") or []
+    )
+
+
+
+@implementer(IMetricsBackend)
+@attr.s
+class KubeletSummary(object):
+    """
+    Get usage from the summary statistics of each node's kubelet, proxied by
+    the API server.
+
+    The pod and node usage of a frame come from the same scrape if they are
+    asked for together.
+
+    :ivar clock: An ``IReactorTime`` provider used for timeouts.
+
+    :ivar int parallel: The most nodes to scrape at once.
+
+    :ivar float timeout: The number of seconds after which to give up on a
+        node and use the summary last scraped from it.
+    """
+    name = "kubelet"
+
+    clock = attr.ib()
+    parallel = attr.ib(default=16)
+    timeout = attr.ib(default=2.0)
+
+    _summaries = attr.ib(default=attr.Factory(dict))
+    _waiting = attr.ib(default=None)
+    _semaphore = attr.ib(init=False)
+
+    @_semaphore.default
+    def _semaphore_default(self):
+        return DeferredSemaphore(self.parallel)
+
+    def pod_usage(self, get, base_url, namespaces, nodes):
+        d = self._scrape(get, base_url, nodes)
+        d.addCallback(
+            lambda scraped: {
+                "items": list(
+                    pod
+                    for (name, summary, stale) in scraped
+                    if summary is not None
+                    for pod in _pod_usage(summary)
+                ),
+            },
+        )
+        return d
+
+    def node_usage(self, get, base_url, nodes):
+        d = self._scrape(get, base_url, nodes)
+        d.addCallback(
+            lambda scraped: {
+                "items": list(
+                    {
+                        "metadata": {"name": name},
+                        "usage": _usage(summary["node"]),
+                        "stale": stale,
+                    }
+                    for (name, summary, stale) in scraped
+                    if summary is not None
+                ),
+            },
+        )
+        return d
+
+    def summary_location(self, node):
+        return "/api/v1/nodes/{node}/proxy/stats/summary".format(node=node)
+
+    def _scrape(self, get, base_url, nodes):
+        waiter = Deferred()
+        if self._waiting is not None:
+            self._waiting.append(waiter)
+            return waiter
+        self._waiting = [waiter]
+
+        def done(result):
+            waiting, self._waiting = self._waiting, None
+            for waiter in waiting:
+                waiter.callback(result)
+
+        d = nodes()
+        d.addCallback(
+            lambda names: gatherResults(
+                list(self._scrape_node(get, base_url, name) for name in names),
+            ),
+        )
+        d.addBoth(done)
+        return waiter
+
+    def _scrape_node(self, get, base_url, name):
+        def request():
+            return get(
+                base_url + self.summary_location(name),
+            ).addTimeout(self.timeout, self.clock)
+
+        def scraped(summary):
+            self._summaries[name] = summary
+            return (name, summary, False)
+
+        def failed(reason):
+            return (name, self._summaries.get(name), True)
+
+        d = self._semaphore.run(request)
+        d.addCallbacks(scraped, failed)
+        return d
+
+
+
+
+METRICS_BACKENDS = {
+    backend.name: backend
+    for backend
+    in [HeapsterMetrics(), MetricsAPI()]
+}
+
+
+def make_metrics(reactor, name):
+    """
+    Get a metrics backend by name.
+
+    :param unicode name: ``KubeletSummary.name`` or a key of
+        ``METRICS_BACKENDS``.
+
+    :return IMetricsBackend: The backend.
+    """
+    if name == KubeletSummary.name:
+        return KubeletSummary(clock=reactor)
+    return METRICS_BACKENDS[name]
+
+
+
+def detect_metrics(groups):
+    """
+    Choose a metrics backend based on the API groups the server offers.
+
+    :param dict groups: The ``APIGroupList`` document served at ``/apis``.
+
+    :return IMetricsBackend: ``MetricsAPI`` if the server offers its API
+        group, otherwise ``HeapsterMetrics``.
+    """
+    for group in groups.get("groups", []):
+        for version in group.get("versions", []):
+            if version.get("groupVersion") == MetricsAPI.group_version:
+                return METRICS_BACKENDS[MetricsAPI.name]
+    return METRICS_BACKENDS[HeapsterMetrics.name]
+
+
+
+def kubernetes_from_config(reactor, config, context, config_path):
+    """
+    Like ``txkube.network_kubernetes_from_context`` but with configuration
+    which has already been loaded (see ``_kubeconfig``).
+    """
+    (cluster, user) = context_details(config, context)
+    base_url = URL.fromText(cluster["server"])
+    [ca_cert] = parse(credential(cluster, "certificate-authority", config_path))
+    client_chain = parse(credential(user, "client-certificate", config_path))
+    [client_key] = parse(credential(user, "client-key", config_path))
+    return network_kubernetes(
+        base_url=base_url,
+        agent=authenticate_with_certificate_chain(
+            reactor, base_url, client_chain, client_key, ca_cert,
+        ),
+    )
+
 
 
-def make_source(reactor, config_path, context_name):
+def make_source(
+        reactor, config_path, context_name,
+        lifetimes=DEFAULT_LIFETIMES, protobuf=False, metrics=None,
+        run=synchronous, connections=16, config=None,
+):
     """
     Get a source of Kubernetes resource usage data.
+
+    :param dict lifetimes: The number of seconds to remember each kind of
+        slow-changing resource for.  See ``DEFAULT_LIFETIMES``.
+
+    :param bool protobuf: Whether to ask for pod and node lists in the
+        protobuf encoding.
+
+    :param unicode metrics: The name of the metrics backend to use (see
+        ``make_metrics``) or ``None`` to detect it.
+
+    :param run: The runner with which to parse and decode responses (see
+        ``_offload``).
+
+    :param int connections: The most idle connections to keep open to the
+        API server, or 0 to close each connection after one request.
+
+    :param dict config: The configuration already loaded from
+        ``config_path``, or ``None`` to load it.
     """
-    kubernetes = network_kubernetes_from_context(
-        reactor, context_name, config_path
+    if config is None:
+        kubernetes = network_kubernetes_from_context(
+            reactor, context_name, config_path
+        )
+    else:
+        kubernetes = kubernetes_from_config(
+            reactor, config, context_name, config_path,
+        )
+    return _Source(
+        kubernetes=kubernetes,
+        cache=TTLCache(clock=reactor, lifetimes=dict(lifetimes)),
+        http=ConditionalGetter(run=run),
+        protobuf=protobuf,
+        metrics=None if metrics is None else make_metrics(reactor, metrics),
+        pool=connection_pool(reactor, connections) if connections else None,
     )
-    return _Source(kubernetes=kubernetes)
 
 
 @attr.s(frozen=True)
 class _Source(object):
     kubernetes = attr.ib(validator=attr.validators.provides(IKubernetes))
+    cache = attr.ib(default=attr.Factory(lambda: TTLCache(clock=None)))
+    http = attr.ib(default=attr.Factory(ConditionalGetter))
+    protobuf = attr.ib(default=False)
+    metrics = attr.ib(
+        default=None,
+        validator=attr.validators.optional(
+            attr.validators.provides(IMetricsBackend),
+        ),
+    )
+    pool = attr.ib(default=None)
+    _decoded = attr.ib(default=attr.Factory(dict))
 
     def pods(self):
         base_url = self.kubernetes.base_url
@@ -46,7 +443,10 @@ class _Source(object):
         def _pods(client):
             return gatherResults([
                 self._pod_usage_from_client(client, base_url),
-                self.kubernetes.versioned_client().addCallback(self._pod_info),
+                self.cache.get(
+                    "pods",
+                    lambda: self._pod_info_from_client(client, base_url),
+                ),
             ]).addCallback(
                 lambda usage_info: {
                     "usage": usage_info[0],
@@ -63,7 +463,10 @@ class _Source(object):
         def _nodes(client):
             return gatherResults([
                 self._node_usage_from_client(client, base_url),
-                self._node_info_from_client(client, base_url),
+                self.cache.get(
+                    "nodes",
+                    lambda: self._node_info_from_client(client, base_url),
+                ),
             ]).addCallback(
                 lambda usage_info: {
                     "usage": usage_info[0],
@@ -74,66 +477,101 @@ class _Source(object):
         return d
 
     def _client(self):
-        d = self.kubernetes.versioned_client()
-        d.addCallback(lambda client: HTTPClient(agent=client.agent))
-        return d
+        # Only the client's agent is used, so there is no need for the model
+        # ``versioned_client`` would build from the server's OpenAPI
+        # specification.
+        return succeed(self._http_client(self.kubernetes.client()))
+
+    def _http_client(self, client):
+        if self.pool is not None:
+            use_pool(client.agent, self.pool)
+        return HTTPClient(agent=compressing_agent(client.agent))
+
+    def _metrics(self, client, base_url):
+        if self.metrics is not None:
+            return succeed(self.metrics)
+        return self.cache.get(
+            "metrics",
+            lambda: self.http.get(
+                client, base_url.asText() + "/apis", detect_metrics,
+            ),
+        )
 
     def _pod_usage_from_client(self, client, base_url):
-        d = self.kubernetes.versioned_client()
-        d.addCallback(lambda client: client.list(client.model.v1.Namespace))
+        d = self._metrics(client, base_url)
+        d.addCallback(
+            lambda metrics: metrics.pod_usage(
+                lambda url: self.http.get(client, url),
+                base_url.asText(),
+                lambda: self.cache.get(
+                    "namespaces", lambda: self._namespaces(client, base_url),
+                ),
+                lambda: self._node_names(client, base_url),
+            ),
+        )
+        d.addCallback(self._decode_usage, "pods", pod_usage_from_raw)
+        return d
 
-        def got_namespaces(namespaces):
-            d = gatherResults(
-                client.get(
-                    base_url.asText() + self.pod_location(ns.metadata.name)
-                ).addCallback(
-                    json_content
-                )
-                for ns
-                in namespaces.items
-            )
+    def _decode_usage(self, document, kind, decode):
+        """
+        Turn a usage document into records, reusing the records from last time
+        if the metrics backend gave back the very same document.
+        """
+        last = self._decoded.get(kind)
+        if last is not None and last[0] is document:
+            return last[1]
 
-            def combine(pod_usages):
-                result = []
-                for usage in pod_usages:
-                    if usage["items"] is None:
-                        continue
-                    for item in usage["items"]:
-                        result.append(item)
-                return {"items": result}
-            d.addCallback(combine)
-            return d
-        d.addCallback(got_namespaces)
+        def decoded(usage):
+            self._decoded[kind] = (document, usage)
+            return usage
+        return self.http.run(decode, document).addCallback(decoded)
+
+    def _node_names(self, client, base_url):
+        d = self.cache.get(
+            "nodes", lambda: self._node_info_from_client(client, base_url),
+        )
+        d.addCallback(
+            lambda nodes: list(node.name for node in nodes),
+        )
         return d
 
-    def _pod_info(self, client):
-        return client.list(client.model.v1.Pod)
+    def _namespaces(self, client, base_url):
+        return self.http.get(
+            client, base_url.asText() + "/api/v1/namespaces",
+            lambda namespaces: list(
+                ns["metadata"]["name"]
+                for ns
+                in namespaces["items"]
+            ),
+        )
 
-    def pod_location(self, namespace):
-        # kubectl --v=11 top pods
-        return (
-            "/api/v1/namespaces/kube-system/services/http:heapster:"
-            "/proxy/apis/metrics/v1alpha1/namespaces/{namespace}/pods?"
-            "labelSelector="
-        ).format(namespace=namespace)
+    def _pod_info_from_client(self, client, base_url):
+        return self.http.get(
+            client, base_url.asText() + "/api/v1/pods",
+            pods_from_raw,
+            self._protobuf(decode_pod_list),
+        )
 
     def _node_usage_from_client(self, client, base_url):
-        d = client.get(base_url.asText() + self.node_location())
-        d.addCallback(json_content)
+        d = self._metrics(client, base_url)
+        d.addCallback(
+            lambda metrics: metrics.node_usage(
+                lambda url: self.http.get(client, url),
+                base_url.asText(),
+                lambda: self._node_names(client, base_url),
+            ),
+        )
+        d.addCallback(self._decode_usage, "nodes", node_usage_from_raw)
         return d
 
-    def node_location(self):
-        # url-hacked from pod_location... I found no docs that clearly explain
-        # what is going on here.
-        # https://github.com/kubernetes/heapster/blob/master/docs/model.md
-        # provides some hints but it's documenting the actual Heapster API
-        # which requires port-forwarding into the Heapster pod to access.
-        return (
-            "/api/v1/namespaces/kube-system/services/http:heapster:"
-            "/proxy/apis/metrics/v1alpha1/nodes"
+    def _node_info_from_client(self, client, base_url):
+        return self.http.get(
+            client, base_url.asText() + "/api/v1/nodes",
+            nodes_from_raw,
+            self._protobuf(decode_node_list),
         )
 
-    def _node_info_from_client(self, client, base_url):
-        d = client.get(base_url.asText() + "/api/v1/nodes")
-        d.addCallback(json_content)
-        return d
+    def _protobuf(self, decoder):
+        if self.protobuf:
+            return decoder
+        return None
@@ -32,6 +32,8 @@ Theory of Operation
 
 #. That object hooks ``Options`` and ``makeService`` up to the internals of
    ``twist`` (which are *totally* private, sigh).
+#. Requests for help or the version are answered by ``Options`` alone, without
+   loading ``twist`` at all.
 """
 
 from sys import stdout, argv
@@ -39,8 +41,9 @@ from os.path import expanduser
 
 import attr
 
-from twisted.application.twist import _options
-from twisted.application.twist._twist import Twist
+# Arguments which can be dealt with without setting up twist.
+_FAST_FLAGS = {"--help", "--version"}
+
 
 @attr.s(frozen=True)
 class MainService(object):
@@ -58,6 +61,10 @@ class TwistMain(object):
     exit_status = 0
     exit_message = None
 
+    # Where twist writes the log.  Other output, like profiles, goes next to
+    # it.
+    log_file = u"~/.kubetop.log"
+
     def exit(self, reason=None):
         if reason is not None:
             self.exit_status = 1
@@ -67,6 +74,13 @@ class TwistMain(object):
 
 
     def __call__(self):
+        if _FAST_FLAGS.intersection(argv[1:]):
+            # Options handles these itself and exits.
+            self.options().parseOptions(argv[1:])
+
+        from twisted.application.twist import _options
+        from twisted.application.twist._twist import Twist
+
         _options.getPlugins = lambda iface: [
             MainService(self.options, self._make_service),
         ]
@@ -74,7 +88,7 @@ class TwistMain(object):
         t = Twist()
 
         log_flag = u"--log-file"
-        log_file = u"~/.kubetop.log"
+        log_file = self.log_file
         app_name = u"kubetop"
         if str is bytes:
             # sys.argv must be bytes Python 2
@@ -0,0 +1,55 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Presentation choices which are independent of the data being presented.
+
+This module is imported while parsing the command line so it must stay cheap
+to import.
+"""
+
+from __future__ import unicode_literals
+
+import attr
+from attr import validators
+
+GROUP_BY = ("namespace", "node", "owner")
+
+SORT = ("cpu", "mem", "mem%", "name", "namespace", "restarts", "age")
+
+# How to show the nodes: a line for each, a summary of all of them, or
+# whichever suits the size of the cluster.
+NODES = ("auto", "summary", "all")
+
+
+
+@attr.s
+class View(object):
+    """
+    Choices about how to present a frame which don't depend on its data.
+
+    :ivar group_by: ``None`` to list pods individually or one of
+        ``GROUP_BY`` to roll them up by that property.
+
+    :ivar expand: When grouping, whether to list the member pods of each
+        group beneath it.
+
+    :ivar sort: One of ``SORT`` giving the order of the pod (or group) rows.
+
+    :ivar filter: Only pods with names containing this text are shown.
+
+    :ivar offset: The number of lines of the pod table scrolled past.
+
+    :ivar nodes: One of ``NODES``.
+    """
+    group_by = attr.ib(
+        default=None, validator=validators.in_((None,) + GROUP_BY),
+    )
+    expand = attr.ib(default=False)
+    sort = attr.ib(default="cpu", validator=validators.in_(SORT))
+    filter = attr.ib(default="")
+    offset = attr.ib(default=0)
+    nodes = attr.ib(default="auto", validator=validators.in_(NODES))
+
+
+
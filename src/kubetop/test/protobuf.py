@@ -0,0 +1,180 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Encoding of the Kubernetes protobuf wire format, enough to exercise
+``kubetop._protobuf``.
+"""
+
+from __future__ import unicode_literals
+
+from calendar import timegm
+from datetime import datetime
+
+from .._protobuf import _MAGIC
+
+
+def _varint(value):
+    result = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+
+def varint_field(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+
+def message_field(field, encoded):
+    return _varint(field << 3 | 2) + _varint(len(encoded)) + encoded
+
+
+
+def string_field(field, value):
+    return message_field(field, value.encode("utf-8"))
+
+
+
+def _time(value):
+    seconds = timegm(
+        datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").utctimetuple()
+    )
+    return varint_field(1, seconds)
+
+
+
+def _object_meta(metadata):
+    encoded = string_field(1, metadata["name"])
+    if "namespace" in metadata:
+        encoded += string_field(3, metadata["namespace"])
+    if "resourceVersion" in metadata:
+        encoded += string_field(6, metadata["resourceVersion"])
+    if "creationTimestamp" in metadata:
+        encoded += message_field(8, _time(metadata["creationTimestamp"]))
+    for reference in metadata.get("ownerReferences", []):
+        encoded += message_field(13, b"".join([
+            string_field(1, reference["kind"]),
+            string_field(3, reference["name"]),
+            string_field(4, reference["uid"]),
+            string_field(5, reference["apiVersion"]),
+            varint_field(6, reference["controller"]),
+        ]))
+    return encoded
+
+
+
+def _container_status(status):
+    return b"".join([
+        string_field(1, status["name"]),
+        varint_field(4, status["ready"]),
+        varint_field(5, status["restartCount"]),
+        string_field(6, status["image"]),
+        string_field(7, status["imageID"]),
+    ])
+
+
+
+def encode_pod(pod):
+    status = pod["status"]
+    encoded_status = string_field(1, status["phase"])
+    if "hostIP" in status:
+        encoded_status += string_field(5, status["hostIP"])
+    for container in status.get("containerStatuses", []):
+        encoded_status += message_field(8, _container_status(container))
+    return (
+        message_field(1, _object_meta(pod["metadata"])) +
+        # An unused PodSpec, to show that such fields are skipped.
+        message_field(2, string_field(9, "default")) +
+        message_field(3, encoded_status)
+    )
+
+
+
+def encode_node(node):
+    status = node["status"]
+    encoded_status = b""
+    for key, value in sorted(status["allocatable"].items()):
+        encoded_status += message_field(
+            2, string_field(1, key) + message_field(2, string_field(1, value)),
+        )
+    for condition in status["conditions"]:
+        encoded_status += message_field(4, b"".join([
+            string_field(1, condition["type"]),
+            string_field(2, condition["status"]),
+        ]))
+    for address in status["addresses"]:
+        encoded_status += message_field(5, b"".join([
+            string_field(1, address["type"]),
+            string_field(2, address["address"]),
+        ]))
+    return (
+        message_field(1, _object_meta(node["metadata"])) +
+        message_field(3, encoded_status)
+    )
+
+
+
+def encode_list(encode_item, document):
+    """
+    Encode a list document the way the API server would, envelope and all.
+    """
+    encoded = b""
+    if "resourceVersion" in document.get("metadata", {}):
+        encoded += message_field(
+            1, string_field(2, document["metadata"]["resourceVersion"]),
+        )
+    for item in document["items"]:
+        encoded += message_field(2, encode_item(item))
+    return _MAGIC + b"".join([
+        message_field(1, string_field(1, "v1") + string_field(2, document["kind"])),
+        message_field(2, encoded),
+        string_field(4, "application/vnd.kubernetes.protobuf"),
+    ])
+
+
+
+def pod_list(count):
+    """
+    Make a JSON-shaped ``PodList`` with ``count`` pods in it.
+    """
+    return {
+        "kind": "PodList",
+        "apiVersion": "v1",
+        "metadata": {"resourceVersion": "1234"},
+        "items": list(
+            {
+                "metadata": {
+                    "name": "pod-{}".format(i),
+                    "namespace": "ns-{}".format(i % 20),
+                    "resourceVersion": "{}".format(i),
+                    "creationTimestamp": "2017-06-01T12:00:00Z",
+                    "ownerReferences": [{
+                        "kind": "ReplicaSet",
+                        "name": "rs-{}".format(i // 10),
+                        "uid": "uid-{}".format(i // 10),
+                        "apiVersion": "extensions/v1beta1",
+                        "controller": True,
+                    }],
+                },
+                "status": {
+                    "phase": "Running",
+                    "hostIP": "10.0.{}.{}".format(i % 50 // 256, i % 50),
+                    "containerStatuses": [{
+                        "name": "app",
+                        "ready": True,
+                        "restartCount": i % 3,
+                        "image": "example/app:1.0",
+                        "imageID": "docker-pullable://example/app@sha256:0",
+                    }],
+                },
+            }
+            for i in range(count)
+        ),
+    }
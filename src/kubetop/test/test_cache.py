@@ -0,0 +1,155 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._cache``.
+"""
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+from twisted.internet.defer import Deferred, succeed, fail
+from twisted.logger import globalLogPublisher, formatEvent
+
+from .._cache import TTLCache
+
+
+class Fetcher(object):
+    """
+    A fetch function which returns a new ``Deferred`` for each call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self):
+        d = Deferred()
+        self.calls.append(d)
+        return d
+
+
+
+class TTLCacheTests(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TTLCache(clock=self.clock, lifetimes={"r": 10})
+
+
+    def test_no_lifetime(self):
+        """
+        Resources without a lifetime are fetched for every request.
+        """
+        values = iter([1, 2])
+        results = list(
+            self.successResultOf(self.cache.get("s", lambda: next(values)))
+            for _ in range(2)
+        )
+        self.assertEqual(
+            ([1, 2], 2),
+            (results, self.cache.misses["s"]),
+        )
+
+
+    def test_concurrent_first_requests(self):
+        """
+        Requests made while the first fetch of a resource is outstanding wait
+        for that fetch instead of starting their own.
+        """
+        fetch = Fetcher()
+        first = self.cache.get("r", fetch)
+        second = self.cache.get("r", fetch)
+        self.assertNoResult(first)
+        fetch.calls[0].callback("value")
+        self.assertEqual(
+            ("value", "value", 1),
+            (
+                self.successResultOf(first),
+                self.successResultOf(second),
+                len(fetch.calls),
+            ),
+        )
+
+
+    def test_hit(self):
+        """
+        Until most of its lifetime has passed, a value is served without
+        fetching it again.
+        """
+        values = iter([1, 2])
+        fetch = lambda: succeed(next(values))
+        self.cache.get("r", fetch)
+        self.clock.advance(7)
+        self.assertEqual(
+            (1, 1, 1),
+            (
+                self.successResultOf(self.cache.get("r", fetch)),
+                self.cache.hits["r"],
+                self.cache.misses["r"],
+            ),
+        )
+
+
+    def test_refresh_ahead(self):
+        """
+        Late in its lifetime a value is still served immediately and a
+        replacement is fetched in the background.
+        """
+        fetch = Fetcher()
+        self.cache.get("r", fetch)
+        fetch.calls[0].callback("old")
+        self.clock.advance(9)
+
+        self.assertEqual("old", self.successResultOf(self.cache.get("r", fetch)))
+        self.clock.advance(5)
+        self.assertEqual("old", self.successResultOf(self.cache.get("r", fetch)))
+        self.assertEqual(2, len(fetch.calls))
+
+        fetch.calls[1].callback("new")
+        self.assertEqual("new", self.successResultOf(self.cache.get("r", fetch)))
+        self.assertEqual(1, self.cache.refreshes["r"])
+
+
+    def test_refresh_fails(self):
+        """
+        If a background refresh fails the error is logged and the old value is
+        served until a later refresh succeeds.
+        """
+        values = iter([succeed("old"), fail(ValueError()), succeed("new")])
+        fetch = lambda: next(values)
+        self.cache.get("r", fetch)
+        self.clock.advance(9)
+        self.assertEqual("old", self.successResultOf(self.cache.get("r", fetch)))
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+        self.assertEqual("old", self.successResultOf(self.cache.get("r", fetch)))
+        self.assertEqual("new", self.successResultOf(self.cache.get("r", fetch)))
+
+
+    def test_first_fetch_fails(self):
+        """
+        If the first fetch of a resource fails, the requests waiting for it
+        fail and the next request tries again.
+        """
+        values = iter([fail(ValueError()), succeed("value")])
+        fetch = lambda: next(values)
+        self.failureResultOf(self.cache.get("r", fetch), ValueError)
+        self.assertEqual("value", self.successResultOf(self.cache.get("r", fetch)))
+
+
+    def test_report(self):
+        """
+        The counts of a resource are logged every ``report_every`` requests
+        for it.
+        """
+        events = []
+        globalLogPublisher.addObserver(events.append)
+        self.addCleanup(globalLogPublisher.removeObserver, events.append)
+        self.cache.report_every = 3
+        for i in range(7):
+            self.cache.get("r", lambda: 1)
+        self.assertEqual(
+            ["Cache of 'r': 2 hits, 1 misses, 0 refreshes",
+             "Cache of 'r': 5 hits, 1 misses, 0 refreshes"],
+            list(
+                formatEvent(event)
+                for event in events
+                if event.get("log_namespace") == "kubetop._cache"
+            ),
+        )
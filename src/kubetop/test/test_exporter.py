@@ -0,0 +1,117 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._exporter``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+from twisted.internet.defer import succeed, fail
+
+from treq import content
+from treq.client import HTTPClient
+from treq.testing import RequestTraversalAgent
+
+from .._records import Usage
+from .._exporter import Exposition, MetricsResource, export
+from .test_frame import NODES, NODE_USAGE, PODS, POD_USAGE
+
+
+def _data():
+    return (
+        {"info": NODES, "usage": Usage(items=NODE_USAGE)},
+        {"info": PODS, "usage": Usage(items=POD_USAGE)},
+    )
+
+
+
+class StaticSource(object):
+    """
+    A data source which always has the same data, and counts how often it is
+    asked for it.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.requests = 0
+
+    def nodes(self):
+        self.requests += 1
+        return self.data[0]
+
+    def pods(self):
+        self.requests += 1
+        return self.data[1]
+
+
+
+class ExportTests(TestCase):
+    def test_exposition(self):
+        """
+        ``export`` renders the node and pod usage, and how long the fetch
+        took, in the Prometheus text format.
+        """
+        clock = Clock()
+        exposition = Exposition()
+        nodes, pods = _data()
+        self.successResultOf(export(
+            clock, StaticSource((succeed(nodes), succeed(pods))), exposition,
+        ))
+        lines = exposition.body.decode("utf-8").splitlines()
+        for line in [
+                "# TYPE kubetop_node_cpu_usage_cores gauge",
+                'kubetop_node_cpu_usage_cores{node="n1"} 0.5',
+                'kubetop_node_memory_usage_bytes{node="n0"} 536870912.0',
+                'kubetop_node_usage_stale{node="n0"} 0.0',
+                'kubetop_pod_cpu_usage_cores{namespace="kube-system",pod="b"} 0.3',
+                'kubetop_pod_memory_usage_bytes{namespace="default",pod="a"} 2097152.0',
+                "kubetop_fetch_duration_seconds 0.0",
+                "kubetop_fetch_failures_total 0.0",
+        ]:
+            self.assertIn(line, lines)
+
+
+    def test_failure(self):
+        """
+        If a fetch fails it is logged and counted and the last good data
+        continues to be served.
+        """
+        clock = Clock()
+        exposition = Exposition()
+        nodes, pods = _data()
+        export(clock, StaticSource((succeed(nodes), succeed(pods))), exposition)
+        self.successResultOf(export(
+            clock, StaticSource((fail(ValueError()), succeed(pods))), exposition,
+        ))
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+        lines = exposition.body.decode("utf-8").splitlines()
+        self.assertIn("kubetop_fetch_failures_total 1.0", lines)
+        self.assertIn('kubetop_node_cpu_usage_cores{node="n1"} 0.5', lines)
+
+
+
+class MetricsResourceTests(TestCase):
+    def test_cached(self):
+        """
+        Every scrape is served the exposition rendered by the last fetch
+        without asking the data source for anything.
+        """
+        exposition = Exposition(body=b"kubetop_fetch_failures_total 0.0\n")
+        client = HTTPClient(
+            agent=RequestTraversalAgent(MetricsResource(exposition)),
+        )
+        for _ in range(2):
+            response = self.successResultOf(client.get("http://x/metrics"))
+            self.assertEqual(
+                (b"kubetop_fetch_failures_total 0.0\n", [b"text/plain"]),
+                (
+                    self.successResultOf(content(response)),
+                    list(
+                        value.split(b";")[0]
+                        for value
+                        in response.headers.getRawHeaders(b"content-type")
+                    ),
+                ),
+            )
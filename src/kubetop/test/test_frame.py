@@ -0,0 +1,412 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._frame``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+
+import attr
+
+from .. import _frame
+from .._frame import NodeColumns, NodeSummary, PodColumns, FrameModel
+from .._records import (
+    pods_from_raw, nodes_from_raw, pod_usage_from_raw, node_usage_from_raw,
+)
+
+
+def _node(name, address, cpu="1", memory="1Gi", pods="10"):
+    return {
+        "metadata": {"name": name},
+        "status": {
+            "allocatable": {"cpu": cpu, "memory": memory, "pods": pods},
+            "addresses": [{"type": "InternalIP", "address": address}],
+            "conditions": [{"type": "Ready", "status": "True"}],
+        },
+    }
+
+
+def _node_usage(name, cpu, memory):
+    return {"metadata": {"name": name}, "usage": {"cpu": cpu, "memory": memory}}
+
+
+def _pod(name, host_ip, namespace="default", phase=None):
+    return {
+        "metadata": {"name": name, "namespace": namespace},
+        "status": {"hostIP": host_ip, "phase": phase},
+    }
+
+
+def _pod_usage(name, namespace, *containers):
+    return {
+        "metadata": {"name": name, "namespace": namespace},
+        "containers": list(
+            {"name": "c{}".format(i), "usage": {"cpu": cpu, "memory": memory}}
+            for i, (cpu, memory)
+            in enumerate(containers)
+        ),
+    }
+
+
+NODES = nodes_from_raw({"items": [
+    _node("n0", "10.0.0.1"),
+    _node("n1", "10.0.0.2", cpu="2", memory="4Gi"),
+]})
+
+NODE_USAGE = node_usage_from_raw({"items": [
+    _node_usage("n1", "500m", "256Mi"),
+    _node_usage("n0", "250m", "512Mi"),
+]}).items
+
+RAW_PODS = [
+    _pod("a", "10.0.0.1"),
+    _pod("b", "10.0.0.2", "kube-system"),
+    _pod("c", "10.0.0.2"),
+    _pod("d", "10.9.9.9"),
+]
+
+PODS = pods_from_raw({"items": RAW_PODS})
+
+POD_USAGE = pod_usage_from_raw({"items": [
+    _pod_usage("a", "default", ("100m", "1Mi"), ("50m", "1Mi")),
+    _pod_usage("b", "kube-system", ("300m", "1Mi")),
+    _pod_usage("c", "default", ("150m", "4Mi")),
+    _pod_usage("d", "default", ("150m", "2Mi")),
+]}).items
+
+
+class ColumnsTestsMixin(object):
+    def test_node_percentages(self):
+        columns = NodeColumns.from_data(NODES, NODE_USAGE, PODS)
+        self.assertEqual(
+            ([25.0, 25.0], [50.0, 6.25], [10.0, 20.0]),
+            (
+                columns.cpu_percent(),
+                columns.memory_percent(),
+                columns.pod_percent(),
+            ),
+        )
+
+
+    def test_node_nothing_allocatable(self):
+        """
+        The usage of a node with nothing allocatable, and the memory usage of
+        the pods on it, is 0%.
+        """
+        nodes = nodes_from_raw({"items": [
+            _node("n0", "10.0.0.1", cpu="0", memory="0", pods="0"),
+        ]})
+        columns = NodeColumns.from_data(nodes, NODE_USAGE, PODS)
+        pods = PodColumns.from_data(PODS, POD_USAGE, nodes)
+        self.assertEqual(
+            (
+                [0.0], [0.0], [0.0], [1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+                [0.0, -1, -1, -1],
+            ),
+            (
+                columns.cpu_percent(),
+                columns.memory_percent(),
+                columns.pod_percent(),
+                NodeSummary.from_columns(columns, 1).cpu_deciles,
+                list(pods.memory_percent),
+            ),
+        )
+
+
+    def test_node_stale(self):
+        """
+        Nodes the metrics backend marks stale, or leaves out, are stale.
+        Missing usage counts as none.
+        """
+        usage = [attr.evolve(NODE_USAGE[0], stale=True)]
+        columns = NodeColumns.from_data(NODES, usage, PODS)
+        self.assertEqual(
+            ([True, True], [0.0, 25.0]),
+            (columns.stale, columns.cpu_percent()),
+        )
+
+
+    def test_node_summary(self):
+        """
+        A summary totals the nodes, counts them by tenths of CPU usage and
+        finds the busiest (the earliest first, among equally busy nodes).
+        """
+        nodes = nodes_from_raw({"items": list(
+            _node("n{}".format(i), "10.0.0.{}".format(i)) for i in range(5)
+        )})
+        usage = node_usage_from_raw({"items": list(
+            _node_usage("n{}".format(i), cpu, "256Mi")
+            for (i, cpu)
+            in enumerate(["50m", "950m", "2", "150m", "950m"])
+        )}).items
+        columns = NodeColumns.from_data(nodes, usage[:4], PODS)
+        self.assertEqual(
+            NodeSummary(
+                nodes=5, not_ready=0, stale=1,
+                cpu_used=3150, cpu_allocatable=5000,
+                memory_used=2 ** 30, memory_allocatable=5 * 2 ** 30,
+                pod_count=3, pods_allocatable=50,
+                cpu_deciles=[2, 1, 0, 0, 0, 0, 0, 0, 0, 2],
+                hottest=[2, 1, 3],
+            ),
+            NodeSummary.from_columns(columns, 3),
+        )
+        self.assertEqual(
+            [2, 1, 4],
+            NodeSummary.from_columns(
+                NodeColumns.from_data(nodes, usage, PODS), 3,
+            ).hottest,
+        )
+
+
+    def test_totals(self):
+        columns = PodColumns.from_data(PODS, POD_USAGE, NODES)
+        self.assertEqual(
+            (750, 9 * 2 ** 20),
+            (columns.total_cpu(), columns.total_memory()),
+        )
+
+
+    def test_by_node(self):
+        """
+        Pods on an unknown node are left out of the per-node sums.
+        """
+        columns = PodColumns.from_data(PODS, POD_USAGE, NODES)
+        self.assertEqual(
+            ([150, 450], [2 * 2 ** 20, 5 * 2 ** 20]),
+            (columns.cpu_by_node(2), columns.memory_by_node(2)),
+        )
+
+
+    def test_by_namespace(self):
+        columns = PodColumns.from_data(PODS, POD_USAGE, NODES)
+        self.assertEqual(
+            (
+                {"default": 450, "kube-system": 300},
+                {"default": 8 * 2 ** 20, "kube-system": 2 ** 20},
+            ),
+            (columns.cpu_by_namespace(), columns.memory_by_namespace()),
+        )
+
+
+    def test_ranking(self):
+        """
+        Rows are ranked by CPU then memory, and rows which tie on both are
+        ordered by name.
+        """
+        columns = PodColumns.from_data(PODS, POD_USAGE, NODES)
+        self.assertEqual(
+            ["b", "c", "a", "d"],
+            list(columns.names[i] for i in columns.ranking()),
+        )
+
+
+    def test_ranking_stable(self):
+        """
+        The ranking does not depend on the order of the usage documents.
+        """
+        columns = PodColumns.from_data(PODS, POD_USAGE[::-1], NODES)
+        self.assertEqual(
+            ["b", "c", "a", "d"],
+            list(columns.names[i] for i in columns.ranking()),
+        )
+
+
+    def test_sort_keys(self):
+        """
+        Each sort key orders the rows by its own column.
+        """
+        pods = pods_from_raw({"items": [
+            {
+                "metadata": dict(
+                    pod["metadata"],
+                    **({"creationTimestamp": created} if created else {})
+                ),
+                "status": dict(
+                    pod["status"],
+                    containerStatuses=[{"name": "c0", "restartCount": restarts}],
+                ),
+            }
+            for (pod, created, restarts)
+            in zip(
+                RAW_PODS,
+                [
+                    "2017-04-03T00:00:00Z",
+                    "2017-04-01T00:00:00Z",
+                    "2017-04-02T00:00:00Z",
+                    None,
+                ],
+                [0, 2, 5, 2],
+            )
+        ]})
+        columns = PodColumns.from_data(pods, POD_USAGE, NODES)
+        self.assertEqual(
+            {
+                "mem": ["c", "a", "d", "b"],
+                "mem%": ["a", "c", "b", "d"],
+                "name": ["a", "b", "c", "d"],
+                "namespace": ["a", "c", "d", "b"],
+                "restarts": ["c", "b", "d", "a"],
+                "age": ["b", "c", "a", "d"],
+            },
+            {
+                key: list(columns.names[i] for i in columns.ranking(key))
+                for key
+                in ["mem", "mem%", "name", "namespace", "restarts", "age"]
+            },
+        )
+
+
+
+class PythonColumnsTests(ColumnsTestsMixin, TestCase):
+    """
+    Tests for the pure Python implementation of the columns.
+    """
+    def setUp(self):
+        self.patch(_frame, "numpy", None)
+
+
+
+class NumPyColumnsTests(ColumnsTestsMixin, TestCase):
+    """
+    Tests for the NumPy implementation of the columns.
+    """
+    if _frame.numpy is None:
+        skip = "NumPy is not installed."
+
+
+class GroupTests(TestCase):
+    def test_group(self):
+        """
+        ``PodColumns.group`` sums the usage of the rows sharing a key and
+        orders the groups, and the members of each group, by usage.
+        """
+        columns = PodColumns.from_data(PODS, POD_USAGE, NODES)
+        groups = columns.group(["x", "y", "x", "x"])
+        self.assertEqual(
+            [
+                ("x", 450, 8 * 2 ** 20, ["c", "a", "d"]),
+                ("y", 300, 2 ** 20, ["b"]),
+            ],
+            list(
+                (
+                    group.key, group.cpu, group.memory,
+                    list(columns.names[i] for i in group.members),
+                )
+                for group
+                in groups
+            ),
+        )
+
+
+
+class FrameModelTests(TestCase):
+    def _ranked(self, frame):
+        return list(usage.name for (cpu, memory, usage, host_ip) in frame.ranked)
+
+
+    def test_ranking(self):
+        """
+        ``FrameModel`` ranks pods like ``PodColumns.ranking("cpu")`` as pods
+        come, go and change.
+        """
+        model = FrameModel()
+        frames = [
+            POD_USAGE,
+            POD_USAGE[1:],
+            POD_USAGE[1:] + pod_usage_from_raw({"items": [
+                _pod_usage("e", "default", ("200m", "1Mi")),
+                _pod_usage("a", "default", ("500m", "1Mi")),
+            ]}).items,
+            POD_USAGE[::-1],
+        ]
+        for pod_usage in frames:
+            frame = model.update(PODS, pod_usage)
+            columns = PodColumns.from_data(PODS, pod_usage, NODES)
+            self.assertEqual(
+                list(columns.names[i] for i in columns.ranking("cpu")),
+                self._ranked(frame),
+            )
+
+
+    def test_counts(self):
+        """
+        ``FrameModel`` counts pods by phase and by host as pods come and go.
+        """
+        model = FrameModel()
+        model.update(PODS, POD_USAGE)
+        pods = PODS[1:] + pods_from_raw({"items": [
+            {
+                "metadata": {"name": "e"},
+                "status": {"phase": "Pending", "hostIP": "10.0.0.1"},
+            },
+        ]})
+        frame = model.update(pods, POD_USAGE)
+        self.assertEqual(
+            (
+                {None: 3, "Pending": 1},
+                {"10.0.0.1": 1, "10.0.0.2": 2, "10.9.9.9": 1},
+            ),
+            (frame.phases, dict(frame.host_pods)),
+        )
+        columns = NodeColumns.from_data(
+            NODES, NODE_USAGE, pods, frame.host_pods,
+        )
+        self.assertEqual(
+            _frame._tolist(NodeColumns.from_data(NODES, NODE_USAGE, pods).pod_count),
+            _frame._tolist(columns.pod_count),
+        )
+
+
+    def test_same_name(self):
+        """
+        Pods with the same name in different namespaces are different pods.
+        """
+        model = FrameModel()
+        usage = pod_usage_from_raw({"items": [
+            _pod_usage("redis-0", "one", ("100m", "1Mi")),
+            _pod_usage("redis-0", "two", ("200m", "1Mi")),
+        ]}).items
+        for restarts in range(3):
+            web = _pod("web", "10.0.0.2", "one", "Running")
+            web["status"]["containerStatuses"] = [
+                {"name": "c0", "restartCount": restarts},
+            ]
+            pods = pods_from_raw({"items": [
+                _pod("redis-0", "10.0.0.1", "one", "Running"),
+                _pod("redis-0", "10.0.0.2", "two", "Pending"),
+                web,
+            ]})
+            frame = model.update(pods, usage)
+        self.assertEqual(
+            (
+                {"Running": 2, "Pending": 1},
+                {"10.0.0.1": 1, "10.0.0.2": 2},
+                [("two", "10.0.0.2"), ("one", "10.0.0.1")],
+            ),
+            (
+                frame.phases,
+                dict(frame.host_pods),
+                list(
+                    (usage.namespace, host_ip)
+                    for (cpu, memory, usage, host_ip)
+                    in frame.ranked
+                ),
+            ),
+        )
+
+
+    def test_unchanged(self):
+        """
+        A frame equal to the last one changes nothing.
+        """
+        model = FrameModel()
+        model.update(PODS, POD_USAGE)
+        changes = model.changes
+        model.update(
+            pods_from_raw({"items": RAW_PODS}), list(POD_USAGE),
+        )
+        self.assertEqual((8, 8), (changes, model.changes))
@@ -0,0 +1,222 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._http``.
+"""
+
+from json import dumps
+
+from twisted.trial.unittest import TestCase
+from twisted.web.resource import Resource, EncodingResourceWrapper
+from twisted.web.server import GzipEncoderFactory
+from twisted.web.http import FORBIDDEN, NOT_MODIFIED
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.task import Clock
+from twisted.web.client import Agent, HTTPConnectionPool
+from twisted.web.http_headers import Headers
+
+from treq.client import HTTPClient
+from treq.testing import RequestTraversalAgent
+
+from txkube._authentication import HeaderInjectingAgent
+
+from .._http import (
+    ConditionalGetter, UnexpectedResponse, compressing_agent, use_pool,
+)
+
+
+class DocumentResource(Resource):
+    """
+    Serve a JSON document with an entity tag and keep track of what was sent.
+    """
+    isLeaf = True
+
+    def __init__(self, document, etag=None):
+        Resource.__init__(self)
+        self.document = document
+        self.etag = etag
+        self.requests = []
+        self.status = None
+
+    def render_GET(self, request):
+        self.requests.append(request)
+        if self.status is not None:
+            # Answer as the API server does when a request is refused.
+            request.setResponseCode(self.status)
+            return dumps({
+                "kind": "Status", "status": "Failure",
+                "message": "nodes is forbidden", "code": self.status,
+            }).encode("ascii")
+        if self.etag is not None:
+            if request.getHeader(b"if-none-match") == self.etag:
+                request.setResponseCode(NOT_MODIFIED)
+                return b""
+            request.setHeader(b"etag", self.etag)
+        return dumps(self.document).encode("ascii")
+
+
+
+class ConditionalGetterTests(TestCase):
+    def client(self, resource):
+        return HTTPClient(
+            agent=compressing_agent(RequestTraversalAgent(resource)),
+        )
+
+
+    def test_gzip(self):
+        """
+        Gzip content-encoding is requested and the response is decompressed.
+        """
+        resource = DocumentResource({"items": ["x" * 1000]})
+        client = self.client(
+            EncodingResourceWrapper(resource, [GzipEncoderFactory()]),
+        )
+        getter = ConditionalGetter()
+        self.assertEqual(
+            {"items": ["x" * 1000]},
+            self.successResultOf(getter.get(client, u"http://x/")),
+        )
+        [request] = resource.requests
+        self.assertEqual(
+            [b"gzip"], request.responseHeaders.getRawHeaders(b"content-encoding"),
+        )
+
+
+    def test_not_modified(self):
+        """
+        A document with an entity tag is requested conditionally the next time
+        and if the server says it is unchanged the previous result is used.
+        """
+        resource = DocumentResource({"items": []}, etag=b'"1"')
+        client = self.client(resource)
+        getter = ConditionalGetter()
+        decoded = []
+        def decode(document):
+            decoded.append(document)
+            return object()
+
+        first = self.successResultOf(getter.get(client, u"http://x/", decode))
+        second = self.successResultOf(getter.get(client, u"http://x/", decode))
+        self.assertEqual(
+            (first, 1, 1),
+            (second, getter.not_modified, len(decoded)),
+        )
+
+
+    def test_error_status(self):
+        """
+        A response with an error status fails the request and does not replace
+        what was remembered about the location.
+        """
+        resource = DocumentResource({"items": []}, etag=b'"1"')
+        client = self.client(resource)
+        getter = ConditionalGetter()
+        first = self.successResultOf(getter.get(client, u"http://x/"))
+
+        resource.status = FORBIDDEN
+        failure = self.failureResultOf(
+            getter.get(client, u"http://x/"), UnexpectedResponse,
+        )
+
+        resource.status = None
+        third = self.successResultOf(getter.get(client, u"http://x/"))
+        self.assertEqual(
+            (FORBIDDEN, "nodes is forbidden", first, 1),
+            (
+                failure.value.code, failure.value.message, third,
+                getter.not_modified,
+            ),
+        )
+
+
+    def test_unchanged_resource_version(self):
+        """
+        A list with the same ``resourceVersion`` as last time is not decoded
+        again.
+        """
+        resource = DocumentResource(
+            {"metadata": {"resourceVersion": "17"}, "items": []},
+        )
+        client = self.client(resource)
+        getter = ConditionalGetter()
+        decoded = []
+        def decode(document):
+            decoded.append(document)
+            return object()
+
+        first = self.successResultOf(getter.get(client, u"http://x/", decode))
+        # The same list, but not the same bytes.
+        resource.document = {
+            "kind": "List", "metadata": {"resourceVersion": "17"}, "items": [],
+        }
+        second = self.successResultOf(getter.get(client, u"http://x/", decode))
+        resource.document = {"metadata": {"resourceVersion": "18"}, "items": []}
+        third = self.successResultOf(getter.get(client, u"http://x/", decode))
+        self.assertEqual(
+            (True, False, 1, 2),
+            (first is second, second is third, getter.unchanged, len(decoded)),
+        )
+
+
+    def test_runner(self):
+        """
+        Parsing and decoding are done with the runner.
+        """
+        resource = DocumentResource({"items": [1]})
+        ran = []
+        def run(f, *args):
+            ran.append(f)
+            return maybeDeferred(f, *args)
+        getter = ConditionalGetter(run=run)
+        result = self.successResultOf(
+            getter.get(self.client(resource), u"http://x/", len),
+        )
+        self.assertEqual((1, 2, len), (result, len(ran), ran[1]))
+
+
+    def test_identical(self):
+        """
+        A body identical to the last one is not parsed or decoded again.
+        """
+        resource = DocumentResource({"items": [{"timestamp": "x"}]})
+        client = self.client(resource)
+        ran = []
+        def run(f, *args):
+            ran.append(f)
+            return maybeDeferred(f, *args)
+        getter = ConditionalGetter(run=run)
+
+        first = self.successResultOf(getter.get(client, u"http://x/", list))
+        second = self.successResultOf(getter.get(client, u"http://x/", list))
+        self.assertEqual(
+            (True, 1, 2),
+            (first is second, getter.identical, len(ran)),
+        )
+
+
+
+class UsePoolTests(TestCase):
+    def test_wrapped(self):
+        """
+        ``use_pool`` gives the ``Agent`` beneath txkube's and Twisted's
+        wrapping agents the pool.
+        """
+        clock = Clock()
+        agent = Agent(clock)
+        pool = HTTPConnectionPool(clock)
+        wrapped = compressing_agent(
+            HeaderInjectingAgent(_to_inject=Headers(), _agent=agent),
+        )
+        self.assertEqual(
+            (True, pool), (use_pool(wrapped, pool), agent._pool),
+        )
+
+
+    def test_no_agent(self):
+        """
+        ``use_pool`` leaves agents it does not know how to unwrap alone.
+        """
+        self.assertFalse(
+            use_pool(RequestTraversalAgent(Resource()), HTTPConnectionPool(Clock())),
+        )
@@ -0,0 +1,87 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._interactive``.
+"""
+
+from __future__ import unicode_literals
+
+from io import StringIO as TextIO
+
+from twisted.trial.unittest import TestCase
+
+from .._textrenderer import Size, Screen, Sink
+from .._interactive import KeyboardControl
+
+from .test_textrenderer import StubTerminal
+
+
+class KeyboardControlTests(TestCase):
+    def setUp(self):
+        size = Size(rows=20, columns=80, xpixels=0, ypixels=0)
+        self.screen = Screen(
+            reactor=None,
+            sink=Sink(terminal=StubTerminal(size=size), outfile=TextIO()),
+        )
+        self.quits = []
+        self.control = KeyboardControl(
+            self.screen, lambda: self.quits.append(None),
+        )
+
+
+    def test_sort(self):
+        """
+        ``m``, ``n`` and ``c`` choose the memory, name and CPU orderings.
+        """
+        orders = []
+        for key in "mnc":
+            self.control.keys_received(key)
+            orders.append(self.screen.view.sort)
+        self.assertEqual(["mem", "name", "cpu"], orders)
+
+
+    def test_filter(self):
+        """
+        ``/`` starts editing the filter which is finished by enter.  Keys typed
+        after that are commands again.
+        """
+        self.control.keys_received("/web")
+        self.control.keys_received("x\x7f-\r")
+        self.control.keys_received("m")
+        self.assertEqual(
+            ("web-", "mem"),
+            (self.screen.view.filter, self.screen.view.sort),
+        )
+
+
+    def test_filter_cancelled(self):
+        """
+        Escape abandons the filter.
+        """
+        self.control.keys_received("/web\x1b")
+        self.assertEqual("", self.screen.view.filter)
+
+
+    def test_paging(self):
+        """
+        Page down scrolls by half a screen, even if the escape sequence arrives
+        in pieces, and scrolling up stops at the top.
+        """
+        self.control.keys_received("\x1b[")
+        self.control.keys_received("6~j")
+        self.assertEqual(11, self.screen.view.offset)
+        self.control.keys_received("\x1b[5~\x1b[5~")
+        self.assertEqual(0, self.screen.view.offset)
+
+
+    def test_pause(self):
+        self.control.keys_received("p")
+        self.assertTrue(self.screen.paused)
+        self.control.keys_received("p")
+        self.assertFalse(self.screen.paused)
+
+
+    def test_quit(self):
+        self.control.keys_received("q")
+        self.assertEqual([None], self.quits)
@@ -0,0 +1,118 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._kubeconfig``.
+"""
+
+from __future__ import unicode_literals
+
+from os import stat, utime
+from stat import S_IMODE
+
+from twisted.trial.unittest import TestCase
+from twisted.python.filepath import FilePath
+
+from .. import _kubeconfig
+from .._kubeconfig import load, context_details, credential
+
+CONFIG = b"""\
+apiVersion: v1
+kind: Config
+current-context: b
+contexts:
+- name: a
+  context: {cluster: one, user: alice}
+- name: b
+  context: {cluster: two, user: bob}
+clusters:
+- name: one
+  cluster: {server: "https://one"}
+- name: two
+  cluster: {server: "https://two", certificate-authority-data: "Y2E="}
+users:
+- name: alice
+  user: {}
+- name: bob
+  user: {client-key: bob.key}
+"""
+
+
+class LoadTests(TestCase):
+    def setUp(self):
+        self.directory = FilePath(self.mktemp())
+        self.directory.makedirs()
+        self.path = self.directory.child("config")
+        self.path.setContent(CONFIG)
+        self.cache = self.directory.child("cache")
+        self.parsed = []
+        parse = _kubeconfig._parse
+        self.patch(
+            _kubeconfig, "_parse",
+            lambda text: self.parsed.append(text) or parse(text),
+        )
+
+
+    def test_load(self):
+        """
+        ``load`` parses the configuration file.
+        """
+        config = load(self.path)
+        self.assertEqual(
+            ("b", 1), (config["current-context"], len(self.parsed)),
+        )
+
+
+    def test_cached(self):
+        """
+        With a cache, the configuration is only parsed again once the file has
+        changed.  The cached copy is only readable by its owner.
+        """
+        first = load(self.path, self.cache)
+        second = load(self.path, self.cache)
+        self.assertEqual((first, 1), (second, len(self.parsed)))
+        [entry] = self.cache.children()
+        self.assertEqual(0o600, S_IMODE(stat(entry.path).st_mode))
+
+        self.path.setContent(CONFIG.replace(b"current-context: b", b"current-context: a"))
+        utime(self.path.path, (0, 0))
+        self.assertEqual(
+            ("a", 2),
+            (load(self.path, self.cache)["current-context"], len(self.parsed)),
+        )
+
+
+
+class ContextTests(TestCase):
+    def test_details(self):
+        """
+        ``context_details`` finds the cluster and user of a context and
+        ``credential`` reads inline data or files relative to the
+        configuration.
+        """
+        directory = FilePath(self.mktemp())
+        directory.makedirs()
+        directory.child("bob.key").setContent(b"key")
+        config_path = directory.child("config")
+        config_path.setContent(CONFIG)
+
+        (cluster, user) = context_details(load(config_path), "b")
+        self.assertEqual(
+            ("https://two", b"ca", b"key"),
+            (
+                cluster["server"],
+                credential(cluster, "certificate-authority", config_path),
+                credential(user, "client-key", config_path),
+            ),
+        )
+
+
+    def test_unknown(self):
+        """
+        ``context_details`` raises ``KeyError`` for an unknown context.
+        """
+        directory = FilePath(self.mktemp())
+        directory.makedirs()
+        config_path = directory.child("config")
+        config_path.setContent(CONFIG)
+        self.assertRaises(KeyError, context_details, load(config_path), "c")
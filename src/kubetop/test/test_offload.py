@@ -0,0 +1,46 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._offload``.
+"""
+
+from threading import current_thread
+
+from twisted.trial.unittest import TestCase
+from twisted.internet import reactor
+from twisted.internet.task import Clock
+from twisted.python.threadpool import ThreadPool
+
+from .._offload import LagMonitor, thread_runner
+
+
+class ThreadRunnerTests(TestCase):
+    def test_runs_in_thread(self):
+        """
+        The thread runner calls the function in the pool and delivers the
+        result to the reactor thread.
+        """
+        pool = ThreadPool(minthreads=0, maxthreads=1)
+        pool.start()
+        self.addCleanup(pool.stop)
+        run = thread_runner(reactor, pool)
+        main = current_thread()
+        d = run(lambda a, b: (a + b, current_thread() is main), 1, b=2)
+        d.addCallback(self.assertEqual, (3, False))
+        return d
+
+
+
+class LagMonitorTests(TestCase):
+    def test_lag(self):
+        """
+        ``LagMonitor`` records how late each of its timers fired.
+        """
+        clock = Clock()
+        monitor = LagMonitor(clock, interval=1)
+        monitor.start()
+        clock.advance(1)
+        clock.advance(3)
+        monitor.stop()
+        self.assertEqual(([0, 0, 2], 2), (monitor.lags, monitor.max_lag()))
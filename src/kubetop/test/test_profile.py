@@ -0,0 +1,91 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._profile``.
+"""
+
+from __future__ import unicode_literals
+
+from os import getpid, kill
+from signal import SIGUSR1, signal
+from pstats import Stats
+
+from twisted.trial.unittest import TestCase
+from twisted.python.filepath import FilePath
+from twisted.internet.task import Clock
+
+from .._profile import Profiler, profile_on_signal
+from .._topdata import detect_metrics
+
+
+def _work():
+    return detect_metrics({"groups": []})
+
+
+
+class ProfilerTests(TestCase):
+    def test_stop(self):
+        """
+        ``Profiler.stop`` writes the statistics gathered since
+        ``Profiler.start`` and a report of the ``_topdata`` functions.
+        """
+        path = self.mktemp()
+        profiler = Profiler()
+        profiler.start()
+        _work()
+        profiler.stop(path)
+
+        functions = set(name for (_, _, name) in Stats(path).stats)
+        with open(path + ".txt") as report:
+            self.assertEqual(
+                (False, True, True),
+                (
+                    profiler.running,
+                    "_work" in functions,
+                    "detect_metrics" in report.read(),
+                ),
+            )
+
+
+    def test_stop_not_running(self):
+        """
+        ``Profiler.stop`` does nothing if the profiler isn't running.
+        """
+        path = FilePath(self.mktemp())
+        Profiler().stop(path.path)
+        self.assertFalse(path.exists())
+
+
+
+class ProfileOnSignalTests(TestCase):
+    def test_toggle(self):
+        """
+        The first signal starts the profiler and the second stops it, writing
+        the statistics to the directory.
+        """
+        reactor = Clock()
+        reactor.callFromThread = lambda f, *a: f(*a)
+        directory = FilePath(self.mktemp())
+        directory.makedirs()
+        profiler = Profiler()
+        previous = profile_on_signal(reactor, profiler, directory)
+        self.addCleanup(signal, SIGUSR1, previous)
+
+        kill(getpid(), SIGUSR1)
+        running = profiler.running
+        _work()
+        kill(getpid(), SIGUSR1)
+
+        self.assertEqual(
+            (True, False, ["kubetop-{}-0.pstats".format(getpid())]),
+            (
+                running,
+                profiler.running,
+                list(
+                    child.basename()
+                    for child in directory.children()
+                    if child.splitext()[1] == ".pstats"
+                ),
+            ),
+        )
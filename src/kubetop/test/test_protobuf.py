@@ -0,0 +1,117 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._protobuf``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+from twisted.web.resource import Resource
+
+from treq.client import HTTPClient
+from treq.testing import RequestTraversalAgent
+
+from .._protobuf import (
+    CONTENT_TYPE, DecodeError, decode_pod_list, decode_node_list,
+)
+from .._http import ConditionalGetter
+from .protobuf import encode_list, encode_pod, encode_node, pod_list
+
+NODE_LIST = {
+    "kind": "NodeList",
+    "apiVersion": "v1",
+    "metadata": {"resourceVersion": "99"},
+    "items": [{
+        "metadata": {
+            "name": "node-1",
+            "resourceVersion": "98",
+            "creationTimestamp": "2017-01-01T00:00:00Z",
+        },
+        "status": {
+            "allocatable": {"cpu": "2", "memory": "4Gi", "pods": "110"},
+            "conditions": [{"type": "Ready", "status": "True"}],
+            "addresses": [{"type": "InternalIP", "address": "10.0.0.1"}],
+        },
+    }],
+}
+
+
+class DecodeTests(TestCase):
+    def test_pod_list(self):
+        """
+        ``decode_pod_list`` produces the same document as the JSON encoding of
+        the list (for the fields kubetop uses).
+        """
+        document = pod_list(3)
+        self.assertEqual(
+            document, decode_pod_list(encode_list(encode_pod, document)),
+        )
+
+
+    def test_node_list(self):
+        """
+        ``decode_node_list`` produces the same document as the JSON encoding of
+        the list (for the fields kubetop uses).
+        """
+        self.assertEqual(
+            NODE_LIST, decode_node_list(encode_list(encode_node, NODE_LIST)),
+        )
+
+
+    def test_missing_envelope(self):
+        """
+        A body without the protobuf envelope is rejected.
+        """
+        self.assertRaises(DecodeError, decode_pod_list, b'{"items": []}')
+
+
+    def test_truncated(self):
+        """
+        A truncated body is rejected.
+        """
+        body = encode_list(encode_pod, pod_list(1))
+        self.assertRaises(DecodeError, decode_pod_list, body[:-40])
+
+
+
+class ListResource(Resource):
+    """
+    Serve a list as protobuf or JSON depending on what the client accepts.
+    """
+    isLeaf = True
+
+    def __init__(self, body):
+        Resource.__init__(self)
+        self.body = body
+
+    def render_GET(self, request):
+        if CONTENT_TYPE in (request.getHeader(b"accept") or b""):
+            request.setHeader(b"content-type", CONTENT_TYPE)
+            return self.body
+        request.setHeader(b"content-type", b"application/json")
+        return b'{"items": []}'
+
+
+
+class ConditionalGetterTests(TestCase):
+    def test_protobuf(self):
+        """
+        ``ConditionalGetter.get`` asks for protobuf when given a protobuf
+        decoder and uses it on a protobuf response.
+        """
+        document = pod_list(2)
+        client = HTTPClient(agent=RequestTraversalAgent(
+            ListResource(encode_list(encode_pod, document)),
+        ))
+        getter = ConditionalGetter()
+        self.assertEqual(
+            (document, {"items": []}),
+            (
+                self.successResultOf(getter.get(
+                    client, "http://x/pb", protobuf=decode_pod_list,
+                )),
+                self.successResultOf(getter.get(client, "http://x/json")),
+            ),
+        )
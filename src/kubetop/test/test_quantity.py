@@ -0,0 +1,40 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._quantity``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+
+from .._quantity import parse_bytes, parse_millicores
+
+
+class ParseTests(TestCase):
+    def test_millicores(self):
+        """
+        CPU quantities in cores, millicores, microcores and nanocores (as
+        metrics-server reports them), with or without a fractional part, are
+        converted to whole millicores.
+        """
+        self.assertEqual(
+            [2000, 500, 250, 2, 2, 0],
+            list(
+                parse_millicores(s)
+                for s
+                in ["2", "0.5", "250m", "1500u", "1603568n", "0"]
+            ),
+        )
+
+
+    def test_bytes(self):
+        """
+        Memory quantities with or without a binary suffix are converted to
+        bytes.
+        """
+        self.assertEqual(
+            [1024, 13983744, 1536 * 2 ** 20],
+            list(parse_bytes(s) for s in ["1024", "13656Ki", "1.5Gi"]),
+        )
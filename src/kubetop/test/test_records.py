@@ -0,0 +1,91 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._records``.
+"""
+
+from __future__ import unicode_literals
+
+from json import dumps, loads
+
+from twisted.trial.unittest import TestCase
+
+from .._records import (
+    Pod, Usage, pods_from_raw, pod_usage_from_raw, dump_info, load_pods,
+    load_nodes, load_pod_usage, load_node_usage,
+)
+from .protobuf import pod_list
+from .test_frame import NODES, NODE_USAGE, POD_USAGE
+from .test_topdata import stuff
+
+
+class FromRawTests(TestCase):
+    def test_pod(self):
+        """
+        A pod record keeps the fields kubetop shows, with the controller
+        preferred as the owner and the restarts of all containers summed.
+        """
+        document = pod_list(3)
+        document["items"][2]["metadata"]["ownerReferences"].insert(0, {
+            "kind": "Foo", "name": "not-the-controller",
+        })
+        document["items"][2]["status"]["containerStatuses"].append(
+            {"name": "sidecar", "restartCount": 4},
+        )
+        self.assertEqual(
+            Pod(
+                name="pod-2", namespace="ns-2", phase="Running",
+                host_ip="10.0.0.2", owner="rs-0", restarts=6,
+                created=1496318400.0,
+            ),
+            pods_from_raw(document)[2],
+        )
+
+
+    def test_sparse_pod(self):
+        """
+        A pod without a status, owner or creation time gets a record too.
+        """
+        self.assertEqual(
+            (Pod(
+                name="p", namespace=None, phase=None, host_ip=None,
+                owner=None, restarts=0, created=None,
+            ),),
+            pods_from_raw({"items": [{"metadata": {"name": "p"}}]}),
+        )
+
+
+    def test_usage(self):
+        """
+        Usage records carry the time at which their samples are replaced.
+        """
+        usage = pod_usage_from_raw(stuff)
+        self.assertEqual(
+            (1, 1491578520.0),
+            (len(usage.items), usage.next_sample),
+        )
+
+
+
+class DumpTests(TestCase):
+    def _round_trip(self, load, info):
+        return load(loads(dumps(dump_info(info))))
+
+
+    def test_round_trip(self):
+        """
+        Records survive being dumped to JSON and loaded again.
+        """
+        pods = pods_from_raw(pod_list(5))
+        node_usage = Usage(items=NODE_USAGE, next_sample=12.5)
+        pod_usage = Usage(items=POD_USAGE)
+        self.assertEqual(
+            (pods, NODES, node_usage, pod_usage),
+            (
+                self._round_trip(load_pods, pods),
+                self._round_trip(load_nodes, NODES),
+                self._round_trip(load_node_usage, node_usage),
+                self._round_trip(load_pod_usage, pod_usage),
+            ),
+        )
@@ -0,0 +1,143 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._runmany``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock, deferLater
+from twisted.internet.defer import Deferred, fail
+
+from .._runmany import InOrder, _JustInTime
+
+
+class JustInTimeTests(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.started = []
+        self.pending = []
+
+
+    def slow(self, seconds):
+        def f():
+            self.started.append(self.clock.seconds())
+            return deferLater(self.clock, seconds, lambda: None)
+        return f
+
+
+    def stuck(self):
+        self.started.append(self.clock.seconds())
+        d = Deferred()
+        self.pending.append(d)
+        return d
+
+
+    def test_early_start(self):
+        """
+        Once it knows how long calls take, ``_JustInTime`` starts each call
+        that long before its deadline.
+        """
+        jit = _JustInTime(self.clock, iter([5, 5]), self.slow(1))
+        d = jit.start()
+        self.clock.pump([1] * 12)
+        self.successResultOf(d)
+        self.assertEqual(([0, 5, 9], 1), (self.started, jit.latency))
+
+
+    def test_plan_after_call(self):
+        """
+        The interval to the next deadline is taken once the call before it
+        has finished, so that it can depend on what the call did.
+        """
+        drawn = []
+
+        def intervals():
+            for i in range(3):
+                drawn.append(self.clock.seconds())
+                yield 5
+
+        jit = _JustInTime(self.clock, intervals(), self.slow(1))
+        d = jit.start()
+        self.clock.pump([1] * 16)
+        self.successResultOf(d)
+        self.assertEqual(
+            ([0, 5, 9, 14], [0, 6, 10]), (self.started, drawn),
+        )
+
+
+    def test_overlap(self):
+        """
+        At most two calls are in flight at once and the deadlines which arrive
+        while two are, are skipped.
+        """
+        jit = _JustInTime(self.clock, iter([1, 1, 1]), self.stuck)
+        d = jit.start()
+        self.clock.pump([1] * 4)
+        self.assertEqual(([0, 1], 2), (self.started, jit.missed))
+        self.assertNoResult(d)
+        for pending in self.pending:
+            pending.callback(None)
+        self.successResultOf(d)
+
+
+    def test_behind(self):
+        """
+        A deadline which has already passed is skipped instead of being made
+        up for.
+        """
+        jit = _JustInTime(
+            self.clock, iter([1, 1, 1]),
+            lambda: self.started.append(self.clock.seconds()),
+        )
+        jit.start()
+        self.clock.advance(3.5)
+        self.clock.pump([1] * 3)
+        self.assertEqual(([0, 3.5, 4.5, 5.5], 1), (self.started, jit.missed))
+
+
+    def test_failure(self):
+        """
+        A failed call stops the schedule with its failure.
+        """
+        jit = _JustInTime(
+            self.clock, iter([1, 1]), lambda: fail(ZeroDivisionError()),
+        )
+        self.failureResultOf(jit.start(), ZeroDivisionError)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+
+
+class InOrderTests(TestCase):
+    def test_out_of_order(self):
+        """
+        A result which arrives after the result of a call which started later
+        is dropped.
+        """
+        delivered = []
+        in_order = InOrder()
+        first = Deferred()
+        second = Deferred()
+        in_order.deliver(first, delivered.append)
+        in_order.deliver(second, delivered.append)
+        second.callback("new")
+        first.callback("old")
+        self.assertEqual(["new"], delivered)
+
+
+    def test_failure_out_of_order(self):
+        """
+        A failure which arrives after the result of a call which started later
+        is dropped too.
+        """
+        failures = []
+        in_order = InOrder()
+        first = Deferred()
+        second = Deferred()
+        in_order.deliver(first, lambda result: None, failures.append)
+        in_order.deliver(second, lambda result: None, failures.append)
+        second.callback("new")
+        first.errback(ZeroDivisionError())
+        self.assertEqual(([], None), (failures, self.successResultOf(first)))
@@ -0,0 +1,62 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._samples``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+
+from .._samples import (
+    SLACK, AlignedIntervals, next_sample, parse_duration, parse_timestamp,
+)
+from .._records import pod_usage_from_raw
+from .test_topdata import stuff
+
+
+class ParseTests(TestCase):
+    def test_duration(self):
+        """
+        ``parse_duration`` understands Go duration strings.
+        """
+        self.assertEqual(
+            [60.0, 90.0, 0.5, 3600.25],
+            list(map(parse_duration, ["1m0s", "1m30s", "500ms", "1h250ms"])),
+        )
+
+
+    def test_next_sample(self):
+        """
+        ``next_sample`` expects the newest sample to be replaced a window
+        after it was taken, and has no opinion about documents without
+        timing information.
+        """
+        self.assertEqual(
+            (parse_timestamp("2017-04-07T15:22:00Z"), None),
+            (next_sample(stuff), next_sample({"items": [{"metadata": {}}]})),
+        )
+
+
+
+class AlignedIntervalsTests(TestCase):
+    def test_aligned(self):
+        """
+        ``AlignedIntervals`` delays until the next sample is due, but never
+        less than the interval, and uses the interval when it knows nothing.
+        """
+        clock = Clock()
+        intervals = AlignedIntervals(clock, 3.0, iterations=3)
+        first = next(intervals)
+
+        sample = next_sample(stuff)
+        clock.advance(sample - 30)
+        intervals.observe("pods", pod_usage_from_raw(stuff))
+        second = next(intervals)
+
+        clock.advance(30)
+        third = next(intervals)
+        self.assertEqual((3.0, 30 + SLACK, 3.0), (first, second, third))
+        self.assertEqual([], list(intervals))
@@ -4,3 +4,175 @@
 """
 Tests for ``kubetop._script``.
 """
+
+from sys import executable
+from subprocess import check_output
+from json import loads
+
+from twisted.trial.unittest import TestCase
+from twisted.python.usage import UsageError
+from twisted.python.filepath import FilePath
+from twisted.internet.task import Clock
+from twisted.application.internet import TCPServer, UNIXServer
+
+try:
+    # This imports asyncio too.
+    from twisted.internet import asyncioreactor
+except ImportError:
+    asyncioreactor = None
+
+from .._script import KubetopOptions, _daemon_service, _exporter_service
+from .test_kubeconfig import CONFIG
+
+
+class KubetopOptionsTests(TestCase):
+    def test_unknown_group_by(self):
+        """
+        ``--group-by`` rejects values other than the supported groupings.
+        """
+        options = KubetopOptions()
+        with self.assertRaises(UsageError):
+            options.parseOptions(["--group-by", "color"])
+
+
+    def test_unknown_nodes(self):
+        """
+        ``--nodes`` rejects values other than the supported ways of showing
+        nodes.
+        """
+        options = KubetopOptions()
+        with self.assertRaises(UsageError):
+            options.parseOptions(["--nodes", "some"])
+
+
+
+class ExporterServiceTests(TestCase):
+    def test_local_interface(self):
+        """
+        By default the metrics of ``--serve-metrics`` are only served on the
+        loopback interface.
+        """
+        options = KubetopOptions()
+        service = _exporter_service(
+            None, Clock(), None,
+            dict(options.defaults, **{"serve-metrics": 9100}), iter([]),
+        )
+        (server,) = (s for s in service if isinstance(s, TCPServer))
+        self.assertEqual(
+            ((9100,), "127.0.0.1"),
+            (server.args[:1], server.kwargs["interface"]),
+        )
+
+
+
+class DaemonServiceTests(TestCase):
+    def test_owner_only(self):
+        """
+        Only the owner of the daemon may connect to its socket.
+        """
+        options = KubetopOptions()
+        service = _daemon_service(
+            None, Clock(), None,
+            dict(options.defaults, socket="kubetop.sock"), iter([]),
+        )
+        (server,) = (s for s in service if isinstance(s, UNIXServer))
+        self.assertEqual(
+            (("kubetop.sock",), 0o600),
+            (server.args[:1], server.kwargs["mode"]),
+        )
+
+
+
+_INSTALLED_REACTOR = """
+import sys
+from kubetop._script import KubetopOptions
+KubetopOptions().parseOptions(sys.argv[1:])
+from twisted.internet import reactor
+print(type(reactor).__name__)
+"""
+
+
+class ReactorTests(TestCase):
+    """
+    Tests for ``--reactor``.
+    """
+    def _installed(self, name):
+        config = FilePath(self.mktemp())
+        config.setContent(CONFIG)
+        return check_output([
+            executable, "-c", _INSTALLED_REACTOR,
+            "--config", config.path, "--reactor", name,
+        ]).decode("ascii").strip()
+
+
+    def test_asyncio(self):
+        """
+        ``--reactor asyncio`` installs the asyncio reactor before anything
+        else can install the default one.
+        """
+        self.assertEqual("AsyncioSelectorReactor", self._installed("asyncio"))
+
+    if asyncioreactor is None:
+        test_asyncio.skip = "The asyncio reactor is not available."
+
+
+    def test_unknown(self):
+        """
+        ``--reactor`` rejects unknown reactors.
+        """
+        with self.assertRaises(UsageError):
+            KubetopOptions().parseOptions(["--reactor", "iocp"])
+
+
+
+# Modules which are slow to import and are not needed to parse the command
+# line.
+_DEFERRED_MODULES = [
+    "txkube",
+    "treq",
+    "bitmath",
+    "yaml",
+    "numpy",
+    "twisted.internet.reactor",
+    "twisted.web.client",
+    "twisted.application.twist",
+]
+
+# Generously more than importing the entrypoint takes without the modules
+# above and less than it takes with them.
+_IMPORT_BUDGET = 0.5
+
+_MEASURE_IMPORT = """
+import sys, time, json
+before = time.time()
+import kubetop._script
+elapsed = time.time() - before
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": list(name for name in %r if name in sys.modules),
+}))
+""" % (_DEFERRED_MODULES,)
+
+
+class ImportTimeTests(TestCase):
+    """
+    Tests for the cost of importing the entrypoint.
+    """
+    def setUp(self):
+        self.result = loads(check_output([executable, "-c", _MEASURE_IMPORT]))
+
+
+    def test_deferred_imports(self):
+        """
+        Importing ``kubetop._script`` doesn't import anything which is only
+        needed after the command line has been parsed.
+        """
+        self.assertEqual([], self.result["loaded"])
+
+
+    def test_budget(self):
+        """
+        Importing ``kubetop._script`` takes less than ``_IMPORT_BUDGET``
+        seconds.
+        """
+        self.assertLess(self.result["elapsed"], _IMPORT_BUDGET)
@@ -0,0 +1,178 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._snapshot``.
+"""
+
+from __future__ import unicode_literals
+
+from twisted.trial.unittest import TestCase
+from twisted.internet import reactor
+from twisted.internet.task import Clock
+from twisted.internet.defer import gatherResults, succeed, fail
+
+from .._records import Usage
+from .._snapshot import SnapshotSource, Snapshots, publish, snapshot_factory
+from .test_frame import NODES as NODE_RECORDS, NODE_USAGE, PODS as POD_RECORDS
+from .test_frame import POD_USAGE
+
+NODES = {
+    "info": NODE_RECORDS,
+    "usage": Usage(items=NODE_USAGE, next_sample=1234.0),
+}
+
+PODS = {
+    "info": POD_RECORDS,
+    "usage": Usage(items=POD_USAGE),
+}
+
+
+class FakeSource(object):
+    """
+    A data source which counts how often it is asked for data.
+    """
+    def __init__(self):
+        self.requests = 0
+
+    def nodes(self):
+        self.requests += 1
+        return succeed(NODES)
+
+    def pods(self):
+        self.requests += 1
+        return succeed(PODS)
+
+
+
+class SnapshotSourceTests(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.upstream = FakeSource()
+        self.direct = FakeSource()
+        self.source = SnapshotSource(
+            reactor, self.path, lambda: self.direct,
+        )
+
+
+    def serve(self, clock=reactor):
+        snapshots = Snapshots(clock)
+        port = reactor.listenUNIX(self.path, snapshot_factory(snapshots))
+        self.addCleanup(port.stopListening)
+        return snapshots
+
+
+    def fetch(self):
+        return gatherResults([self.source.nodes(), self.source.pods()])
+
+
+    def test_daemon(self):
+        """
+        With a daemon running, ``SnapshotSource`` gets its data from the
+        daemon, waiting for the daemon's first poll if necessary.
+        """
+        snapshots = self.serve()
+        d = self.fetch()
+        publish(self.upstream, snapshots)
+
+        def fetched(data):
+            self.assertEqual(
+                ((NODES, PODS), 2, 0),
+                (tuple(data), self.upstream.requests, self.direct.requests),
+            )
+            return self.fetch()
+        d.addCallback(fetched)
+
+        def fetched_again(data):
+            self.assertEqual(
+                ((NODES, PODS), 2, 0),
+                (tuple(data), self.upstream.requests, self.direct.requests),
+            )
+        d.addCallback(fetched_again)
+        d.addCallback(lambda ignored: self.source._connection)
+        d.addCallback(lambda protocol: protocol.transport.loseConnection())
+        return d
+
+
+    def test_no_daemon(self):
+        """
+        Without a daemon, ``SnapshotSource`` fetches directly.
+        """
+        d = self.fetch()
+
+        def fetched(data):
+            self.assertEqual(
+                ((NODES, PODS), 2),
+                (tuple(data), self.direct.requests),
+            )
+        d.addCallback(fetched)
+        return d
+
+
+    def test_failed_poll(self):
+        """
+        If the daemon's last poll failed, ``SnapshotSource`` fetches directly.
+        """
+        snapshots = self.serve()
+
+        class BrokenSource(object):
+            def nodes(self):
+                return fail(ZeroDivisionError())
+
+            def pods(self):
+                return succeed(PODS)
+
+        publish(BrokenSource(), snapshots)
+        self.flushLoggedErrors(ZeroDivisionError)
+        d = self.fetch()
+
+        def fetched(data):
+            self.assertEqual(
+                ((NODES, PODS), 2),
+                (tuple(data), self.direct.requests),
+            )
+        d.addCallback(fetched)
+        d.addCallback(lambda ignored: self.source._connection)
+        d.addCallback(lambda protocol: protocol.transport.loseConnection())
+        return d
+
+
+    def test_stale(self):
+        """
+        If the daemon's snapshot is older than ``max_age``, ``SnapshotSource``
+        fetches directly.
+        """
+        # The daemon's clock stands at the start of the epoch.
+        snapshots = self.serve(Clock())
+        publish(self.upstream, snapshots)
+        d = self.fetch()
+
+        def fetched(data):
+            self.assertEqual(
+                ((NODES, PODS), 2),
+                (tuple(data), self.direct.requests),
+            )
+        d.addCallback(fetched)
+        d.addCallback(lambda ignored: self.source._connection)
+        d.addCallback(lambda protocol: protocol.transport.loseConnection())
+        return d
+
+
+    def test_timeout(self):
+        """
+        If the daemon does not answer within ``timeout`` (as when it has not
+        finished its first poll), ``SnapshotSource`` fetches directly.
+        """
+        self.serve()
+        self.source.timeout = 0.1
+        d = self.fetch()
+
+        def fetched(data):
+            self.assertEqual(
+                ((NODES, PODS), 2),
+                (tuple(data), self.direct.requests),
+            )
+        d.addCallback(fetched)
+        d.addCallback(lambda ignored: self.source._connection)
+        d.addCallback(lambda protocol: protocol.transport.loseConnection())
+        return d
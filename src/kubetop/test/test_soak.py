@@ -0,0 +1,222 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+A soak test of the whole fetch and render pipeline.
+
+kubetop is left running for weeks so memory which is retained a little at a
+time (by Deferred chains, caches, remembered responses or rows) adds up.
+This runs many frames against a fake API server on a fake clock and checks
+that the memory still allocated stops growing once kubetop has warmed up.
+
+Set ``KUBETOP_SOAK_ITERATIONS`` to run more frames than the default (which
+is kept small so the test suite stays quick), for example::
+
+    KUBETOP_SOAK_ITERATIONS=50000 trial kubetop.test.test_soak
+"""
+
+from __future__ import unicode_literals
+
+from os import environ
+from json import dumps
+from gc import collect
+from itertools import repeat
+
+try:
+    from tracemalloc import start, stop, get_traced_memory
+except ImportError:
+    # Python 2
+    start = None
+
+from zope.interface import implementer
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+from twisted.python.url import URL
+from twisted.web.resource import Resource
+
+from treq.testing import RequestTraversalAgent
+
+from txkube import IKubernetes
+
+import attr
+
+from .._cache import TTLCache
+from .._topdata import DEFAULT_LIFETIMES, MetricsAPI, _Source
+from .._textrenderer import Screen, Sink, Size, kubetop
+from .._runmany import run_many_service
+from .protobuf import pod_list
+from .test_frame import _node, _node_usage, _pod_usage
+from .test_textrenderer import StubTerminal
+
+ITERATIONS = int(environ.get("KUBETOP_SOAK_ITERATIONS", "400"))
+
+# The seconds between frames.
+INTERVAL = 1.0
+
+# The number of samples of allocated memory to take after warming up.
+SAMPLES = 10
+
+# The most allocated memory may grow from the first sample to the last.  This
+# leaves room for interpreter caches which take a thousand or so frames to fill
+# (such as the type attribute cache, which keeps the names Twisted and bitmath
+# build for ``getattr``) but not for anything kept per frame.
+THRESHOLD = 64 * 1024
+
+NODE_COUNT = 5
+POD_COUNT = 20
+
+
+class Cluster(Resource):
+    """
+    Serve pods, nodes and their usage, with the usage changing on every
+    request.
+    """
+    isLeaf = True
+
+    def __init__(self):
+        Resource.__init__(self)
+        self.requests = 0
+
+
+    def render_GET(self, request):
+        self.requests += 1
+        path = request.path.decode("ascii")
+        request.setHeader(b"content-type", b"application/json")
+        return dumps(self.documents()[path]).encode("utf-8")
+
+
+    def documents(self):
+        n = self.requests
+        return {
+            "/api/v1/pods": pod_list(POD_COUNT),
+            "/api/v1/nodes": {"items": list(
+                _node("node-{}".format(i), "10.0.0.{}".format(i))
+                for i in range(NODE_COUNT)
+            )},
+            "/apis/metrics.k8s.io/v1beta1/pods": {"items": list(
+                _pod_usage(
+                    "pod-{}".format(i), "ns-{}".format(i % 20),
+                    ("{}m".format((n + i) % 50), "{}Mi".format(n % 8 + 1)),
+                )
+                for i in range(POD_COUNT)
+            )},
+            "/apis/metrics.k8s.io/v1beta1/nodes": {"items": list(
+                _node_usage(
+                    "node-{}".format(i), "{}m".format((n * i) % 100), "1Gi",
+                )
+                for i in range(NODE_COUNT)
+            )},
+        }
+
+
+
+@implementer(IKubernetes)
+@attr.s
+class FakeKubernetes(object):
+    base_url = attr.ib()
+    agent = attr.ib()
+
+    def client(self):
+        return self
+
+
+
+@attr.s
+class FakeMain(object):
+    exited = attr.ib(default=False)
+    reason = attr.ib(default=None)
+
+    def exit(self, reason=None):
+        self.exited = True
+        self.reason = reason
+
+
+
+class Discard(object):
+    def write(self, text):
+        pass
+
+
+    def flush(self):
+        pass
+
+
+
+class SoakTests(TestCase):
+    if start is None:
+        skip = "tracemalloc is not available."
+
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.callWhenRunning = lambda f, *a: f(*a)
+        self.agent = RequestTraversalAgent(Cluster())
+        source = _Source(
+            kubernetes=FakeKubernetes(
+                base_url=URL.fromText("http://kubernetes.example"),
+                agent=self.agent,
+            ),
+            cache=TTLCache(clock=self.clock, lifetimes=DEFAULT_LIFETIMES),
+            metrics=MetricsAPI(),
+        )
+        screen = Screen(
+            reactor=self.clock,
+            sink=Sink(
+                terminal=StubTerminal(
+                    size=Size(rows=50, columns=120, xpixels=0, ypixels=0),
+                ),
+                outfile=Discard(),
+            ),
+        )
+        self.main = FakeMain()
+        self.service = run_many_service(
+            self.main, self.clock, lambda: kubetop(self.clock, source, screen),
+            repeat(INTERVAL, ITERATIONS),
+        )
+
+
+    def _frames(self, count):
+        for i in range(count):
+            self._flush()
+            self.clock.advance(INTERVAL)
+        self._flush()
+
+
+    def _flush(self):
+        self.agent.flush()
+        # The agent's MemoryReactor remembers every connection made through
+        # it.  That is the fake's memory, not kubetop's, so forget them.
+        del self.agent._memoryReactor.tcpClients[:]
+        del self.agent._memoryReactor.connectors[:]
+
+
+    def test_flat_memory(self):
+        """
+        Once kubetop has warmed up (filled its caches, decoded everything
+        once), the memory it keeps allocated does not grow with the number of
+        frames rendered.
+        """
+        self.service.startService()
+        # Long enough for the pod and node information to be fetched again.
+        warm_up = min(
+            int(2 * DEFAULT_LIFETIMES["nodes"] / INTERVAL), ITERATIONS // 2,
+        )
+        self._frames(warm_up)
+
+        start()
+        self.addCleanup(stop)
+        samples = []
+        remaining = ITERATIONS - warm_up
+        for i in range(SAMPLES):
+            self._frames(remaining // SAMPLES)
+            collect()
+            samples.append(get_traced_memory()[0])
+        self._frames(remaining % SAMPLES + 1)
+
+        self.assertEqual((True, None), (self.main.exited, self.main.reason))
+        self.assertLess(
+            samples[-1] - samples[0], THRESHOLD,
+            "Allocated memory grew from {} to {} bytes: {}".format(
+                samples[0], samples[-1], samples,
+            ),
+        )
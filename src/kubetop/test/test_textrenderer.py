@@ -8,25 +8,48 @@ Tests for ``_textrenderer``.
 from __future__ import unicode_literals
 
 from io import StringIO as TextIO
+from os import pipe, read, close
 
 from hypothesis import given
 from hypothesis.strategies import integers, text
 
 from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+from twisted.internet.defer import Deferred
+from twisted.internet import reactor
+from twisted.internet.fdesc import setNonBlocking
+from twisted.internet.task import deferLater
+from twisted.test.proto_helpers import StringTransport
+from twisted.logger import globalLogPublisher, formatEvent
 
 from bitmath import Byte
 
 import attr
 
+from .. import _textrenderer
 from .._textrenderer import (
     _render_container, _render_containers, _render_pods,
-    _render_pod, _render_nodes,
-    _render_limited_width,
+    _render_pod, _render_nodes, _render_groups,
+    _render_limited_width, _render_pod_top,
     _Memory,
-    Size, Sink,
+    Size, Sink, Screen, ReactorSink, RowCache, _TerminalWriter,
+    SUMMARY_NODES, kubetop,
 )
 
-from txkube import v1
+from .._records import (
+    Node, pods_from_raw, nodes_from_raw, pod_usage_from_raw,
+    node_usage_from_raw,
+)
+from .test_frame import PODS, _node, _node_usage
+
+
+def _containers(containers):
+    """
+    Make container usage records from metrics API container usage.
+    """
+    return pod_usage_from_raw({"items": [
+        {"metadata": {"name": "pod"}, "containers": containers},
+    ]}).items[0].containers
 
 
 class RenderLimitedWidthTests(TestCase):
@@ -109,7 +132,7 @@ class ContainersTests(TestCase):
             "  200.00 MiB"
             "       "
             "\n",
-            _render_container(container),
+            _render_container(_containers([container])[0]),
         )
 
 
@@ -130,7 +153,9 @@ class ContainersTests(TestCase):
                 },
             },
         ]
-        lines = _render_containers(containers).splitlines()
+        lines = _render_containers(
+            _containers(containers),
+        ).splitlines()
         self.assertEqual(
             ["(bar)", "(foo)"],
             list(line.split()[0].strip() for line in lines),
@@ -143,32 +168,18 @@ class PodTests(TestCase):
         name = "alpha"
 
         nodes = [
-            v1.Node(
-                metadata=v1.ObjectMeta(
-                    name=name,
-                ),
-                status=v1.NodeStatus(
-                    allocatable={
-                        "memory": "100MiB",
-                    },
-                ),
+            Node(
+                name=name, addresses=(), cpu=1000, memory=100 * 2 ** 20,
+                pods=110, ready=True,
             ),
         ]
 
-        pods = [
-            v1.Pod(
-                metadata=v1.ObjectMeta(
-                    name="foo",
-                ),
-            ),
-            v1.Pod(
-                metadata=v1.ObjectMeta(
-                    name="bar",
-                ),
-            ),
-        ]
+        pods = pods_from_raw({"items": [
+            {"metadata": {"name": "foo"}},
+            {"metadata": {"name": "bar"}},
+        ]})
 
-        pod_usage = [
+        pod_usage = pod_usage_from_raw({"items": [
             {
                 "metadata": {
                     "name": "foo",
@@ -219,7 +230,7 @@ class PodTests(TestCase):
                     }
                 ]
             },
-        ]
+        ]}).items
         lines = list(
             line
             for line
@@ -232,7 +243,7 @@ class PodTests(TestCase):
         )
 
     def test_render_pod(self):
-        pod_usage = {
+        pod_usage = pod_usage_from_raw({"items": [{
             "metadata": {
                 "name": "foo",
                 "namespace": "default",
@@ -249,7 +260,7 @@ class PodTests(TestCase):
                     }
                 },
             ]
-        }
+        }]}).items[0]
         fields = _render_pod(pod_usage, _Memory(Byte(1024 * 1024))).split()
         self.assertEqual(
             [u'foo', u'10.0', u'128.00', u'KiB', u'12.50'],
@@ -257,6 +268,64 @@ class PodTests(TestCase):
         )
 
 
+class GroupTests(TestCase):
+    def _usage(self, name, cpu, memory):
+        return {
+            "metadata": {
+                "name": name,
+                "namespace": "default",
+            },
+            "containers": [
+                {
+                    "name": name + "-a",
+                    "usage": {
+                        "cpu": cpu,
+                        "memory": memory,
+                    },
+                },
+            ],
+        }
+
+
+    def test_render_owner(self):
+        """
+        Pods are rolled up by the name of their controller, falling back to the
+        pod's own name, and member pods are listed when expanded.
+        """
+        owner = {
+            "kind": "ReplicaSet", "name": "web-1234", "controller": True,
+            "apiVersion": "extensions/v1beta1", "uid": "5678",
+        }
+        pods = pods_from_raw({"items": [
+            {"metadata": {
+                "name": "web-a", "namespace": "default",
+                "ownerReferences": [owner],
+            }},
+            {"metadata": {
+                "name": "web-b", "namespace": "default",
+                "ownerReferences": [owner],
+            }},
+            {"metadata": {"name": "lonely", "namespace": "default"}},
+        ]})
+        pod_usage = pod_usage_from_raw({"items": [
+            self._usage("web-a", "100m", "1Mi"),
+            self._usage("lonely", "150m", "1Mi"),
+            self._usage("web-b", "200m", "1Mi"),
+        ]}).items
+        collapsed = _render_groups(pods, pod_usage, [], "owner", False)
+        self.assertEqual(
+            [["web-1234", "(2)", "30.0"], ["lonely", "(1)", "15.0"]],
+            list(line.split()[:3] for line in collapsed.splitlines()),
+        )
+
+        expanded = _render_groups(pods, pod_usage, [], "owner", True)
+        self.assertEqual(
+            ["web-1234", "web-b", "web-a", "lonely", "lonely"],
+            list(line.split()[0] for line in expanded.splitlines()),
+        )
+
+
+
 class NodeTests(TestCase):
     def test_render_several(self):
         node = {
@@ -398,13 +467,9 @@ class NodeTests(TestCase):
             }
         }
 
-        pods = [
-            v1.Pod(
-                status=v1.PodStatus(
-                    hostIP=node["status"]["addresses"][0]["address"],
-                ),
-            ),
-        ]
+        pods = pods_from_raw({"items": [
+            {"status": {"hostIP": node["status"]["addresses"][0]["address"]}},
+        ]})
 
         self.assertEqual(
             "Node 0 "
@@ -412,7 +477,46 @@ class NodeTests(TestCase):
             "MEM% 50.00 ( 100 KiB/ 200 KiB)  "
             "POD%  0.91 (  1/110) "
             "Ready\n",
-            _render_nodes([node], [usage], pods),
+            _render_nodes(
+                nodes_from_raw({"items": [node]}),
+                node_usage_from_raw({"items": [usage]}).items,
+                pods,
+            ),
+        )
+
+
+
+    def test_render_summary(self):
+        """
+        Clusters with more than ``SUMMARY_NODES`` nodes are summarized, with a
+        line for each of the busiest nodes, unless every node is asked for.
+        """
+        nodes = nodes_from_raw({"items": list(
+            _node("n{}".format(i), "10.0.0.{}".format(i))
+            for i in range(SUMMARY_NODES + 1)
+        )})
+        usage = node_usage_from_raw({"items": list(
+            _node_usage("n{}".format(i), "{}m".format(i * 90), "512Mi")
+            for i in range(SUMMARY_NODES + 1)
+        )}).items
+        summary = _render_nodes(nodes, usage, PODS, mode="auto")
+        self.assertEqual(
+            (
+                [
+                    "Nodes:      11 total        0 not ready        0 stale",
+                    "Nodes  CPU%  45.00 MEM% 50.00 (   6 GiB/  11 GiB)  "
+                    "POD%  2.73 (  3/110)",
+                    "Nodes by CPU%: 0+:2 10+:1 20+:1 30+:1 40+:1 50+:1 "
+                    "60+:1 70+:1 80+:1 90+:1",
+                ],
+                ["Node 10", "Node 9", "Node 8", "Node 7", "Node 6"],
+                SUMMARY_NODES + 1,
+            ),
+            (
+                summary.splitlines()[:3],
+                list(line[:7].strip() for line in summary.splitlines()[3:]),
+                len(_render_nodes(nodes, usage, PODS, mode="all").splitlines()),
+            ),
         )
 
 
@@ -449,3 +553,323 @@ class SinkTests(TestCase):
                 line + "\n" for line in outfile.getvalue().splitlines()
             ),
         )
+
+
+
+class ReactorSinkTests(TestCase):
+    def setUp(self):
+        self.transport = StringTransport()
+        self.sink = ReactorSink(
+            StubTerminal(size=Size(rows=3, columns=80, xpixels=0, ypixels=0)),
+            self.transport,
+        )
+
+
+    def test_write(self):
+        """
+        ``ReactorSink.write`` encodes the frame, limited to the rows of the
+        terminal, and writes it right away if the writer is not busy.
+        """
+        self.sink.write("a\nb\u00e9\nc\nd\n")
+        self.assertEqual("a\nb\u00e9\nc".encode("utf-8"), self.transport.value())
+
+
+    def test_drop_frames(self):
+        """
+        While the writer is busy frames are held back and only the newest is
+        written once it has drained.
+        """
+        self.sink.pauseProducing()
+        for frame in ["one", "two", "three"]:
+            self.sink.write(frame)
+        self.assertEqual(b"", self.transport.value())
+        self.sink.resumeProducing()
+        self.assertEqual((b"three", 2), (self.transport.value(), self.sink.dropped))
+
+
+    def test_terminal_writer(self):
+        """
+        ``ReactorSink`` with a ``_TerminalWriter`` writes to the file
+        descriptor from the reactor, and does not take new frames until the
+        last one has been written.
+        """
+        r, w = pipe()
+        self.addCleanup(close, r)
+        self.addCleanup(close, w)
+        setNonBlocking(w)
+        writer = _TerminalWriter(reactor, w)
+        self.addCleanup(writer.stopWriting)
+        sink = ReactorSink(self.sink.terminal, writer)
+        sink.write("one")
+        sink.write("two")
+        sink.write("three")
+
+        def written(ignored):
+            self.assertEqual(b"onethree", read(r, 1024))
+        d = deferLater(reactor, 0.01, lambda: None)
+        d.addCallback(lambda ignored: deferLater(reactor, 0.01, lambda: None))
+        d.addCallback(written)
+        return d
+
+
+def _frame_data(*usages):
+    """
+    Make a frame's worth of data with no nodes and some pods.
+
+    :param usages: Tuples of pod name, CPU and memory usage.
+    """
+    return (
+        {"info": (), "usage": node_usage_from_raw({"items": []})},
+        {
+            "info": pods_from_raw({"items": list(
+                {
+                    "metadata": {"name": name, "namespace": "default"},
+                    "status": {"phase": "Running"},
+                }
+                for (name, cpu, memory)
+                in usages
+            )}),
+            "usage": pod_usage_from_raw({"items": list(
+                {
+                    "metadata": {"name": name, "namespace": "default"},
+                    "containers": [
+                        {"name": name, "usage": {"cpu": cpu, "memory": memory}},
+                    ],
+                }
+                for (name, cpu, memory)
+                in usages
+            )}),
+        },
+    )
+
+
+
+class RowCacheTests(TestCase):
+    def test_cached(self):
+        """
+        A row is rendered once and found again afterwards, and the hits and
+        misses are counted.
+        """
+        rows = RowCache()
+        rendered = []
+        render = lambda value: rendered.append(value) or value * 2
+        self.assertEqual(
+            ([2, 2, 4], [1, 2], 1 / 3),
+            (
+                [rows.get(1, render, 1), rows.get(1, render, 1),
+                 rows.get(2, render, 2)],
+                rendered,
+                rows.hit_rate(),
+            ),
+        )
+
+
+    def test_end_frame(self):
+        """
+        Rows not used during a frame are forgotten when it ends.
+        """
+        rows = RowCache()
+        rows.get("a", lambda: "A")
+        rows.get("b", lambda: "B")
+        rows.end_frame()
+        rows.get("a", lambda: "A")
+        rows.end_frame()
+        self.assertEqual(
+            ("A", "b!"),
+            (rows.get("a", lambda: "X"), rows.get("b", lambda: "b!")),
+        )
+
+
+    def test_size(self):
+        """
+        No more than ``size`` rows are remembered, the least recently used
+        being forgotten first.
+        """
+        rows = RowCache(size=2)
+        rows.get("a", lambda: "A")
+        rows.get("b", lambda: "B")
+        rows.get("a", lambda: "A")
+        rows.get("c", lambda: "C")
+        self.assertEqual(
+            ("A", "b!"),
+            (rows.get("a", lambda: "X"), rows.get("b", lambda: "b!")),
+        )
+
+
+
+class ScreenTests(TestCase):
+    def setUp(self):
+        size = Size(rows=20, columns=80, xpixels=0, ypixels=0)
+        self.outfile = TextIO()
+        self.screen = Screen(
+            reactor=Clock(),
+            sink=Sink(terminal=StubTerminal(size=size), outfile=self.outfile),
+        )
+
+
+    def _pod_names(self):
+        frame = self.outfile.getvalue()
+        self.outfile.seek(0)
+        self.outfile.truncate()
+        table = frame.split("%MEM\n", 1)[1]
+        return list(
+            line.split()[0]
+            for line
+            in table.splitlines()
+            if not line.strip().startswith("(")
+        )
+
+
+    def test_refresh(self):
+        """
+        ``Screen.refresh`` renders the most recently shown data again using the
+        current ``View``.
+        """
+        self.screen.show(_frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "200m", "1Mi"),
+        ))
+        self.assertEqual(["beta", "alpha"], self._pod_names())
+
+        self.screen.view.sort = "mem"
+        self.screen.refresh()
+        self.assertEqual(["alpha", "beta"], self._pod_names())
+
+        self.screen.view.filter = "lph"
+        self.screen.refresh()
+        self.assertEqual(["alpha"], self._pod_names())
+
+
+    def test_paused(self):
+        """
+        Data shown while the screen is paused is ignored.
+        """
+        self.screen.show(_frame_data(("alpha", "100m", "3Mi")))
+        self._pod_names()
+        self.screen.paused = True
+        self.screen.show(_frame_data(("beta", "100m", "3Mi")))
+        self.screen.refresh()
+        self.assertEqual(["alpha"], self._pod_names())
+
+
+    def test_unchanged(self):
+        """
+        Data equal to what is already shown is not rendered again, only the
+        clock line is rewritten.
+        """
+        self.screen.show(_frame_data(("alpha", "100m", "3Mi")))
+        self.outfile.seek(0)
+        self.outfile.truncate()
+        self.screen.reactor.advance(1)
+        self.screen.show(_frame_data(("alpha", "100m", "3Mi")))
+        written = self.outfile.getvalue()
+        self.assertEqual(
+            (1, "\x1b[1;1Hkubetop - ", 0),
+            (self.screen.unchanged, written[:16], written.count("\n")),
+        )
+
+
+    def test_model(self):
+        """
+        Frames rendered from the screen's ``FrameModel`` are the same as those
+        rendered from scratch.
+        """
+        data = _frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "200m", "1Mi"),
+            ("gamma", "200m", "2Mi"),
+        )
+        self.screen.show(data)
+        self.assertEqual(
+            _render_pod_top(
+                self.screen.reactor, data, self.screen.view,
+            ).rstrip("\n"),
+            self.outfile.getvalue().rstrip("\n"),
+        )
+
+
+    def test_cached_rows(self):
+        """
+        Rows whose values are unchanged from the previous frame are not
+        rendered again.
+        """
+        self.screen.show(_frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "200m", "1Mi"),
+        ))
+        self.screen.show(_frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "300m", "1Mi"),
+        ))
+        # Each frame has a pod row and a container row for each pod.
+        self.assertEqual(
+            (2, 6), (self.screen.rows.hits, self.screen.rows.misses),
+        )
+
+
+    def test_report_rows(self):
+        """
+        The ``RowCache`` hit rate is logged every ``REPORT_EVERY`` frames.
+        """
+        events = []
+        globalLogPublisher.addObserver(events.append)
+        self.addCleanup(globalLogPublisher.removeObserver, events.append)
+        self.patch(_textrenderer, "REPORT_EVERY", 2)
+        self.screen.show(_frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "200m", "1Mi"),
+        ))
+        self.screen.show(_frame_data(
+            ("alpha", "100m", "3Mi"), ("beta", "300m", "1Mi"),
+        ))
+        self.assertEqual(
+            ["Row cache: 2 hits, 6 misses (25%)"],
+            list(
+                formatEvent(event)
+                for event in events
+                if event.get("log_namespace") == "kubetop._textrenderer"
+            ),
+        )
+
+
+    def test_newest_frame(self):
+        """
+        If frames finish rendering out of order only the newest is written.
+        """
+        renders = []
+        def run(f, *args):
+            d = Deferred()
+            renders.append((d, f, args))
+            return d
+        self.screen.run = run
+        self.screen.show(_frame_data(("alpha", "100m", "3Mi")))
+        self.screen.show(_frame_data(("beta", "100m", "3Mi")))
+        for d, f, args in reversed(renders):
+            d.callback(f(*args))
+        self.assertEqual(["beta"], self._pod_names())
+
+
+    def test_newest_fetch(self):
+        """
+        If fetches overlap and finish out of order, the frame fetched first is
+        not shown in place of the newer one.
+        """
+        fetches = []
+
+        class Source(object):
+            def nodes(self):
+                d = Deferred()
+                fetches.append(d)
+                return d
+
+            def pods(self):
+                d = Deferred()
+                fetches.append(d)
+                return d
+
+        first = kubetop(self.screen.reactor, Source(), self.screen)
+        second = kubetop(self.screen.reactor, Source(), self.screen)
+        for (nodes, pods), name in [
+                (fetches[2:], "beta"), (fetches[:2], "alpha"),
+        ]:
+            node_data, pod_data = _frame_data((name, "100m", "3Mi"))
+            nodes.callback(node_data)
+            pods.callback(pod_data)
+        self.successResultOf(first)
+        self.successResultOf(second)
+        self.assertEqual(["beta"], self._pod_names())
@@ -1,3 +1,36 @@
+# Copyright Least Authority Enterprises.
+# See LICENSE for details.
+
+"""
+Tests for ``kubetop._topdata``.
+"""
+
+from __future__ import unicode_literals
+
+from base64 import b64encode
+from os.path import dirname, join
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.task import Clock
+from twisted.python.filepath import FilePath
+from twisted.python.url import URL
+from twisted.test.proto_helpers import MemoryReactorClock
+import twisted.test
+
+from pem import Certificate, Key, parse
+
+from txkube import IKubernetes
+
+from .._kubeconfig import load
+from .._records import (
+    ContainerUsage, NodeUsage, node_usage_from_raw, pod_usage_from_raw,
+)
+from .._topdata import (
+    HeapsterMetrics, MetricsAPI, KubeletSummary, detect_metrics,
+    kubernetes_from_config,
+)
+
 stuff = {
     "metadata": {},
     "items": [
@@ -21,3 +54,331 @@ stuff = {
         },
     ],
 }
+
+
+
+# What metrics-server answers, CPU usage in nanocores and all.
+METRICS_SERVER_PODS = {
+    "kind": "PodMetricsList",
+    "apiVersion": "metrics.k8s.io/v1beta1",
+    "metadata": {},
+    "items": [
+        {
+            "metadata": {
+                "name": "coredns-5d78c9869d-9xk2f",
+                "namespace": "kube-system",
+                "creationTimestamp": "2023-06-01T10:15:42Z",
+            },
+            "timestamp": "2023-06-01T10:15:30Z",
+            "window": "15.01s",
+            "containers": [
+                {
+                    "name": "coredns",
+                    "usage": {"cpu": "1603568n", "memory": "13656Ki"},
+                },
+            ],
+        },
+    ],
+}
+
+METRICS_SERVER_NODES = {
+    "kind": "NodeMetricsList",
+    "apiVersion": "metrics.k8s.io/v1beta1",
+    "metadata": {},
+    "items": [
+        {
+            "metadata": {
+                "name": "n1",
+                "creationTimestamp": "2023-06-01T10:15:42Z",
+            },
+            "timestamp": "2023-06-01T10:15:31Z",
+            "window": "20.052s",
+            "usage": {"cpu": "138935251n", "memory": "1695704Ki"},
+        },
+    ],
+}
+
+
+class FakeGet(object):
+    """
+    Serve documents from a dictionary and remember what was asked for.
+    """
+    def __init__(self, documents):
+        self.documents = documents
+        self.requested = []
+
+    def __call__(self, url):
+        self.requested.append(url)
+        return succeed(self.documents[url])
+
+
+
+class DetectMetricsTests(TestCase):
+    def test_metrics_api(self):
+        """
+        ``detect_metrics`` chooses ``MetricsAPI`` if the server offers the
+        ``metrics.k8s.io/v1beta1`` API group.
+        """
+        groups = {
+            "kind": "APIGroupList",
+            "groups": [
+                {"name": "apps", "versions": [{"groupVersion": "apps/v1", "version": "v1"}]},
+                {"name": "metrics.k8s.io", "versions": [{"groupVersion": "metrics.k8s.io/v1beta1", "version": "v1beta1"}]},
+            ],
+        }
+        self.assertEqual(MetricsAPI(), detect_metrics(groups))
+
+
+    def test_heapster(self):
+        """
+        ``detect_metrics`` falls back to ``HeapsterMetrics`` otherwise.
+        """
+        self.assertEqual(HeapsterMetrics(), detect_metrics({"groups": []}))
+
+
+
+class MetricsBackendTests(TestCase):
+    def test_heapster_pods(self):
+        """
+        ``HeapsterMetrics.pod_usage`` combines the usage of the pods of each
+        namespace.
+        """
+        backend = HeapsterMetrics()
+        get = FakeGet({
+            "https://k" + backend.pod_location("default"): stuff,
+            "https://k" + backend.pod_location("empty"): {"items": None},
+        })
+        usage = self.successResultOf(backend.pod_usage(
+            get, "https://k", lambda: succeed(["default", "empty"]), None,
+        ))
+        self.assertEqual(stuff["items"], usage["items"])
+
+
+    def test_metrics_api_pods(self):
+        """
+        ``MetricsAPI.pod_usage`` gets the usage of all pods with one request
+        and without listing namespaces.
+        """
+        location = "https://k/apis/metrics.k8s.io/v1beta1/pods"
+        get = FakeGet({location: METRICS_SERVER_PODS})
+        usage = self.successResultOf(MetricsAPI().pod_usage(
+            get, "https://k", lambda: self.fail("Listed namespaces"), None,
+        ))
+        [pod] = pod_usage_from_raw(usage).items
+        self.assertEqual(
+            (
+                1,
+                (ContainerUsage(name="coredns", cpu=2, memory=13983744),),
+            ),
+            (len(get.requested), pod.containers),
+        )
+
+
+    def test_metrics_api_nodes(self):
+        """
+        ``MetricsAPI.node_usage`` gets the usage of all nodes from the
+        aggregated API.
+        """
+        location = "https://k/apis/metrics.k8s.io/v1beta1/nodes"
+        get = FakeGet({location: METRICS_SERVER_NODES})
+        usage = self.successResultOf(
+            MetricsAPI().node_usage(get, "https://k", None),
+        )
+        self.assertEqual(
+            (NodeUsage(name="n1", cpu=139, memory=1736400896, stale=False),),
+            node_usage_from_raw(usage).items,
+        )
+
+
+
+def _summary(node, pods):
+    return {
+        "node": {
+            "nodeName": node,
+            "cpu": {"usageNanoCores": 1500000000},
+            "memory": {"workingSetBytes": 1024},
+        },
+        "pods": list(
+            {
+                "podRef": {"name": pod, "namespace": "default"},
+                "containers": [{
+                    "name": "app",
+                    "cpu": {"usageNanoCores": 2500000},
+                    "memory": {"workingSetBytes": 2048},
+                }],
+            }
+            for pod
+            in pods
+        ),
+    }
+
+
+
+class SlowGet(object):
+    """
+    Answer requests only when told to.
+    """
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, url):
+        d = Deferred()
+        self.requests.append((url, d))
+        return d
+
+
+
+class KubeletSummaryTests(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.backend = KubeletSummary(clock=self.clock, parallel=2, timeout=1)
+        self.nodes = lambda: succeed(["n0", "n1", "n2"])
+
+
+    def location(self, node):
+        return "https://k" + self.backend.summary_location(node)
+
+
+    def test_usage(self):
+        """
+        The summaries of all nodes are converted to metrics API usage.
+        """
+        get = FakeGet({
+            self.location("n0"): _summary("n0", ["p0", "p1"]),
+            self.location("n1"): _summary("n1", []),
+            self.location("n2"): _summary("n2", ["p2"]),
+        })
+        pods = self.backend.pod_usage(get, "https://k", None, self.nodes)
+        nodes = self.backend.node_usage(get, "https://k", self.nodes)
+        pods = self.successResultOf(pods)
+        nodes = self.successResultOf(nodes)
+        self.assertEqual(
+            (
+                ["p0", "p1", "p2"],
+                {"cpu": "2m", "memory": "2048"},
+                [
+                    {
+                        "metadata": {"name": name},
+                        "usage": {"cpu": "1500m", "memory": "1024"},
+                        "stale": False,
+                    }
+                    for name in ["n0", "n1", "n2"]
+                ],
+            ),
+            (
+                list(pod["metadata"]["name"] for pod in pods["items"]),
+                pods["items"][0]["containers"][0]["usage"],
+                nodes["items"],
+            ),
+        )
+
+
+    def test_shared_scrape(self):
+        """
+        Pod and node usage asked for while a scrape is in progress come from
+        that scrape.
+        """
+        get = SlowGet()
+        nodes = self.backend.node_usage(get, "https://k", self.nodes)
+        pods = self.backend.pod_usage(get, "https://k", None, self.nodes)
+        for i, name in enumerate(["n0", "n1", "n2"]):
+            get.requests[i][1].callback(_summary(name, []))
+        self.successResultOf(nodes)
+        self.successResultOf(pods)
+        self.assertEqual(3, len(get.requests))
+
+
+    def test_parallel(self):
+        """
+        No more than ``parallel`` nodes are scraped at once.
+        """
+        get = SlowGet()
+        self.backend.node_usage(get, "https://k", self.nodes)
+        self.assertEqual(2, len(get.requests))
+        get.requests[0][1].callback(_summary("n0", []))
+        self.assertEqual(3, len(get.requests))
+
+
+    def test_timeout(self):
+        """
+        A node which does not answer in time is reported with its previous
+        usage, marked stale, or not at all if it has never answered.
+        """
+        get = FakeGet({
+            self.location("n0"): _summary("n0", ["p0"]),
+            self.location("n1"): _summary("n1", ["p1"]),
+        })
+        self.backend.node_usage(
+            get, "https://k", lambda: succeed(["n0", "n1"]),
+        )
+
+        slow = SlowGet()
+        nodes = self.backend.node_usage(slow, "https://k", self.nodes)
+        pods = self.backend.pod_usage(slow, "https://k", None, self.nodes)
+        slow.requests[0][1].callback(_summary("n0", ["p0", "p3"]))
+        self.clock.advance(1)
+        self.clock.advance(1)
+        self.assertEqual(
+            (
+                [("n0", False), ("n1", True)],
+                ["p0", "p3", "p1"],
+            ),
+            (
+                list(
+                    (node["metadata"]["name"], node["stale"])
+                    for node
+                    in self.successResultOf(nodes)["items"]
+                ),
+                list(
+                    pod["metadata"]["name"]
+                    for pod
+                    in self.successResultOf(pods)["items"]
+                ),
+            ),
+        )
+
+
+
+class KubernetesFromConfigTests(TestCase):
+    def test_inline_credentials(self):
+        """
+        ``kubernetes_from_config`` makes an ``IKubernetes`` for the server of
+        the context, authenticated with the certificates and key held in the
+        configuration itself.
+        """
+        server = join(dirname(twisted.test.__file__), "server.pem")
+        with open(server, "rb") as f:
+            objects = parse(f.read())
+        [key] = list(o for o in objects if isinstance(o, Key))
+        [certificate] = list(o for o in objects if isinstance(o, Certificate))
+
+        def data(o):
+            return b64encode(o.as_bytes()).decode("ascii")
+
+        path = FilePath(self.mktemp())
+        path.setContent("""\
+apiVersion: v1
+kind: Config
+current-context: c
+contexts:
+- name: c
+  context: {{cluster: k, user: u}}
+clusters:
+- name: k
+  cluster:
+    server: "https://kubernetes.example:6443"
+    certificate-authority-data: "{certificate}"
+users:
+- name: u
+  user:
+    client-certificate-data: "{certificate}"
+    client-key-data: "{key}"
+""".format(certificate=data(certificate), key=data(key)).encode("ascii"))
+
+        kubernetes = kubernetes_from_config(
+            MemoryReactorClock(), load(path), "c", path,
+        )
+        self.assertEqual(
+            (True, URL.fromText("https://kubernetes.example:6443")),
+            (IKubernetes.providedBy(kubernetes), kubernetes.base_url),
+        )